@@ -5,8 +5,9 @@ Should be used in replay and undo features.
 """
 
 from dataclasses import dataclass, field
+from data_structures.bitmap import Bitmap
 from layer_util import Layer
-from grid import Grid
+from grid import Grid, GridClip
 
 @dataclass
 class PaintStep:
@@ -45,3 +46,124 @@ class PaintAction:
 
     def add_step(self, step: PaintStep):
         self.steps.append(step)
+
+
+@dataclass
+class FillAction:
+    """
+    A flood fill (see Grid.on_fill): the layer painted on every square of a region.
+    The region is kept as the bitmap fill_region returned rather than as one step per square,
+    and is undone and redone in one batched pass.
+    """
+
+    layer: Layer
+    origin: tuple[int, int]
+    region: Bitmap
+    is_special: bool = False
+
+    @property
+    def steps(self) -> tuple:
+        """A fill has no per-square steps."""
+        return ()
+
+    def undo_apply(self, grid: Grid):
+        grid.paint_region(self.layer, *self.origin, self.region, erase=True)
+
+    def redo_apply(self, grid: Grid):
+        grid.paint_region(self.layer, *self.origin, self.region)
+
+
+@dataclass
+class RegionAction:
+    """
+    A paste or clear of a rectangle (see Grid.paste_region): the clip written at origin,
+    and the clip it replaced. It is undone by writing the replaced clip back, and redone
+    by writing the clip again, in bulk.
+    """
+
+    origin: tuple[int, int]
+    clip: GridClip
+    replaced: GridClip
+    is_special: bool = False
+
+    @property
+    def steps(self) -> tuple:
+        """A region action has no per-square steps."""
+        return ()
+
+    def undo_apply(self, grid: Grid):
+        grid.paste_region(self.replaced, *self.origin)
+
+    def redo_apply(self, grid: Grid):
+        self.replaced = grid.paste_region(self.clip, *self.origin)
+
+
+def apply_net(grid: Grid, actions: list[PaintAction], undo: bool) -> None:
+    """
+    Undo (or redo) the actions in the given order, in one pass over the squares they touch.
+    The grid ends up as if each action's undo_apply (or redo_apply) had been called in turn.
+
+    The steps are grouped by square, and each square's steps are applied together,
+    with the specials that came between them applied to that square only. Then the
+    specials are applied once to every other square.
+    - SET and ADD specials undo themselves, so only their parity matters.
+    - In SET mode only a square's last step matters; in SEQUENCE mode, its last step
+      for each layer between two specials. Steps that are overridden are skipped.
+
+    Fills and region actions are not broken into steps: if any action is one, the actions are applied one by one.
+
+    Time Complexity: O(S + N*K) where S is the number of steps, N the number of created squares and
+    K the number of specials, or O(S + N) if K's parity is enough.
+    """
+    if not all(isinstance(action, PaintAction) for action in actions):
+        for action in actions:
+            if undo:
+                action.undo_apply(grid)
+            else:
+                action.redo_apply(grid)
+        return
+    involution = grid.draw_style in (Grid.DRAW_STYLE_SET, Grid.DRAW_STYLE_ADD)
+    specials = 0
+    # (x, y) -> [(specials before the step, layer)], in the order the steps would be applied.
+    squares = {}
+    for action in actions:
+        if action.is_special:
+            specials += 1
+            continue
+        for step in action.steps:
+            squares.setdefault(step.affected_grid_square, []).append((specials, step.affected_layer))
+
+    for (x, y), steps in squares.items():
+        store = grid[x][y]
+        done = 0
+        for before, layer in _net_steps(grid.draw_style, steps):
+            _special_store(store, before - done, involution)
+            done = before
+            if undo:
+                store.erase(layer)
+            else:
+                store.add(layer)
+        _special_store(store, specials - done, involution)
+
+    grid.special(specials % 2 if involution else specials, skip=squares.keys())
+
+
+def _net_steps(draw_style: str, steps: list[tuple[int, Layer]]) -> list[tuple[int, Layer]]:
+    """The steps of one square that still have an effect, in order."""
+    if draw_style == Grid.DRAW_STYLE_SET:
+        # A step replaces or clears the one layer, whatever it was.
+        return steps[-1:]
+    if draw_style == Grid.DRAW_STYLE_SEQUENCE:
+        # Adding or erasing a layer only depends on whether it is there, until a special.
+        last = {}
+        for before, layer in steps:
+            last.pop((before, layer.index), None)
+            last[(before, layer.index)] = (before, layer)
+        return list(last.values())
+    return steps
+
+
+def _special_store(store, times: int, involution: bool) -> None:
+    for _ in range(times % 2 if involution else times):
+        store.special()
+
@@ -0,0 +1,315 @@
+"""
+Scaling benchmarks for the paint engine.
+
+Sweeps grid sizes, stack depths and brush sizes over the LayerStores, Grid,
+undo, replay and the renderer, and prints the results as JSON.
+
+Usage:
+    python -m benchmarks.run                         # full sweep, JSON on stdout
+    python -m benchmarks.run --quick -o bench.json   # small sweep, saved to a file
+    python -m benchmarks.run --compare bench.json    # exit status 1 on regressions
+"""
+from __future__ import annotations
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+
+from action import PaintAction, PaintStep
+from grid import Grid
+from layer_store import SetLayerStore, AdditiveLayerStore, SequenceLayerStore
+from layer_util import get_layers
+from renderer import GridRenderer
+from replay import ReplayTracker
+from undo import UndoTracker
+
+STORES = {
+    Grid.DRAW_STYLE_SET: SetLayerStore,
+    Grid.DRAW_STYLE_ADD: AdditiveLayerStore,
+    Grid.DRAW_STYLE_SEQUENCE: SequenceLayerStore,
+}
+
+FULL = {
+    "sizes": [32, 64, 128, 256, 512, 1024],
+    "depths": [1, 4, 16, 64],
+    "brushes": [0, 2, 5],
+}
+QUICK = {
+    "sizes": [32, 64],
+    "depths": [1, 8],
+    "brushes": [2],
+}
+
+STORE_COUNT = 200
+SEED = 1054
+DABS = 200
+ACTIONS = 500
+
+
+def layers() -> list:
+    """All registered layers, in index order."""
+    return [layer for layer in get_layers() if layer is not None]
+
+
+def filled_store(style: str, depth: int):
+    """A store of the given style with depth layers added, cycling through the registry."""
+    store = STORES[style]()
+    all_layers = layers()
+    for i in range(depth):
+        store.add(all_layers[i % len(all_layers)])
+    return store
+
+
+def painted_grid(style: str, size: int, brush: int, dabs: int, rng: random.Random) -> tuple[Grid, list[PaintAction]]:
+    """A grid with `dabs` random brush dabs painted on it, and the actions they produced."""
+    grid = Grid(style, size, size)
+    grid.brush_size = brush
+    all_layers = layers()
+    actions = []
+    for _ in range(dabs):
+        layer = rng.choice(all_layers)
+        action = PaintAction()
+        for l, i, j in grid.on_paint(layer, rng.randrange(size), rng.randrange(size)):
+            action.add_step(PaintStep((i, j), l))
+        actions.append(action)
+    return grid, actions
+
+
+def measure(setup, repeat: int, seed: str) -> float:
+    """
+    Best wall time of `repeat` runs.
+    setup(rng) prepares fresh state, drawing any randomness from rng, and returns the function to time.
+    Every run gets a fresh random.Random(seed), so the runs time the same workload.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        func = setup(random.Random(seed))
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+# Cases. Each yields (name, params, ops, setup), where setup takes the case's random generator.
+
+def store_cases(params: dict):
+    for style in STORES:
+        for depth in params["depths"]:
+            p = {"style": style, "depth": depth}
+            all_layers = layers()
+
+            def add_setup(rng, style=style, depth=depth):
+                stores = [STORES[style]() for _ in range(STORE_COUNT)]
+                def run():
+                    for store in stores:
+                        for i in range(depth):
+                            store.add(all_layers[i % len(all_layers)])
+                return run
+            yield "store.add", p, STORE_COUNT * depth, add_setup
+
+            def erase_setup(rng, style=style, depth=depth):
+                stores = [filled_store(style, depth) for _ in range(STORE_COUNT)]
+                def run():
+                    for store in stores:
+                        for i in range(depth):
+                            store.erase(all_layers[i % len(all_layers)])
+                return run
+            yield "store.erase", p, STORE_COUNT * depth, erase_setup
+
+            def get_color_setup(rng, style=style, depth=depth):
+                stores = [filled_store(style, depth) for _ in range(STORE_COUNT)]
+                def run():
+                    for k, store in enumerate(stores):
+                        store.get_color((255, 255, 255), 1.5, k, k)
+                return run
+            yield "store.get_color", p, STORE_COUNT, get_color_setup
+
+            def special_setup(rng, style=style, depth=depth):
+                stores = [filled_store(style, depth) for _ in range(STORE_COUNT)]
+                def run():
+                    for store in stores:
+                        store.special()
+                return run
+            yield "store.special", p, STORE_COUNT, special_setup
+
+
+def grid_cases(params: dict):
+    for style in STORES:
+        for size in params["sizes"]:
+            p = {"style": style, "size": size}
+
+            def init_setup(rng, style=style, size=size):
+                return lambda: Grid(style, size, size)
+            yield "grid.init", p, size * size, init_setup
+
+            for brush in params["brushes"]:
+                pb = dict(p, brush=brush)
+
+                def paint_setup(rng, style=style, size=size, brush=brush):
+                    grid = Grid(style, size, size)
+                    grid.brush_size = brush
+                    all_layers = layers()
+                    dabs = [(rng.choice(all_layers), rng.randrange(size), rng.randrange(size)) for _ in range(DABS)]
+                    def run():
+                        for layer, x, y in dabs:
+                            grid.on_paint(layer, x, y)
+                    return run
+                yield "grid.on_paint", pb, DABS, paint_setup
+
+            def special_setup(rng, style=style, size=size):
+                grid, _ = painted_grid(style, size, 2, DABS, rng)
+                return grid.special
+            yield "grid.special", p, 1, special_setup
+
+            def fill_setup(rng, style=style, size=size):
+                # Fills everything but the painted squares, then fills the fill again.
+                grid, _ = painted_grid(style, size, 2, DABS, rng)
+                x, y = next(((x, y) for x in range(size) for y in range(size) if grid.peek(x, y) is None), (0, 0))
+                def run():
+                    grid.on_fill(layers()[0], x, y)
+                    grid.on_fill(layers()[1], x, y)
+                return run
+            yield "grid.fill", p, 2 * size * size, fill_setup
+
+            def paste_setup(rng, style=style, size=size):
+                # Copies the lower left quarter, pastes it over the upper right one, and clears it again.
+                grid, _ = painted_grid(style, size, 2, DABS, rng)
+                half = size // 2
+                def run():
+                    clip = grid.copy_region(0, 0, half, half)
+                    grid.paste_region(clip, half, half)
+                    grid.clear_region(half, half, size, size)
+                return run
+            yield "grid.paste", p, 3 * (size // 2) ** 2, paste_setup
+
+            def undo_setup(rng, style=style, size=size):
+                grid, actions = painted_grid(style, size, 2, ACTIONS, rng)
+                tracker = UndoTracker()
+                for action in actions:
+                    tracker.add_action(action)
+                def run():
+                    while tracker.undo(grid) is not None:
+                        pass
+                    while tracker.redo(grid) is not None:
+                        pass
+                return run
+            yield "undo.storm", p, 2 * ACTIONS, undo_setup
+
+            def undo_many_setup(rng, style=style, size=size):
+                grid, actions = painted_grid(style, size, 2, ACTIONS, rng)
+                tracker = UndoTracker()
+                for action in actions:
+                    tracker.add_action(action)
+                def run():
+                    tracker.undo(grid, ACTIONS)
+                    tracker.redo(grid, ACTIONS)
+                return run
+            yield "undo.many", p, 2 * ACTIONS, undo_many_setup
+
+            def replay_setup(rng, style=style, size=size):
+                _, actions = painted_grid(style, size, 2, ACTIONS, rng)
+                grid = Grid(style, size, size)
+                replay = ReplayTracker()
+                for action in actions:
+                    replay.add_action(action)
+                replay.start_replay()
+                def run():
+                    while not replay.play_next_action(grid):
+                        pass
+                return run
+            yield "replay.throughput", p, ACTIONS, replay_setup
+
+            def render_setup(rng, style=style, size=size):
+                grid, _ = painted_grid(style, size, 2, DABS, rng)
+                renderer = GridRenderer()
+                return lambda: renderer.render(grid, (255, 255, 255), 1.5)
+            yield "render.frame", p, size * size, render_setup
+
+            def render_interleaved_setup(rng, style=style, size=size):
+                grid, _ = painted_grid(style, size, 2, DABS, rng)
+                renderer = GridRenderer()
+                previous = renderer.render(grid, (255, 255, 255), 1.5, interleave=(0, 1))
+                return lambda: renderer.render(grid, (255, 255, 255), 1.5, previous=previous, interleave=(1, 4))
+            yield "render.interleaved", p, size * size, render_interleaved_setup
+
+
+def run(params: dict, repeat: int, only: str = None) -> list[dict]:
+    results = []
+    for name, p, ops, setup in list(store_cases(params)) + list(grid_cases(params)):
+        if only and not name.startswith(only):
+            continue
+        # Seeded by the case alone, so --only and cases added later leave every other workload unchanged.
+        seconds = measure(setup, repeat, f"{SEED}:{name}:{json.dumps(p, sort_keys=True)}")
+        results.append({
+            "name": name,
+            "params": p,
+            "ops": ops,
+            "seconds": seconds,
+            "us_per_op": seconds / ops * 1e6,
+        })
+        print(f"{name} {p}: {seconds * 1000:.2f} ms", file=sys.stderr)
+    return results
+
+
+def key(result: dict) -> str:
+    return result["name"] + json.dumps(result["params"], sort_keys=True)
+
+
+def compare(results: list[dict], baseline: dict, tolerance: float) -> bool:
+    """Print the change against the baseline for every case; returns False if any case regressed."""
+    before = {key(r): r for r in baseline["results"]}
+    ok = True
+    for result in results:
+        old = before.get(key(result))
+        if old is None:
+            continue
+        ratio = result["seconds"] / old["seconds"] if old["seconds"] else float("inf")
+        regressed = ratio > 1 + tolerance
+        ok = ok and not regressed
+        flag = "REGRESSED" if regressed else ""
+        print(f"{result['name']:20} {json.dumps(result['params']):50} {ratio:6.2f}x {flag}", file=sys.stderr)
+    return ok
+
+
+def main():
+    p = argparse.ArgumentParser(description="Paint engine scaling benchmarks.")
+    p.add_argument("--quick", action="store_true", help="Run a small sweep.")
+    p.add_argument("--sizes", help="Comma separated grid sizes, e.g. 32,64,128.")
+    p.add_argument("--only", help="Only run cases whose name starts with this, e.g. store or grid.on_paint.")
+    p.add_argument("--repeat", type=int, default=3, help="Runs per case, the best is kept.")
+    p.add_argument("-o", "--output", help="Write the JSON results to this file instead of stdout.")
+    p.add_argument("--compare", help="Baseline JSON file to compare against.")
+    p.add_argument("--tolerance", type=float, default=0.1, help="Allowed slowdown before a case counts as regressed.")
+    args = p.parse_args()
+
+    params = dict(QUICK if args.quick else FULL)
+    if args.sizes:
+        params["sizes"] = [int(s) for s in args.sizes.split(",")]
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.time(),
+            "params": params,
+            "repeat": args.repeat,
+        },
+        "results": run(params, args.repeat, args.only),
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=1)
+    else:
+        print(json.dumps(report, indent=1))
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if not compare(report["results"], baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
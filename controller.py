@@ -0,0 +1,253 @@
+"""
+Paint engine.
+
+Holds the canvas with its undo and replay history, and turns paint, undo,
+redo, special and replay requests into changes to it. The window, the
+canvas server and tests all drive the canvas through a PaintController.
+
+With a journal attached (see journal.py), every request that changes the
+canvas or its history is recorded as it is applied, so that
+PaintController.recover() can rebuild the controller after a crash.
+Requests the grid rejects with an exception are not recorded.
+
+This module must not import arcade (or anything that does), so that
+headless users load quickly. tests/test_misc/test_controller.py enforces it.
+"""
+from __future__ import annotations
+from action import FillAction, PaintAction, PaintStep, RegionAction
+from grid import Grid, GridClip
+from journal import Journal, read_journal
+from layer_util import Layer, get_layers
+from replay import ReplayTracker
+from undo import UndoTracker
+
+
+class PaintController:
+
+    def __init__(self, grid: Grid, journal: Journal = None) -> None:
+        """Drive the given grid, with empty undo and replay history, recording to journal if given."""
+        self.grid = grid
+        self.journal = None
+        self.on_init()
+        if journal is not None:
+            self.attach_journal(journal)
+
+    def attach_journal(self, journal: Journal) -> None:
+        """
+        Record every request that changes the canvas or its history to journal from now on.
+        A new journal starts with the size and draw style of the canvas, which must
+        then still be blank: recovery replays the journal onto a blank canvas.
+        """
+        if journal.is_new:
+            journal.append("init", {"width": self.grid.x, "height": self.grid.y, "draw_style": self.grid.draw_style})
+        self.journal = journal
+
+    @classmethod
+    def recover(cls, path: str) -> PaintController | None:
+        """
+        Rebuild a controller, with its grid, undo history and replay log, from the journal at path
+        by applying its requests again, or None if there is no journal there.
+        No journal is attached to it: attach one to path to carry on recording.
+
+        Time Complexity: O(R) where R is the cost of the journalled requests
+        """
+        records = read_journal(path)
+        if not records:
+            return None
+        init = records[0]
+        controller = cls(Grid(init["draw_style"], init["width"], init["height"]))
+        layers = {layer.name: layer for layer in get_layers() if layer is not None}
+        for record in records[1:]:
+            controller.apply_record(record, layers)
+        return controller
+
+    def apply_record(self, record: dict, layers: dict[str, Layer]) -> None:
+        """
+        Apply a journal record, looking its layer up by name in layers.
+
+        :raises ValueError: if the record is not a known request
+        """
+        op = record["op"]
+        if op in ("paint", "stroke"):
+            self.grid.brush_size = record["brush"]
+        if op == "paint":
+            self.on_paint(layers[record["layer"]], record["x"], record["y"])
+        elif op == "stroke":
+            self.on_paint_stroke(layers[record["layer"]], [tuple(point) for point in record["points"]])
+        elif op == "fill":
+            self.on_fill(layers[record["layer"]], record["x"], record["y"])
+        elif op == "copy":
+            self.on_copy(record["x0"], record["y0"], record["x1"], record["y1"])
+        elif op == "paste":
+            self.on_paste(record["x"], record["y"])
+        elif op == "clear_region":
+            self.on_clear_region(record["x0"], record["y0"], record["x1"], record["y1"])
+        elif op == "undo":
+            self.on_undo(record["n"])
+        elif op == "redo":
+            self.on_redo(record["n"])
+        elif op == "special":
+            self.on_special()
+        elif op == "clear":
+            self.on_clear(record["draw_style"])
+        elif op == "replay_start":
+            self.on_replay_start()
+        elif op == "replay_step":
+            self.on_replay_next_step()
+        else:
+            raise ValueError(f"Unknown journal record: {op}")
+
+    def _record(self, op: str, **fields) -> None:
+        """
+        Append a request to the journal, if any. Requests the grid may reject are recorded
+        once it has accepted them, so that recover() never meets one that raises.
+        """
+        if self.journal is not None:
+            self.journal.append(op, fields)
+
+    def on_init(self):
+        """Initialisation that occurs after the system initialisation."""
+        self.undo_tracker = UndoTracker()
+        self.replay_tracker = ReplayTracker()
+        # The rectangle copied last, pasted by on_paste.
+        self.clipboard = None
+
+    def on_reset(self):
+        """Called when a window reset is requested. The undo and replay history are kept."""
+
+    def on_clear(self, draw_style: str = None):
+        """
+        Called when the whole canvas is cleared, switching it to draw_style if given.
+        The undo and replay history are kept.
+        """
+        self.grid.clear(draw_style)
+        self._record("clear", draw_style=draw_style)
+
+    def on_paint(self, layer: Layer, px, py):
+        """
+        Called when a grid square is clicked on, which should trigger painting in the vicinity.
+        Vicinity squares outside of the range [0, GRID_SIZE_X) or [0, GRID_SIZE_Y) can be safely ignored.
+
+        layer: The layer being applied.
+        px: x position of the brush.
+        py: y position of the brush.
+        """
+        paint_action = PaintAction()
+        list_to_create_paint_action = self.grid.on_paint(layer, px, py)
+        self._record("paint", layer=layer.name, x=px, y=py, brush=self.grid.brush_size)
+        for layer in list_to_create_paint_action:
+            paint_step = PaintStep((layer[1], layer[2]), layer[0])
+            paint_action.add_step(paint_step)
+
+        self.undo_tracker.add_action(paint_action)
+        self.replay_tracker.add_action(paint_action)
+
+    def on_paint_stroke(self, layer: Layer, points):
+        """
+        Called once per update with the brush positions visited since the last one.
+        Every square under the brush along the stroke is painted once, as a single action.
+
+        layer: The layer being applied.
+        points: The (x, y) brush positions, inside the grid.
+        """
+        paint_action = PaintAction()
+        for step_layer, x, y in self.grid.on_paint_stroke(layer, points):
+            paint_action.add_step(PaintStep((x, y), step_layer))
+        self._record("stroke", layer=layer.name, points=points, brush=self.grid.brush_size)
+        if paint_action.steps:
+            self.undo_tracker.add_action(paint_action)
+            self.replay_tracker.add_action(paint_action)
+
+    def on_fill(self, layer: Layer, px, py):
+        """
+        Called when a square is clicked on with the fill tool: the connected squares showing
+        the same layers as it are painted, as a single action.
+
+        layer: The layer being applied.
+        px, py: The seed square, inside the grid.
+        """
+        x0, y0, region = self.grid.on_fill(layer, px, py)
+        self._record("fill", layer=layer.name, x=px, y=py)
+        fill_action = FillAction(layer, (x0, y0), region)
+        self.undo_tracker.add_action(fill_action)
+        self.replay_tracker.add_action(fill_action)
+
+    def on_copy(self, x0, y0, x1, y1):
+        """
+        Called when the rectangle [x0, x1) x [y0, y1) is copied. It replaces the clipboard,
+        and the canvas is unchanged, so it is not an action.
+        """
+        self.clipboard = self.grid.copy_region(x0, y0, x1, y1)
+        self._record("copy", x0=x0, y0=y0, x1=x1, y1=y1)
+
+    def on_paste(self, px, py):
+        """
+        Called when the clipboard is pasted with its first square at (px, py), inside the grid.
+        The squares are written in bulk, as a single action.
+        """
+        if self.clipboard is None:
+            return
+        replaced = self.grid.paste_region(self.clipboard, px, py)
+        self._record("paste", x=px, y=py)
+        region_action = RegionAction((px, py), self.clipboard, replaced)
+        self.undo_tracker.add_action(region_action)
+        self.replay_tracker.add_action(region_action)
+
+    def on_clear_region(self, x0, y0, x1, y1):
+        """Called when the rectangle [x0, x1) x [y0, y1) is cleared, as a single action."""
+        replaced = self.grid.clear_region(x0, y0, x1, y1)
+        self._record("clear_region", x0=x0, y0=y0, x1=x1, y1=y1)
+        blank = GridClip.blank(self.grid.draw_style, replaced.width, replaced.height)
+        region_action = RegionAction((max(0, x0), max(0, y0)), blank, replaced)
+        self.undo_tracker.add_action(region_action)
+        self.replay_tracker.add_action(region_action)
+
+    def on_undo(self, n: int = 1):
+        """Called when an undo of n actions is requested. Their net effect is applied at once."""
+        self._record("undo", n=n)
+        if n == 1:
+            action = self.undo_tracker.undo(self.grid)
+            if action:
+                self.replay_tracker.add_action(action, is_undo=True)
+            return
+        for action in self.undo_tracker.undo(self.grid, n):
+            self.replay_tracker.add_action(action, is_undo=True)
+
+    def on_redo(self, n: int = 1):
+        """Called when a redo of n actions is requested. Their net effect is applied at once."""
+        self._record("redo", n=n)
+        if n == 1:
+            action = self.undo_tracker.redo(self.grid)
+            if action:
+                self.replay_tracker.add_action(action, is_undo=False)
+            return
+        for action in self.undo_tracker.redo(self.grid, n):
+            self.replay_tracker.add_action(action, is_undo=False)
+
+    def on_special(self):
+        """Called when the special action is requested."""
+        self._record("special")
+        self.grid.special()
+        paintaction = PaintAction([], True)
+        self.undo_tracker.add_action(paintaction)
+
+    def on_replay_start(self):
+        """Called when the replay starting is requested."""
+        self._record("replay_start")
+        self.replay_tracker.start_replay()
+
+    def on_replay_next_step(self) -> bool:
+        """
+        Called when the next step of the replay is requested.
+        Returns whether the replay is finished.
+        """
+        self._record("replay_step")
+        return self.replay_tracker.play_next_action(self.grid)
+
+    def on_increase_brush_size(self):
+        """Called when an increase to the brush size is requested."""
+        self.grid.increase_brush_size()
+
+    def on_decrease_brush_size(self):
+        """Called when a decrease to the brush size is requested."""
+        self.grid.decrease_brush_size()
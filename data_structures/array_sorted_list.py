@@ -1,9 +1,12 @@
 """
     Array-based implementation of SortedList ADT.
-    Items to store should be of time ListItem.
+    Items to store should be of time ListItem,
+    or plain numbers sorted by their own value when the list is typed.
 """
 
+from operator import attrgetter
 from data_structures.referential_array import ArrayR
+from data_structures.typed_array import ArrayT
 from data_structures.sorted_list_adt import *
 
 __author__ = 'Maria Garcia de la Banda and Brendon Taylor. Modified by Alexey Ignatiev and Graeme Gange'
@@ -13,15 +16,26 @@ class ArraySortedList(SortedList[T]):
     """ SortedList ADT implemented with arrays. """
     MIN_CAPACITY = 1
 
-    def __init__(self, max_capacity: int) -> None:
-        """ ArraySortedList object initialiser. """
+    def __init__(self, max_capacity: int, typecode: str = None) -> None:
+        """ ArraySortedList object initialiser.
+            If a typecode is given, the list holds plain numbers instead of ListItems,
+            each being its own key, stored unboxed in an ArrayT.
+        """
 
         # first, calling the basic initialiser
         SortedList.__init__(self)
 
         # initialising the internal array
         size = max(self.MIN_CAPACITY, max_capacity)
-        self.array = ArrayR(size)
+        self.typecode = typecode
+        if typecode is None:
+            self.array = ArrayR(size)
+            self._key = attrgetter('key')
+            self._blank = None
+        else:
+            self.array = ArrayT(size, typecode)
+            self._key = _own_key
+            self._blank = 0
 
     def reset(self):
         """ Reset the list. """
@@ -35,10 +49,11 @@ class ArraySortedList(SortedList[T]):
         """ Magic method. Insert the item at a given position,
             if possible (!). Shift the following elements to the right.
         """
+        key = self._key
         if self.is_empty() or \
-                (index == 0 and item.key <= self[index].key) or \
-                (index == len(self) and self[index - 1].key <= item.key) or \
-                (index > 0 and self[index - 1].key <= item.key <= self[index].key):
+                (index == 0 and key(item) <= key(self[index])) or \
+                (index == len(self) and key(self[index - 1]) <= key(item)) or \
+                (index > 0 and key(self[index - 1]) <= key(item) <= key(self[index])):
 
             if self.is_full():
                 self._resize()
@@ -50,30 +65,28 @@ class ArraySortedList(SortedList[T]):
             raise IndexError('Element should be inserted in sorted order')
 
     def __contains__(self, item: ListItem):
-        """ Checks if value is in the list. """
-        for i in range(len(self)):
-            if self.array[i] == item:
-                return True
-        return False
+        """ Checks if value is in the list, by binary search on its key. """
+        return self._find(item) >= 0
 
     def _shuffle_right(self, index: int) -> None:
-        """ Shuffle items to the right up to a given position. """
-        for i in range(len(self), index, -1):
-            self.array[i] = self.array[i - 1]
+        """ Shuffle items to the right up to a given position, as one slice move. """
+        array = self.array
+        array[index + 1:len(self) + 1] = array[index:len(self)]
 
     def _shuffle_left(self, index: int) -> None:
-        """ Shuffle items starting at a given position to the left. """
-        for i in range(index, len(self)):
-            self.array[i] = self.array[i + 1]
+        """ Shuffle items starting at a given position to the left, as one slice move. """
+        array = self.array
+        array[index:len(self)] = array[index + 1:len(self) + 1]
+        # forget the reference left behind in the vacated slot
+        array[len(self)] = self._blank
 
-    def _resize(self) -> None:
-        """ Resize the list. """
-        # doubling the size of our list
-        new_array = ArrayR(2 * len(self.array))
+    def _resize(self, capacity: int = None) -> None:
+        """ Resize the list, doubling it unless a larger capacity is needed. """
+        size = max(2 * len(self.array), capacity or 0)
+        new_array = ArrayR(size) if self.typecode is None else ArrayT(size, self.typecode)
 
-        # copying the contents
-        for i in range(self.length):
-            new_array[i] = self.array[i]
+        # copying the contents in one slice move
+        new_array[:self.length] = self.array[:self.length]
 
         # referring to the new array
         self.array = new_array
@@ -89,10 +102,23 @@ class ArraySortedList(SortedList[T]):
 
     def index(self, item: ListItem) -> int:
         """ Find the position of a given item in the list. """
-        pos = self._index_to_add(item)
-        if pos < len(self) and self[pos] == item:
-            return pos
-        raise ValueError('item not in list')
+        pos = self._find(item)
+        if pos < 0:
+            raise ValueError('item not in list')
+        return pos
+
+    def _find(self, item: ListItem) -> int:
+        """ Position of the first element equal to the item, or -1.
+            Binary search finds the run of elements with the item's key,
+            which is then scanned, as several items may share a key.
+        """
+        key = self._key
+        pos = self._lower_bound(key(item))
+        while pos < len(self) and key(self.array[pos]) == key(item):
+            if self.array[pos] == item:
+                return pos
+            pos += 1
+        return -1
 
     def is_full(self):
         """ Check if the list is full. """
@@ -109,18 +135,68 @@ class ArraySortedList(SortedList[T]):
         self[position] = item
         self.length += 1
 
+    def add_many(self, items) -> None:
+        """ Add several elements to the list at once.
+            The new items are sorted and merged with the current ones in one pass,
+            taking O((N + M) + M log M) rather than M separate insertions.
+            Items with equal keys keep the order they were added in.
+        """
+        key = self._key
+        new = sorted(items, key=key)
+        if not new:
+            return
+        if len(self) + len(new) > len(self.array):
+            self._resize(len(self) + len(new))
+        array = self.array
+        old = array[:len(self)]
+        merged = []
+        i = j = 0
+        while i < len(old) and j < len(new):
+            if key(new[j]) < key(old[i]):
+                merged.append(new[j])
+                j += 1
+            else:
+                merged.append(old[i])
+                i += 1
+        merged.extend(old[i:])
+        merged.extend(new[j:])
+        array[:len(merged)] = merged
+        self.length = len(merged)
+
     def _index_to_add(self, item: ListItem) -> int:
-        """ Find the position where the new item should be placed. """
+        """ Find the position where the new item should be placed:
+            after every element with a key less than or equal to its key.
+        """
+        key = self._key
+        item_key = key(item)
         low = 0
-        high = len(self) - 1
+        high = len(self)
 
-        while low <= high:
+        while low < high:
             mid = (low + high) // 2
-            if self[mid].key < item.key:
+            if item_key < key(self.array[mid]):
+                high = mid
+            else:
+                low = mid + 1
+
+        return low
+
+    def _lower_bound(self, key) -> int:
+        """ Find the position of the first element whose key is not less than the given key. """
+        key_of = self._key
+        low = 0
+        high = len(self)
+
+        while low < high:
+            mid = (low + high) // 2
+            if key_of(self.array[mid]) < key:
                 low = mid + 1
-            elif self[mid].key > item.key:
-                high = mid - 1
             else:
-                return mid
+                high = mid
 
         return low
+
+
+def _own_key(value):
+    """ Key of an element of a typed list: the number itself. """
+    return value
@@ -0,0 +1,224 @@
+"""
+    Word-packed 2D bitmap, for masks over the grid
+    (dirty squares, brush coverage, selections).
+"""
+
+from __future__ import annotations
+import sys
+from array import array
+from itertools import compress
+from typing import Iterator
+from data_structures.typed_array import ArrayT
+
+__docformat__ = 'reStructuredText'
+
+class Bitmap:
+    """ A set of (x, y) positions in a width x height rectangle, one bit per position.
+
+        Rows are stored one after another in 64-bit words, each row starting on
+        a new word: (x, y) is bit x % 64 of word y * stride + x // 64.
+        Single positions are updated in place in O(1). Whole-bitmap operations
+        (union, intersection, difference, popcount) view the words as one
+        Python int, so they run word by word in C rather than bit by bit.
+
+        Attributes:
+        width, height (int): dimensions of the bitmap
+        stride (int): words per row
+        words (ArrayT): the packed bits, padding bits past the width are always 0
+    """
+    WORD = 64
+    FULL = (1 << WORD) - 1
+
+    def __init__(self, width: int, height: int) -> None:
+        """ An empty bitmap.
+        :complexity: O(width * height / 64)
+        """
+        self.width = width
+        self.height = height
+        self.stride = (width + self.WORD - 1) // self.WORD
+        self.words = ArrayT(max(1, self.stride * height), 'Q')
+
+    def __contains__(self, pos: tuple[int, int]) -> bool:
+        """ True if (x, y) is set. Positions outside the bitmap are never set.
+        :complexity: O(1)
+        """
+        x, y = pos
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return False
+        return bool((self.words.array[y * self.stride + (x >> 6)] >> (x & 63)) & 1)
+
+    def add(self, x: int, y: int) -> None:
+        """ Set (x, y).
+        :complexity: O(1)
+        :raises IndexError: if (x, y) is outside the bitmap
+        """
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            raise IndexError(f"({x}, {y}) is outside the bitmap")
+        self.words.array[y * self.stride + (x >> 6)] |= 1 << (x & 63)
+
+    def discard(self, x: int, y: int) -> None:
+        """ Unset (x, y), if it is inside the bitmap.
+        :complexity: O(1)
+        """
+        if 0 <= x < self.width and 0 <= y < self.height:
+            self.words.array[y * self.stride + (x >> 6)] &= ~(1 << (x & 63)) & self.FULL
+
+    def __len__(self) -> int:
+        """ Number of positions set (popcount).
+        :complexity: O(width * height / 64)
+        """
+        return self._to_int().bit_count()
+
+    def is_empty(self) -> bool:
+        """ True if no position is set.
+        :complexity: O(width * height / 64)
+        """
+        return not any(self.words.array)
+
+    def clear(self) -> None:
+        """ Unset every position.
+        :complexity: O(width * height / 64)
+        """
+        self.words = ArrayT(len(self.words), 'Q')
+
+    def __iter__(self) -> Iterator[tuple[int, int]]:
+        """ The positions set, row by row from y = 0, left to right.
+        :complexity: O(width * height / 64 + K) for K positions set; empty words are skipped in C
+        """
+        words = self.words.array
+        for i in compress(range(len(words)), words):
+            y, k = divmod(i, self.stride)
+            base = k * self.WORD
+            word = words[i]
+            while word:
+                low = word & -word
+                yield base + low.bit_length() - 1, y
+                word ^= low
+
+    def fill_rect(self, x0: int, y0: int, x1: int, y1: int) -> None:
+        """ Set every position of the rectangle [x0, x1) x [y0, y1), clipped to the bitmap.
+        :complexity: O((y1 - y0) * (x1 - x0) / 64), whole words are written as slices
+        """
+        self._update_rect(x0, y0, x1, y1, True)
+
+    def clear_rect(self, x0: int, y0: int, x1: int, y1: int) -> None:
+        """ Unset every position of the rectangle [x0, x1) x [y0, y1), clipped to the bitmap.
+        :complexity: O((y1 - y0) * (x1 - x0) / 64), whole words are written as slices
+        """
+        self._update_rect(x0, y0, x1, y1, False)
+
+    def _update_rect(self, x0: int, y0: int, x1: int, y1: int, value: bool) -> None:
+        x0, y0 = max(0, x0), max(0, y0)
+        x1, y1 = min(self.width, x1), min(self.height, y1)
+        if x1 <= x0 or y1 <= y0:
+            return
+        words = self.words.array
+        rows = y1 - y0
+        for k in range(x0 // self.WORD, (x1 - 1) // self.WORD + 1):
+            lo = max(x0 - k * self.WORD, 0)
+            hi = min(x1 - k * self.WORD, self.WORD)
+            mask = ((1 << (hi - lo)) - 1) << lo
+            # Word k of every row of the rectangle, as one extended slice.
+            column = slice(y0 * self.stride + k, y1 * self.stride + k, self.stride)
+            if mask == self.FULL:
+                words[column] = array('Q', [self.FULL if value else 0]) * rows
+            elif value:
+                words[column] = array('Q', [w | mask for w in words[column]])
+            else:
+                words[column] = array('Q', [w & ~mask for w in words[column]])
+
+    def row(self, y: int) -> int:
+        """ Row y as an int, bit x standing for (x, y).
+        :complexity: O(width / 64)
+        :raises IndexError: if y is outside the bitmap
+        """
+        if not 0 <= y < self.height:
+            raise IndexError(f"row {y} is outside the bitmap")
+        words = self.words.array[y * self.stride:(y + 1) * self.stride]
+        if sys.byteorder != 'little':
+            words.byteswap()
+        return int.from_bytes(words.tobytes(), 'little')
+
+    def set_row(self, y: int, value: int) -> None:
+        """ Replace row y by the bits of value, bit x standing for (x, y).
+        :complexity: O(width / 64)
+        :raises IndexError: if y is outside the bitmap
+        :raises ValueError: if value is negative or has bits past the width
+        """
+        if not 0 <= y < self.height:
+            raise IndexError(f"row {y} is outside the bitmap")
+        if value < 0 or value >> self.width:
+            raise ValueError("value has bits outside the row")
+        data = array('Q', value.to_bytes(self.stride * 8, 'little'))
+        if sys.byteorder != 'little':
+            data.byteswap()
+        self.words.array[y * self.stride:(y + 1) * self.stride] = data
+
+    def copy(self) -> Bitmap:
+        """ An independent bitmap with the same positions set.
+        :complexity: O(width * height / 64)
+        """
+        res = Bitmap(self.width, self.height)
+        res.words.array[:] = self.words.array
+        return res
+
+    def union(self, other: Bitmap) -> Bitmap:
+        """ A new bitmap of the positions set in self or other.
+        :complexity: O(width * height / 64)
+        """
+        return self._from_int(self._to_int() | self._check(other)._to_int())
+
+    def intersection(self, other: Bitmap) -> Bitmap:
+        """ A new bitmap of the positions set in both self and other.
+        :complexity: O(width * height / 64)
+        """
+        return self._from_int(self._to_int() & self._check(other)._to_int())
+
+    def difference(self, other: Bitmap) -> Bitmap:
+        """ A new bitmap of the positions set in self but not in other.
+        :complexity: O(width * height / 64)
+        """
+        return self._from_int(self._to_int() & ~self._check(other)._to_int())
+
+    def update(self, other: Bitmap) -> None:
+        """ Set every position set in other.
+        :complexity: O(width * height / 64)
+        """
+        self.words = self.union(other).words
+
+    __or__ = union
+    __and__ = intersection
+    __sub__ = difference
+
+    def __ior__(self, other: Bitmap) -> Bitmap:
+        self.update(other)
+        return self
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Bitmap):
+            return NotImplemented
+        return (self.width, self.height) == (other.width, other.height) and self.words.array == other.words.array
+
+    def _check(self, other: Bitmap) -> Bitmap:
+        if (self.width, self.height) != (other.width, other.height):
+            raise ValueError("Bitmaps have different dimensions")
+        return other
+
+    def _to_int(self) -> int:
+        """ The words as one int, word i being bits [64 i, 64 (i + 1)). """
+        words = self.words.array
+        if sys.byteorder != 'little':
+            words = array('Q', words)
+            words.byteswap()
+        return int.from_bytes(words.tobytes(), 'little')
+
+    def _from_int(self, value: int) -> Bitmap:
+        res = Bitmap(self.width, self.height)
+        data = array('Q', value.to_bytes(len(self.words) * 8, 'little'))
+        if sys.byteorder != 'little':
+            data.byteswap()
+        res.words.array[:] = data
+        return res
+
+    def __str__(self) -> str:
+        return '{' + ', '.join(str(pos) for pos in self) + '}'
@@ -10,6 +10,7 @@ import unittest
 from abc import ABC, abstractmethod
 from typing import Generic
 from data_structures.referential_array import ArrayR, T
+from data_structures.typed_array import ArrayT
 
 class Queue(ABC, Generic[T]):
     """ Abstract class for a generic Queue. """
@@ -51,17 +52,19 @@ class CircularQueue(Queue[T]):
          length (int): number of elements in the stack (inherited)
          front (int): index of the element at the front of the queue
          rear (int): index of the first empty space at the back of the queue
-         array (ArrayR[T]): array storing the elements of the queue
+         array (ArrayR[T] | ArrayT): array storing the elements of the queue
 
     ArrayR cannot create empty arrays. So MIN_CAPACITY used to avoid this.
     """
     MIN_CAPACITY = 1
 
-    def __init__(self,max_capacity:int) -> None:
+    def __init__(self,max_capacity:int, typecode: str = None) -> None:
+        """ If a typecode is given, the queue only holds numbers, stored unboxed in an ArrayT. """
         Queue.__init__(self)
         self.front = 0
         self.rear = 0
-        self.array = ArrayR(max(self.MIN_CAPACITY,max_capacity))
+        capacity = max(self.MIN_CAPACITY,max_capacity)
+        self.array = ArrayR(capacity) if typecode is None else ArrayT(capacity, typecode)
 
 
     def append(self, item: T) -> None:
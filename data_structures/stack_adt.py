@@ -10,6 +10,7 @@ import unittest
 from abc import ABC, abstractmethod
 from typing import TypeVar, Generic
 from data_structures.referential_array import ArrayR, T
+from data_structures.typed_array import ArrayT
 
 class Stack(ABC, Generic[T]):
     def __init__(self) -> None:
@@ -53,18 +54,20 @@ class ArrayStack(Stack[T]):
 
     Attributes:
          length (int): number of elements in the stack (inherited)
-         array (ArrayR[T]): array storing the elements of the queue
+         array (ArrayR[T] | ArrayT): array storing the elements of the queue
 
     ArrayR cannot create empty arrays. So MIN_CAPACITY used to avoid this.
     """
     MIN_CAPACITY = 1
 
-    def __init__(self, max_capacity: int) -> None:
+    def __init__(self, max_capacity: int, typecode: str = None) -> None:
         """ Initialises the length and the array with the given capacity.
             If max_capacity is 0, the array is created with MIN_CAPACITY.
+            If a typecode is given, the stack only holds numbers, stored unboxed in an ArrayT.
         """
         Stack.__init__(self)
-        self.array = ArrayR(max(self.MIN_CAPACITY, max_capacity))
+        capacity = max(self.MIN_CAPACITY, max_capacity)
+        self.array = ArrayR(capacity) if typecode is None else ArrayT(capacity, typecode)
 
     def is_full(self) -> bool:
         """ True if the stack is full and no element can be pushed. """
@@ -0,0 +1,63 @@
+""" Typed counterpart of ArrayR for numeric payloads.
+
+ArrayR holds a reference (8 bytes) to a Python object in every slot. When
+an array will only ever hold numbers of a known range (layer indices,
+coordinates, flags), ArrayT stores them unboxed in an array.array of the
+given typecode instead, e.g. 'B' for bytes (1 byte per slot) or 'q' for
+64-bit ints. Slots start as 0 rather than None.
+
+ArrayT offers the same interface as ArrayR. Its memory is reached without
+copying through arr.memoryview() or the underlying arr.array, which can be
+handed to bytes or numpy.frombuffer on any Python version. ArrayT also
+implements the buffer protocol itself (__buffer__), but that needs Python
+3.12+: on 3.11, memoryview(arr) raises TypeError.
+"""
+__docformat__ = 'reStructuredText'
+
+from array import array
+
+
+class ArrayT:
+    def __init__(self, length: int, typecode: str = 'q') -> None:
+        """ Creates a zero-filled array of the given length, holding values of the given array typecode.
+        :complexity: O(length), done in C rather than by a Python loop
+        :pre: length > 0
+        """
+        if length <= 0:
+            raise ValueError("Array length should be larger than 0.")
+        self.typecode = typecode
+        self.array = array(typecode, bytes(array(typecode).itemsize * length))
+
+    def __len__(self) -> int:
+        """ Returns the length of the array
+        :complexity: O(1)
+        """
+        return len(self.array)
+
+    def __getitem__(self, index: int | slice):
+        """ Returns the value in position index, or an array.array of the values in a slice.
+        :complexity: O(1), O(k) for a slice of k values
+        """
+        return self.array[index]
+
+    def __setitem__(self, index: int | slice, value) -> None:
+        """ Sets position index to value, or the positions of a slice to a sequence of the same length.
+        :complexity: O(1), O(k) for a slice of k values
+        :pre: a slice and the values assigned to it have the same length, so the array keeps its length
+        """
+        if isinstance(index, slice):
+            if not isinstance(value, array) or value.typecode != self.typecode:
+                value = array(self.typecode, value)
+            if len(range(*index.indices(len(self.array)))) != len(value):
+                raise ValueError("Slice assignment would change the array length.")
+        self.array[index] = value
+
+    def memoryview(self) -> memoryview:
+        """ A view of the underlying memory, without copying it.
+        :complexity: O(1)
+        """
+        return memoryview(self.array)
+
+    def __buffer__(self, flags: int) -> memoryview:
+        """ Buffer protocol (Python 3.12+): memoryview(arr) and numpy see the array's memory. """
+        return memoryview(self.array)
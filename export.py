@@ -0,0 +1,151 @@
+"""
+Headless animation export.
+
+Renders a grid (or a recorded replay played onto a grid) over a range of
+timestamps and streams the frames to disk, as one raw RGB file or a PNG
+sequence, without opening a window.
+
+Frames are rendered one at a time on the calling thread, while a small
+pool of workers converts and writes the previous ones. At most
+`max_pending` frames are held in memory at once.
+"""
+from __future__ import annotations
+import math
+import os
+import struct
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator
+
+from grid import Grid
+from renderer import Frame, FrameCache, GridRenderer
+from replay import ReplayTracker
+
+FORMAT_RAW = "raw"
+FORMAT_PNG = "png"
+
+
+def frame_times(start: float, end: float, fps: float) -> Iterator[float]:
+    """Timestamps of the frames in [start, end) at the given frame rate."""
+    for i in range(math.ceil((end - start) * fps)):
+        yield start + i / fps
+
+
+def render_frames(grid: Grid, times: Iterator[float], bg: tuple[int, int, int], region: tuple[int, int, int, int] = None,
+                  replay: ReplayTracker = None, action_interval: float = 0.05) -> Iterator[Frame]:
+    """
+    Render the grid at each timestamp.
+
+    If a replay is given, it is played onto the grid as time passes, one action
+    every action_interval seconds after the first timestamp, as the window does.
+    Frames are reused while the grid is unchanged, as the window does.
+    """
+    renderer = FrameCache(GridRenderer())
+    start = None
+    played = 0
+    finished = False
+    if replay is not None:
+        replay.start_replay()
+    for t in times:
+        if start is None:
+            start = t
+        if replay is not None:
+            due = int((t - start) / action_interval)
+            while not finished and played < due:
+                finished = replay.play_next_action(grid)
+                played += 1
+        yield renderer.render(grid, bg, t, region)
+
+
+def frame_to_rgb(frame: Frame, scale: int = 1) -> bytes:
+    """
+    The frame as 8-bit RGB rows, top row first, each square scale x scale pixels.
+    """
+    rows = []
+    for y in range(frame.y1 - 1, frame.y0 - 1, -1):
+        row = b"".join(frame.packed(x, y).to_bytes(3, "big") * scale for x in range(frame.x0, frame.x1))
+        rows.extend([row] * scale)
+    return b"".join(rows)
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def encode_png(rgb: bytes, width: int, height: int) -> bytes:
+    """Encode RGB rows (top row first) as a PNG file."""
+    stride = width * 3
+    # Each row is prefixed with filter type 0 (none).
+    raw = b"".join(b"\x00" + rgb[i:i + stride] for i in range(0, len(rgb), stride))
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + _png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        + _png_chunk(b"IDAT", zlib.compress(raw, 6))
+        + _png_chunk(b"IEND", b"")
+    )
+
+
+def _write_png(frame: Frame, scale: int, path: str) -> None:
+    rgb = frame_to_rgb(frame, scale)
+    data = encode_png(rgb, (frame.x1 - frame.x0) * scale, (frame.y1 - frame.y0) * scale)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def export_animation(grid: Grid, out: str, start: float, end: float, fps: float, fmt: str = FORMAT_PNG,
+                     scale: int = 1, bg: tuple[int, int, int] = (255, 255, 255), region: tuple[int, int, int, int] = None,
+                     replay: ReplayTracker = None, action_interval: float = 0.05,
+                     workers: int = None, max_pending: int = 8) -> int:
+    """
+    Render frames from start to end at fps and write them to out.
+    - FORMAT_PNG: out is a directory, filled with frame_00000.png, frame_00001.png, ...
+    - FORMAT_RAW: out is a file of concatenated RGB frames, top row first.
+
+    Returns the number of frames written.
+    """
+    if fmt not in (FORMAT_PNG, FORMAT_RAW):
+        raise ValueError(f"Unknown format {fmt}")
+    if fmt == FORMAT_PNG:
+        os.makedirs(out, exist_ok=True)
+        raw_file = None
+    else:
+        raw_file = open(out, "wb")
+    pending = deque()
+    count = 0
+    try:
+        with ThreadPoolExecutor(workers or os.cpu_count() or 1, thread_name_prefix="export") as pool:
+            for frame in render_frames(grid, frame_times(start, end, fps), bg, region, replay, action_interval):
+                if len(pending) >= max_pending:
+                    _finish(pending.popleft(), raw_file)
+                if fmt == FORMAT_PNG:
+                    path = os.path.join(out, f"frame_{count:05d}.png")
+                    pending.append(pool.submit(_write_png, frame, scale, path))
+                else:
+                    pending.append(pool.submit(frame_to_rgb, frame, scale))
+                count += 1
+            while pending:
+                _finish(pending.popleft(), raw_file)
+    finally:
+        if raw_file is not None:
+            raw_file.close()
+    return count
+
+
+def _finish(future, raw_file) -> None:
+    """Wait for the oldest frame; raw frames are appended in order here."""
+    result = future.result()
+    if raw_file is not None:
+        raw_file.write(result)
+
+
+if __name__ == "__main__":
+    from layers import rainbow, sparkle, black
+
+    g = Grid(Grid.DRAW_STYLE_ADD, 32, 32)
+    g.brush_size = Grid.MAX_BRUSH
+    g.on_paint(rainbow, 10, 10)
+    g.on_paint(sparkle, 20, 20)
+    g.on_paint(black, 16, 16)
+    n = export_animation(g, "export_frames", 0, 2, 15, scale=8)
+    print(f"Wrote {n} frames to export_frames/")
@@ -1,8 +1,84 @@
 from __future__ import annotations
+import itertools
+from data_structures.bitmap import Bitmap
 from data_structures.referential_array import ArrayR
-from layer_store import SequenceLayerStore, AdditiveLayerStore, SetLayerStore
+from layer_store import LayerStore, SequenceLayerStore, AdditiveLayerStore, SetLayerStore
 from layer_util import Layer
 
+# Grid versions are drawn from one counter, so that no two grid states share a version.
+_versions = itertools.count(1)
+
+
+class GridColumn:
+    """
+    Column x of a grid. column[y] is the LayerStore at (x, y),
+    which is created the first time it is accessed.
+    """
+
+    def __init__(self, grid: Grid, x: int) -> None:
+        self.grid = grid
+        self.x = x
+
+    def __len__(self) -> int:
+        return self.grid.y
+
+    def __getitem__(self, y: int) -> LayerStore:
+        return self.grid.store_at(self.x, y)
+
+
+class GridSnapshot:
+    """
+    A read-only view of a Grid taken by Grid.snapshot().
+    Offers the reading side of the Grid interface used when rendering.
+    """
+
+    def __init__(self, grid: Grid, chunks: dict, blank_store: LayerStore) -> None:
+        self.draw_style = grid.draw_style
+        self.x = grid.x
+        self.y = grid.y
+        self.CHUNK_SIZE = grid.CHUNK_SIZE
+        self.version = grid.version
+        self.blank_store = blank_store
+        self._chunks = chunks
+
+    def peek(self, x: int, y: int) -> LayerStore | None:
+        """The LayerStore at (x, y) if it had been created, otherwise None."""
+        size = self.CHUNK_SIZE
+        stores = self._chunks.get((x // size, y // size))
+        if stores is None:
+            return None
+        return stores[(x % size) * size + y % size]
+
+    def chunk_stores(self, cx: int, cy: int) -> list[LayerStore | None] | None:
+        """The stores of chunk (cx, cy), laid out as in Grid.chunk_stores."""
+        return self._chunks.get((cx, cy))
+
+
+class GridClip:
+    """
+    The stores of a width x height rectangle of a grid, taken by Grid.copy_region()
+    and written back by Grid.paste_region().
+
+    columns[i][j] is the store of square (i, j) of the rectangle, or None if that square
+    had not been created; columns[i] is None if no square of the column had been.
+    blank_store is a copy of the grid's blank_store when the clip was taken, which the
+    squares that had not been created showed; it is None for a blank clip.
+    The stores are shared with the grid they came from, which copies them before
+    writing to them, so a clip must only be read.
+    """
+
+    def __init__(self, draw_style: str, width: int, height: int, columns: list, blank_store: LayerStore = None) -> None:
+        self.draw_style = draw_style
+        self.width = width
+        self.height = height
+        self.columns = columns
+        self.blank_store = blank_store
+
+    @classmethod
+    def blank(cls, draw_style: str, width: int, height: int) -> GridClip:
+        """A clip of squares that have not been created, which paste_region() writes by emptying them."""
+        return cls(draw_style, width, height, [None] * width)
+
 
 class Grid:
     DRAW_STYLE_SET = "SET"
@@ -18,6 +94,9 @@ class Grid:
     MAX_BRUSH = 5
     MIN_BRUSH = 0
 
+    # Squares are stored in CHUNK_SIZE x CHUNK_SIZE chunks, allocated on first access.
+    CHUNK_SIZE = 64
+
     def __init__(self, draw_style, x, y) -> None:
         """
         Initialise the grid object.
@@ -29,36 +108,267 @@ class Grid:
 
         Should also intialise the brush size to the DEFAULT provided as a class variable.
 
-        Time Complexity: O(n) Linear Time Complexity respect to product of x and y dimension
-        Best Case: O(1) Constant Time: Considering when x and y is 1 which is the smallest possible grid
-        Worst Case: O(n) Linear Time: When x and y at maximum values
+        Squares are not created here: they live in chunks that are allocated
+        the first time one of their squares is accessed, so memory is
+        proportional to the painted area rather than to x * y.
+
+        Time Complexity: O(x) Linear Time Complexity respect to the x dimension, for the column views
+        Best Case: O(1) Constant Time: Considering when x is 1
+        Worst Case: O(x) Linear Time: When x is at its maximum value
         """
         self.draw_style = draw_style
         self.x = x
         self.y = y
         self.brush_size = Grid.DEFAULT_BRUSH_SIZE
+        self._chunks = {}
+        # Chunks whose store list is also held by a snapshot, and for chunks copied
+        # from a snapshot, which of their stores are no longer shared with it.
+        self._shared = set()
+        self._owned = {}
+        # Chunk tables set aside by clear(), released a few chunks at a time by release_stale(),
+        # each with the number of created stores in every chunk.
+        self._stale = []
+        # Created stores, in total and per chunk, kept up to date for memory accounting.
+        self.store_count = 0
+        self._filled = {}
+        self.stale_store_count = 0
+        # Changed whenever a store may be changed, so that renders of an unchanged grid can be reused.
+        self.version = next(_versions)
+        # Squares accessed for writing since the last take_dirty(), one bitmap per chunk,
+        # and whether special() may have changed every square.
+        self._dirty = {}
+        self._all_dirty = False
+        # The state of every square that has not been created yet.
+        self.blank_store = self._new_store()
         self.grid = ArrayR(x)
+        for i in range(self.x):
+            self.grid[i] = GridColumn(self, i)
 
+    def _new_store(self) -> LayerStore:
+        """
+        Create an empty LayerStore for the draw style.
 
-        for i in range(self.x):
-            row = ArrayR(self.y)
-            for j in range(self.y):
-                if draw_style == Grid.DRAW_STYLE_SET:
-                    row[j] = SetLayerStore()
-                elif draw_style == Grid.DRAW_STYLE_ADD:
-                    row[j] = AdditiveLayerStore()
-                elif draw_style == Grid.DRAW_STYLE_SEQUENCE:
-                    row[j] = SequenceLayerStore()
-            self.grid[i] = row
-
-    def __getitem__(self, index: int) -> ArrayR:
+        Time Complexity: O(1) Constant Time Complexity
+        """
+        if self.draw_style == Grid.DRAW_STYLE_SET:
+            return SetLayerStore()
+        elif self.draw_style == Grid.DRAW_STYLE_ADD:
+            return AdditiveLayerStore()
+        elif self.draw_style == Grid.DRAW_STYLE_SEQUENCE:
+            return SequenceLayerStore()
+        raise ValueError(f"Unknown draw style {self.draw_style}")
+
+    def __getitem__(self, index: int) -> GridColumn:
         '''
-        Get the row at the indicated index in grid
+        Get the column at the indicated index in grid
         
         Time Complexity: O(1) Constant Time Complexity
         '''
         return self.grid[index]
 
+    def store_at(self, x: int, y: int) -> LayerStore:
+        """
+        The LayerStore at (x, y), creating its chunk and the store itself if needed.
+        A created store starts as a copy of blank_store.
+        The store returned may be modified, so if a snapshot still holds it, it is copied first,
+        and the grid version is changed.
+
+        Time Complexity: O(1) Constant Time Complexity, O(CHUNK_SIZE^2) when the chunk is allocated or copied
+        """
+        if not (0 <= x < self.x and 0 <= y < self.y):
+            raise IndexError(f"({x}, {y}) is outside the grid")
+        self.version = next(_versions)
+        size = self.CHUNK_SIZE
+        key = (x // size, y // size)
+        dirty = self._dirty.get(key)
+        if dirty is None:
+            dirty = self._dirty[key] = Bitmap(size, size)
+        dirty.add(x % size, y % size)
+        stores = self._writable_chunk(key)
+        i = (x % size) * size + y % size
+        store = stores[i]
+        if store is None:
+            store = stores[i] = self.blank_store.copy()
+            self.store_count += 1
+            self._filled[key] = self._filled.get(key, 0) + 1
+            owned = self._owned.get(key)
+            if owned is not None:
+                owned[i] = 1
+            return store
+        return self._writable_store(key, stores, i)
+
+    def _writable_chunk(self, key: tuple[int, int]) -> list[LayerStore | None]:
+        """
+        The store list of a chunk, allocating it if needed.
+        If a snapshot holds the list, the grid switches to its own copy of it,
+        whose stores are still shared until they are written to.
+
+        Time Complexity: O(1) Constant Time Complexity, O(CHUNK_SIZE^2) when the chunk is allocated or copied
+        """
+        stores = self._chunks.get(key)
+        if stores is None:
+            size = self.CHUNK_SIZE
+            stores = self._chunks[key] = [None] * (size * size)
+        elif key in self._shared:
+            stores = self._chunks[key] = stores[:]
+            self._shared.discard(key)
+            self._owned[key] = bytearray(len(stores))
+        return stores
+
+    def _writable_store(self, key: tuple[int, int], stores: list[LayerStore | None], i: int) -> LayerStore:
+        """
+        Store i of a writable chunk, copying it first if a snapshot may still hold it.
+
+        Time Complexity: O(1) Constant Time Complexity, plus the store copy when shared
+        """
+        owned = self._owned.get(key)
+        if owned is not None and not owned[i]:
+            stores[i] = stores[i].copy()
+            owned[i] = 1
+        return stores[i]
+
+    def clear(self, draw_style: str = None) -> None:
+        """
+        Make every square empty again, optionally switching to another draw style,
+        and reset the brush size.
+
+        The chunks are not visited: the chunk table is set aside whole, and squares
+        are created afresh on their next write. The old chunks are freed later by
+        release_stale(), so clearing a large canvas never stalls.
+
+        :raises ValueError: if draw_style is not one of DRAW_STYLE_OPTIONS, leaving the grid unchanged
+
+        Time Complexity: O(1) Constant Time Complexity
+        """
+        if draw_style is not None:
+            if draw_style not in Grid.DRAW_STYLE_OPTIONS:
+                raise ValueError(f"Unknown draw style {draw_style}")
+            self.draw_style = draw_style
+        if self._chunks:
+            self._stale.append((self._chunks, self._filled))
+            self.stale_store_count += self.store_count
+        self._chunks = {}
+        self._filled = {}
+        self.store_count = 0
+        self._shared = set()
+        self._owned = {}
+        self._dirty = {}
+        self._all_dirty = True
+        self.version = next(_versions)
+        self.blank_store = self._new_store()
+        self.brush_size = Grid.DEFAULT_BRUSH_SIZE
+
+    def release_stale(self, chunks: int = 1) -> int:
+        """
+        Free up to `chunks` of the chunks set aside by clear().
+        Returns how many chunks are still waiting to be freed.
+
+        Time Complexity: O(chunks * CHUNK_SIZE^2)
+        """
+        while chunks > 0 and self._stale:
+            table, filled = self._stale[-1]
+            if table:
+                key, _ = table.popitem()
+                self.stale_store_count -= filled.pop(key, 0)
+                chunks -= 1
+            else:
+                self._stale.pop()
+        return self.stale_chunks()
+
+    def stale_chunks(self) -> int:
+        """
+        Number of chunks set aside by clear() and not yet freed.
+
+        Time Complexity: O(T) where T is the number of clears whose chunks are still waiting, usually 0 or 1
+        """
+        return sum(len(table) for table, _ in self._stale)
+
+    def snapshot(self) -> GridSnapshot:
+        """
+        A read-only copy of the grid as it is now, that later changes to the grid do not affect.
+        Chunks are shared with the snapshot, and copied by the grid the first time they are written to.
+
+        Time Complexity: O(C) Linear Time Complexity, where C is the number of allocated chunks
+        """
+        self._shared = set(self._chunks)
+        return GridSnapshot(self, dict(self._chunks), self.blank_store.copy())
+
+    def peek(self, x: int, y: int) -> LayerStore | None:
+        """
+        The LayerStore at (x, y) if it has been created, otherwise None.
+        Never allocates; use this when only reading.
+
+        Time Complexity: O(1) Constant Time Complexity
+        """
+        size = self.CHUNK_SIZE
+        stores = self._chunks.get((x // size, y // size))
+        if stores is None:
+            return None
+        return stores[(x % size) * size + y % size]
+
+    def chunk_stores(self, cx: int, cy: int) -> list[LayerStore | None] | None:
+        """
+        The stores of chunk (cx, cy), which covers squares [cx*CHUNK_SIZE, (cx+1)*CHUNK_SIZE) x [cy*CHUNK_SIZE, (cy+1)*CHUNK_SIZE).
+        The square (x, y) is at index (x % CHUNK_SIZE) * CHUNK_SIZE + y % CHUNK_SIZE, and is None if not created yet.
+        Returns None if no square of the chunk has been accessed.
+
+        Time Complexity: O(1) Constant Time Complexity
+        """
+        return self._chunks.get((cx, cy))
+
+    def created_stores(self):
+        """
+        Yields (x, y, store) for every square that has been created, chunk by chunk.
+        Never allocates; the stores must only be read.
+
+        Time Complexity: O(C * CHUNK_SIZE^2) where C is the number of allocated chunks
+        """
+        size = self.CHUNK_SIZE
+        for (cx, cy), stores in list(self._chunks.items()):
+            for i, store in enumerate(stores):
+                if store is not None:
+                    yield cx * size + i // size, cy * size + i % size, store
+
+    def take_dirty(self) -> tuple[dict[tuple[int, int], Bitmap], bool]:
+        """
+        The squares that may have changed since the last call, and start tracking afresh.
+        Returns (chunks, everything):
+        - chunks maps (cx, cy) to a Bitmap of the squares of that chunk accessed for writing,
+          where bit (x, y) stands for square (cx*CHUNK_SIZE + x, cy*CHUNK_SIZE + y).
+          paint_region() marks the box around the squares it painted in each chunk.
+        - everything is True if special() was used, so that every square may have changed.
+
+        Time Complexity: O(1) Constant Time Complexity
+        """
+        dirty, everything = self._dirty, self._all_dirty
+        self._dirty = {}
+        self._all_dirty = False
+        return dirty, everything
+
+    def allocated_chunks(self) -> int:
+        """Number of chunks currently allocated."""
+        return len(self._chunks)
+
+    def chunk_keys(self) -> list[tuple[int, int]]:
+        """The (cx, cy) of every allocated chunk."""
+        return list(self._chunks)
+
+    def memory_counts(self) -> dict[str, int]:
+        """
+        The objects held by the grid, from counters kept up to date as it changes
+        (see memory.MemoryMonitor), so the squares are never walked.
+
+        Time Complexity: O(T) as for stale_chunks()
+        """
+        return {
+            "stores": self.store_count,
+            "chunks": len(self._chunks),
+            "stale_stores": self.stale_store_count,
+            "stale_chunks": self.stale_chunks(),
+            "dirty_bitmaps": len(self._dirty),
+            "columns": self.x,
+        }
+
 
     def increase_brush_size(self) -> None:
         """
@@ -86,17 +396,35 @@ class Grid:
         if self.brush_size > self.MIN_BRUSH:
             self.brush_size -=1
 
-    def special(self) -> None:
+    def special(self, times: int = 1, skip: set[tuple[int, int]] = None) -> None:
         """
         Activate the special affect on all grid squares.
+        - times: how many times to apply it.
+        - skip: created squares (x, y) to leave unchanged.
+
+        Squares that have not been created share blank_store, so it is applied to it once.
 
-        Time Complexity: O(N) Linear Time Complexity
-        Best Case: O(1) Constant Time Complexity: if both x and y are 1.
-        Worst Case: O(N) Linear Time Complexity: when both x and y have the maximum allowed values.
+        Time Complexity: O(N*T) Linear Time Complexity, where N is the number of created squares and T is times
+        Best Case: O(1) Constant Time Complexity: if nothing has been painted, or times is 0.
+        Worst Case: O(N*T) Linear Time Complexity: when every square has been created.
         """
-        for i in range(self.x):
-            for j in range(self.y):
-                self.grid[i][j].special()
+        if times <= 0:
+            return
+        self.version = next(_versions)
+        self._all_dirty = True
+        size = self.CHUNK_SIZE
+        for key in list(self._chunks):
+            stores = self._writable_chunk(key)
+            for i in range(len(stores)):
+                if stores[i] is None:
+                    continue
+                if skip and (key[0] * size + i // size, key[1] * size + i % size) in skip:
+                    continue
+                store = self._writable_store(key, stores, i)
+                for _ in range(times):
+                    store.special()
+        for _ in range(times):
+            self.blank_store.special()
 
 
     def manhattan_distance(self, x1: int, y1: int, x2: int, y2: int) -> None:
@@ -124,24 +452,403 @@ class Grid:
         :param px: x-coordinate of the painting point.
         :param py: y-coordinate of the painting point.
 
-        Time Complexity: O(N^2) Qudratic Time Complexity:considering N to be maximum of x and y.
-        Best Case: O(1) Constant Time Complexity: when x and y is 1.
-        Worst Case: O(N^2) Qudratic Time Complexity: when both x and y have the maximum allowed values.
+        Only the squares inside the brush diamond are visited, column by column.
 
-        """
-        # for i in range(self.x):
-        #     for j in range(self.y):
-        #         if self.manhattan_distance(px, py, i, j) <= self.brush_size:
-        #             self.grid[i][j].add(layer)
-  
+        Time Complexity: O(B^2) Qudratic Time Complexity: considering B to be the brush size.
+        Best Case: O(1) Constant Time Complexity: when the brush size is 0.
+        Worst Case: O(B^2) Qudratic Time Complexity: when the whole brush is inside the grid.
 
+        """
         list_to_create_paint_action = []
 
-        for i in range(self.x):
-            for j in range(self.y):
-                if self.manhattan_distance(px, py, i, j) <= self.brush_size:
-                    self.grid[i][j].add(layer)
-                    list_to_create_paint_action.append((layer,i,j))
-                   
+        size = self.brush_size
+        for i in range(max(0, px - size), min(self.x, px + size + 1)):
+            reach = size - abs(px - i)
+            for j in range(max(0, py - reach), min(self.y, py + reach + 1)):
+                self.store_at(i, j).add(layer)
+                list_to_create_paint_action.append((layer,i,j))
+
+        return list_to_create_paint_action
+
+    def on_paint_stroke(self, layer: Layer, points: list[tuple[int, int]]) -> list[tuple[Layer, int, int]]:
+        """
+        Paints the squares covered by the brush at any of the points, each square once,
+        however many of the brush diamonds it lies in.
+
+        :param layer: Layer object to paint with.
+        :param points: brush positions along the stroke.
+        :return: (layer, x, y) for every square painted, column by column.
+
+        The coverage is collected in a Bitmap over the bounding box of the stroke,
+        with one row per column of the grid, so each column of a diamond is one bit run.
+
+        Time Complexity: O(P*B + A) where P is the number of points, B the brush size
+        and A the area of the bounding box / 64.
+        Best Case: O(1) Constant Time Complexity: when every point is outside the grid.
+        Worst Case: O(P*B + A): when the stroke lies inside the grid.
+        """
+        size = self.brush_size
+        if not points:
+            return []
+        x0 = max(0, min(px for px, _ in points) - size)
+        x1 = min(self.x, max(px for px, _ in points) + size + 1)
+        y0 = max(0, min(py for _, py in points) - size)
+        y1 = min(self.y, max(py for _, py in points) + size + 1)
+        if x1 <= x0 or y1 <= y0:
+            return []
+        coverage = Bitmap(y1 - y0, x1 - x0)
+        for px, py in points:
+            for i in range(max(x0, px - size), min(x1, px + size + 1)):
+                reach = size - abs(px - i)
+                coverage.fill_rect(py - reach - y0, i - x0, py + reach + 1 - y0, i - x0 + 1)
+
+        painted = []
+        for j, i in coverage:
+            self.store_at(x0 + i, y0 + j).add(layer)
+            painted.append((layer, x0 + i, y0 + j))
+        return painted
+
+
+    def on_fill(self, layer: Layer, px: int, py: int) -> tuple[int, int, Bitmap]:
+        """
+        Flood fill: paints the layer on every square connected to (px, py), through
+        squares sharing an edge, whose LayerStore shows the same layers as the one at (px, py).
+        The brush size is not used.
+
+        :param layer: Layer object to paint with.
+        :param px: x-coordinate of the seed square.
+        :param py: y-coordinate of the seed square.
+        :return: (x0, y0, region), the squares painted as for fill_region.
+
+        Time Complexity: O(F + C*CHUNK_SIZE) where F is the number of squares filled and
+        C the number of chunk columns scanned, see fill_region and paint_region.
+        Best Case: O(Y/64) when only the seed square is filled.
+        Worst Case: O(X*Y) when the whole grid is filled.
+        """
+        x0, y0, region = self.fill_region(px, py)
+        self.paint_region(layer, x0, y0, region)
+        return x0, y0, region
+
+    def fill_region(self, px: int, py: int) -> tuple[int, int, Bitmap]:
+        """
+        The squares connected to (px, py), through squares sharing an edge,
+        whose stores have the same signature as the one at (px, py).
+        Squares that have not been created count as blank_store.
+
+        Scanline fill with an explicit stack: every column of the grid is held as an int,
+        bit y standing for square (x, y), so a run of squares is found and taken with a few
+        int operations, and only the runs of the neighbouring columns touching it are pushed.
+
+        :return: (x0, y0, region) where region is a Bitmap over the bounding box of the squares,
+                 with one row per column of the grid: bit (j, i) stands for square (x0 + i, y0 + j).
+        :raises IndexError: if (px, py) is outside the grid
 
-        return list_to_create_paint_action
\ No newline at end of file
+        Time Complexity: O(R + K*Y/64) where R is the number of runs filled, K the number of
+        columns they lie in, plus O(CHUNK_SIZE) for each allocated chunk of those columns.
+        Best Case: O(Y/64) when only the seed square is filled.
+        Worst Case: O(X*Y) when the grid is filled in a chequered pattern.
+        """
+        if not (0 <= px < self.x and 0 <= py < self.y):
+            raise IndexError(f"({px}, {py}) is outside the grid")
+        seed = self.peek(px, py) or self.blank_store
+        target = seed.signature()
+        # Store -> whether it has the target signature, as the digit b"0" or b"1".
+        matches = {None: ord("1") if self.blank_store.signature() == target else ord("0")}
+        # x -> squares of column x with the target signature that are not filled yet.
+        open_squares = {}
+        filled = {}
+        stack = [(px, py)]
+        while stack:
+            x, y = stack.pop()
+            column = open_squares.get(x)
+            if column is None:
+                column = self._matching_column(x, target, matches)
+            if not column >> y & 1:
+                continue
+            # The run of set bits around y: from just above the highest clear bit below y,
+            # up to just below the lowest clear bit above it.
+            lo = (~column & ((1 << y) - 1)).bit_length()
+            above = ~(column >> y)
+            hi = y + (above & -above).bit_length() - 1
+            run = (1 << hi) - (1 << lo)
+            open_squares[x] = column & ~run
+            filled[x] = filled.get(x, 0) | run
+            for nx in (x - 1, x + 1):
+                if not 0 <= nx < self.x:
+                    continue
+                touching = open_squares.get(nx)
+                if touching is None:
+                    touching = open_squares[nx] = self._matching_column(nx, target, matches)
+                touching &= run
+                # One seed per run of the neighbouring column that touches this run.
+                while touching:
+                    start = (touching & -touching).bit_length() - 1
+                    above = ~(touching >> start)
+                    end = start + (above & -above).bit_length() - 1
+                    stack.append((nx, start))
+                    touching &= ~((1 << end) - (1 << start))
+
+        x0, x1 = min(filled), max(filled) + 1
+        everything = 0
+        for column in filled.values():
+            everything |= column
+        y0 = (everything & -everything).bit_length() - 1
+        y1 = everything.bit_length()
+        region = Bitmap(y1 - y0, x1 - x0)
+        for x, column in filled.items():
+            region.set_row(x - x0, column >> y0)
+        return x0, y0, region
+
+    def _matching_column(self, x: int, target: tuple, matches: dict) -> int:
+        """
+        Column x as an int, bit y set if the store at (x, y) has the given signature.
+        matches caches the answer for each store seen, as fill_region sets it up.
+        Chunks that are not allocated are all blank, and are matched whole.
+
+        Time Complexity: O(Y/64 + A*CHUNK_SIZE) where A is the number of allocated chunks in the column,
+        with the work per square done in C, and one signature() per distinct store.
+        """
+        size = self.CHUNK_SIZE
+        cx, start = x // size, (x % size) * size
+        blank = matches[None] == ord("1")
+        full = (1 << size) - 1
+        column = 0
+        for cy in range(-(-self.y // size)):
+            stores = self._chunks.get((cx, cy))
+            if stores is None:
+                if blank:
+                    column |= full << (cy * size)
+                continue
+            part = stores[start:start + size]
+            # Only the new stores are looked for in matches, which grows with every store seen.
+            for store in [store for store in set(part) if store not in matches]:
+                matches[store] = ord("1") if store.signature() == target else ord("0")
+            # The squares as binary digits, most significant (last square) first.
+            column |= int(bytes(map(matches.__getitem__, reversed(part))), 2) << (cy * size)
+        return column & ((1 << self.y) - 1)
+
+    def paint_region(self, layer: Layer, x0: int, y0: int, region: Bitmap, erase: bool = False) -> None:
+        """
+        Add the layer to (or with erase, erase it from) every square of a region,
+        given as fill_region returns it, in one batched pass.
+
+        Squares that show the same layers before end up the same, so the layer is applied
+        once per distinct signature, and the squares share the resulting store. A shared store
+        is marked as not owned by its chunk, so it is copied the first time it is written to,
+        as stores shared with a snapshot are.
+
+        Time Complexity: O(S + D*L) where S is the number of squares in the region, D the number
+        of distinct signatures among them and L the cost of one add or erase.
+        Best Case: O(X/64) when the region is empty.
+        Worst Case: O(S*L) when every square shows different layers.
+        """
+        self.version = next(_versions)
+        size = self.CHUNK_SIZE
+        full = (1 << size) - 1
+        # Store replaced (None for squares not created yet) -> the store replacing it, and by signature.
+        # Holding the replaced stores here also keeps them alive until the region is done.
+        results = {}
+        by_signature = {}
+        # (cx, cy) -> [x0, x1, y0, y1], the squares of the chunk painted lie in [x0, x1] x [y0, y1).
+        boxes = {}
+        for i in range(region.height):
+            column = region.row(i) << y0
+            x = x0 + i
+            cx, xi = divmod(x, size)
+            base = xi * size
+            while column:
+                cy = ((column & -column).bit_length() - 1) // size
+                bits = column >> (cy * size) & full
+                column &= ~(full << (cy * size))
+                key = (cx, cy)
+                stores = self._writable_chunk(key)
+                box = boxes.get(key)
+                if box is None:
+                    box = boxes[key] = [xi, xi, size, 0]
+                box[1] = xi
+                created = 0
+                # Run by run of the chunk's column, as slices.
+                while bits:
+                    start = (bits & -bits).bit_length() - 1
+                    above = ~(bits >> start)
+                    end = start + (above & -above).bit_length() - 1
+                    bits &= ~((1 << end) - (1 << start))
+                    lo, hi = base + start, base + end
+                    old = stores[lo:hi]
+                    for store in set(old) - results.keys():
+                        source = store or self.blank_store
+                        signature = source.signature()
+                        result = by_signature.get(signature)
+                        if result is None:
+                            result = by_signature[signature] = source.copy()
+                            if erase:
+                                result.erase(layer)
+                            else:
+                                result.add(layer)
+                        results[store] = result
+                    stores[lo:hi] = map(results.__getitem__, old)
+                    self._disown(key, lo, hi)
+                    created += old.count(None)
+                    box[2] = min(box[2], start)
+                    box[3] = max(box[3], end)
+                if created:
+                    self.store_count += created
+                    self._filled[key] = self._filled.get(key, 0) + created
+        self._mark_boxes(boxes)
+
+    def _mark_boxes(self, boxes: dict) -> None:
+        """
+        Mark squares as accessed for writing by box: boxes maps (cx, cy) to [x0, x1, y0, y1],
+        the box [x0, x1] x [y0, y1) of chunk positions to mark.
+        A box takes a few slice writes, where marking its squares one by one would take one each;
+        the other squares of a box are marked too, although unchanged.
+
+        Time Complexity: O(B * CHUNK_SIZE) where B is the number of boxes
+        """
+        size = self.CHUNK_SIZE
+        for key, (bx0, bx1, by0, by1) in boxes.items():
+            dirty = self._dirty.get(key)
+            if dirty is None:
+                dirty = self._dirty[key] = Bitmap(size, size)
+            dirty.fill_rect(bx0, by0, bx1 + 1, by1)
+
+    def _disown(self, key: tuple[int, int], lo: int, hi: int) -> None:
+        """
+        Mark stores [lo, hi) of a writable chunk as shared, so they are copied before being written to.
+
+        Time Complexity: O(hi - lo), as a slice write; O(CHUNK_SIZE^2) the first time for a chunk
+        """
+        owned = self._owned.get(key)
+        if owned is None:
+            size = self.CHUNK_SIZE
+            owned = self._owned[key] = bytearray(b"\x01") * (size * size)
+        owned[lo:hi] = bytes(hi - lo)
+
+    def copy_region(self, x0: int, y0: int, x1: int, y1: int) -> GridClip:
+        """
+        The stores of the rectangle [x0, x1) x [y0, y1), clipped to the grid, as a GridClip.
+        The stores are not copied: they are sliced out of the chunks whole, and marked as
+        shared so the grid copies them before its next write to them. Chunks are never allocated.
+
+        :raises ValueError: if the rectangle has no square inside the grid
+
+        Time Complexity: O(W * H / CHUNK_SIZE + W * H) where W x H is the size of the rectangle,
+        with the work per square done by slices.
+        Best Case: O(W * H / CHUNK_SIZE) when no chunk of the rectangle is allocated.
+        Worst Case: O(W * H) when every chunk is.
+        """
+        x0, y0 = max(0, x0), max(0, y0)
+        x1, y1 = min(self.x, x1), min(self.y, y1)
+        if x1 <= x0 or y1 <= y0:
+            raise ValueError("The rectangle has no square inside the grid")
+        size = self.CHUNK_SIZE
+        columns = []
+        for x in range(x0, x1):
+            cx, base = x // size, (x % size) * size
+            column = []
+            for cy in range(y0 // size, (y1 - 1) // size + 1):
+                lo = max(y0 - cy * size, 0)
+                hi = min(y1 - cy * size, size)
+                if (cx, cy) not in self._chunks:
+                    column.extend([None] * (hi - lo))
+                    continue
+                # Written to, so it must not stay shared with a snapshot while its stores are disowned.
+                stores = self._writable_chunk((cx, cy))
+                column.extend(stores[base + lo:base + hi])
+                self._disown((cx, cy), base + lo, base + hi)
+            columns.append(None if column.count(None) == len(column) else column)
+        return GridClip(self.draw_style, x1 - x0, y1 - y0, columns, self.blank_store.copy())
+
+    def paste_region(self, clip: GridClip, x0: int, y0: int) -> GridClip:
+        """
+        Write the stores of a clip to the rectangle starting at (x0, y0); the part of the clip
+        past the edges of the grid is left out. Squares the clip holds as None are written as
+        the clip's blank_store, so the clip pastes as it was copied; they are emptied instead,
+        showing blank_store again, for a blank clip or while blank_store still looks the same
+        as the clip's. The stores are shared with the clip, and copied before the
+        grid's next write to them. Stores of another draw style are converted, by adding their layers
+        to an empty store of this one.
+
+        :return: the clip of what was there before, which pasted back at (x0, y0) undoes the paste.
+        :raises IndexError: if (x0, y0) is outside the grid
+
+        Time Complexity: O(W * H / CHUNK_SIZE + W * H) where W x H is the part of the clip pasted,
+        with the work per square done by slices.
+        Best Case: O(W * H / CHUNK_SIZE) when a blank clip is pasted where no chunk is allocated.
+        Worst Case: O(W * H) otherwise.
+        """
+        if not (0 <= x0 < self.x and 0 <= y0 < self.y):
+            raise IndexError(f"({x0}, {y0}) is outside the grid")
+        x1, y1 = min(self.x, x0 + clip.width), min(self.y, y0 + clip.height)
+        replaced = self.copy_region(x0, y0, x1, y1)
+        self.version = next(_versions)
+        size = self.CHUNK_SIZE
+        converted = {None: None}
+        # What the clip's uncreated squares are written as: None while they would look the same empty.
+        fill = clip.blank_store
+        if fill is not None:
+            if clip.draw_style != self.draw_style:
+                fill = self._converted(fill, converted)
+            if fill.signature() == self.blank_store.signature():
+                fill = None
+        boxes = {}
+        for x in range(x0, x1):
+            cx, xi = divmod(x, size)
+            base = xi * size
+            column = clip.columns[x - x0]
+            for cy in range(y0 // size, (y1 - 1) // size + 1):
+                lo = max(y0 - cy * size, 0)
+                hi = min(y1 - cy * size, size)
+                key = (cx, cy)
+                if column is None:
+                    part = [fill] * (hi - lo)
+                else:
+                    start = cy * size + lo - y0
+                    part = column[start:start + hi - lo]
+                    if clip.draw_style != self.draw_style:
+                        part = [self._converted(store, converted) for store in part]
+                    if fill is not None:
+                        part = [fill if store is None else store for store in part]
+                if key not in self._chunks and part.count(None) == len(part):
+                    # Already empty.
+                    continue
+                stores = self._writable_chunk(key)
+                created = part.count(None) - stores[base + lo:base + hi].count(None)
+                stores[base + lo:base + hi] = part
+                self._disown(key, base + lo, base + hi)
+                if created:
+                    self.store_count -= created
+                    self._filled[key] = self._filled.get(key, 0) - created
+                box = boxes.get(key)
+                if box is None:
+                    box = boxes[key] = [xi, xi, lo, hi]
+                box[1] = xi
+                box[2] = min(box[2], lo)
+                box[3] = max(box[3], hi)
+        self._mark_boxes(boxes)
+        return replaced
+
+    def _converted(self, store: LayerStore | None, converted: dict) -> LayerStore | None:
+        """A store of this grid's draw style holding the layers of the given one, made once per store."""
+        result = converted.get(store, False)
+        if result is False:
+            result = converted[store] = self._new_store()
+            for layer in store.layers():
+                result.add(layer)
+        return result
+
+    def clear_region(self, x0: int, y0: int, x1: int, y1: int) -> GridClip:
+        """
+        Empty the squares of the rectangle [x0, x1) x [y0, y1), clipped to the grid,
+        as paste_region() does with a blank clip. Chunks that are not allocated are skipped.
+
+        :return: the clip of what was there before, which pasted back at the clipped (x0, y0) undoes the clear.
+        :raises ValueError: if the rectangle has no square inside the grid
+
+        Time Complexity: as for paste_region
+        """
+        x0, y0 = max(0, x0), max(0, y0)
+        x1, y1 = min(self.x, x1), min(self.y, y1)
+        if x1 <= x0 or y1 <= y0:
+            raise ValueError("The rectangle has no square inside the grid")
+        return self.paste_region(GridClip.blank(self.draw_style, x1 - x0, y1 - y0), x0, y0)
@@ -0,0 +1,160 @@
+"""
+Session journal.
+
+A PaintController with a journal attached appends every request that changes
+the canvas or its history (paints, fills, region operations, undo, redo,
+special, clears and replay steps) to a journal file as it applies it, one
+JSON object per line:
+
+    {"op": "init", "width": 32, "height": 32, "draw_style": "SET"}    first line
+    {"op": "paint", "layer": "red", "x": 3, "y": 4, "brush": 2}
+    {"op": "undo", "n": 1}
+
+The controller is deterministic, so applying the same requests to a blank
+canvas rebuilds the grid and both trackers exactly: see PaintController.recover().
+Requests the grid rejects are not recorded, so recovery never meets one that raises.
+
+Appending only queues the record. A background thread encodes and writes
+everything queued so far in one go, and calls fsync at most once every
+fsync_interval seconds for all the records written since the last one
+(group commit). The caller never waits for the disk, and a crash loses at
+most the records of the last fsync_interval. A line cut short by a crash
+is dropped on recovery.
+"""
+from __future__ import annotations
+import json
+import os
+import queue
+import threading
+import time
+
+# Markers queued in place of a record: wait for the disk, or stop the writer.
+_FLUSH = object()
+_CLOSE = object()
+
+
+class Journal:
+    """
+    An append-only journal file, written by a background thread.
+
+    Usage:  journal = Journal(path)
+            journal.append("paint", {"layer": "red", ...})   # never waits for the disk
+            journal.flush()                                  # wait until it is on disk
+            journal.close()
+    """
+
+    # Seconds between two fsyncs at most, while records are being written.
+    FSYNC_INTERVAL = 0.2
+
+    def __init__(self, path: str, fsync_interval: float = FSYNC_INTERVAL) -> None:
+        """Open path for appending, creating it if needed. is_new tells whether it was empty."""
+        self.path = path
+        self.fsync_interval = fsync_interval
+        self._file = open(path, "ab")
+        self.is_new = self._file.tell() == 0
+        # Records written and fsyncs made by the writer, and the error that stopped it, if any.
+        self.written = 0
+        self.syncs = 0
+        self.error = None
+        self._queue = queue.SimpleQueue()
+        self._writer = threading.Thread(target=self._run, name="journal-writer", daemon=True)
+        self._writer.start()
+
+    def append(self, op: str, fields: dict) -> None:
+        """
+        Queue the record {"op": op, **fields}. fields must not be changed afterwards,
+        as the record is only encoded by the writer.
+
+        Time Complexity: O(1), the record is neither encoded nor written here
+        """
+        if self.error is not None:
+            raise self.error
+        self._queue.put((op, fields))
+
+    def flush(self) -> None:
+        """Wait until every record appended so far is written and synced to disk."""
+        done = threading.Event()
+        self._queue.put((_FLUSH, done))
+        done.wait()
+        if self.error is not None:
+            raise self.error
+
+    def close(self) -> None:
+        """Write and sync the records appended so far, then close the file."""
+        if self._writer.is_alive():
+            self._queue.put((_CLOSE, None))
+            self._writer.join()
+        self._file.close()
+        if self.error is not None:
+            raise self.error
+
+    def _run(self) -> None:
+        last_sync = time.monotonic()
+        unsynced = False
+        while True:
+            # Sleep until there is something to write, or until the written records are due to be synced.
+            timeout = max(0.0, last_sync + self.fsync_interval - time.monotonic()) if unsynced else None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            batch, waiting, closing = [], [], False
+            while item is not None:
+                op, fields = item
+                if op is _FLUSH:
+                    waiting.append(fields)
+                elif op is _CLOSE:
+                    closing = True
+                else:
+                    batch.append(item)
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    item = None
+            if self.error is None:
+                try:
+                    if batch:
+                        # Handed to the OS at once, so records only wait for fsync to survive a system crash.
+                        self._file.write(b"".join(encode(op, fields) for op, fields in batch))
+                        self._file.flush()
+                        self.written += len(batch)
+                        unsynced = True
+                    if unsynced and (waiting or closing or time.monotonic() - last_sync >= self.fsync_interval):
+                        os.fsync(self._file.fileno())
+                        self.syncs += 1
+                        last_sync = time.monotonic()
+                        unsynced = False
+                except Exception as e:
+                    # Records that cannot be encoded stop the journal as disk errors do. The writer
+                    # carries on releasing flush() and close(), which raise the error.
+                    self.error = e
+            for done in waiting:
+                done.set()
+            if closing:
+                return
+
+
+def encode(op: str, fields: dict) -> bytes:
+    """One journal line."""
+    return json.dumps({"op": op, **fields}, separators=(",", ":")).encode() + b"\n"
+
+
+def read_journal(path: str) -> list[dict]:
+    """
+    The records of a journal, oldest first, or [] if there is none.
+    A last line cut short by a crash is dropped, and removed from the file so that appending can resume.
+
+    :raises ValueError: if the file does not start with an "init" record
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return []
+    end = data.rfind(b"\n") + 1
+    if end < len(data):
+        os.truncate(path, end)
+    records = [json.loads(line) for line in data[:end].splitlines()]
+    if records and records[0].get("op") != "init":
+        raise ValueError(f"{path} is not a journal")
+    return records
@@ -29,6 +29,12 @@ class LayerStore(ABC):
         """
         pass
 
+    def get_color_packed(self, start: int, timestamp, x, y) -> int:
+        """
+        get_color for colours packed with layer_util.pack, applying the packed form of each layer.
+        """
+        return pack(self.get_color(unpack(start), timestamp, x, y))
+
     @abstractmethod
     def erase(self, layer: Layer) -> bool:
         """
@@ -44,6 +50,36 @@ class LayerStore(ABC):
         """
         pass
 
+    @abstractmethod
+    def signature(self) -> tuple:
+        """
+        Returns a hashable description of the current layers.
+        Two stores of the same type with equal signatures show the same colour
+        for the same start colour, timestamp and position.
+        """
+        pass
+
+    @abstractmethod
+    def is_static(self) -> bool:
+        """
+        Returns true if the colour shown does not depend on the timestamp or position.
+        """
+        pass
+
+    @abstractmethod
+    def copy(self) -> LayerStore:
+        """
+        Returns an independent store holding the same layers.
+        """
+        pass
+
+    @abstractmethod
+    def layers(self) -> list[Layer]:
+        """
+        Returns the layers currently applied, in the order they are applied.
+        """
+        pass
+
 class SetLayerStore(LayerStore):
     """
     Set layer store. A single layer can be stored at a time (or nothing at all)
@@ -101,6 +137,19 @@ class SetLayerStore(LayerStore):
             return invert.apply(start, timestamp, x, y)
         return start
 
+    def get_color_packed(self, start: int, timestamp, x, y) -> int:
+        '''
+        get_color for packed colours.
+
+        Time Complexity: O(1) Constant Time Complexity
+        '''
+        layer = self._l[0]
+        if layer:
+            start = layer.apply_packed(start, timestamp, x, y)
+        if self._inv:
+            return invert.apply_packed(start, timestamp, x, y)
+        return start
+
     def erase(self, layer: Layer) -> bool:
         '''
         Removes single layer.
@@ -132,6 +181,44 @@ class SetLayerStore(LayerStore):
         Worst Case: Same as best case
         '''
         self._inv = not self._inv
+
+    def signature(self) -> tuple:
+        '''
+        Returns the index of the current layer (or None) together with the invert flag.
+
+        Time Complexity: O(1) Constant Time Complexity
+        '''
+        layer = self._l[0]
+        return (layer.index if layer else None, self._inv)
+
+    def is_static(self) -> bool:
+        '''
+        True if there is no layer, or the current layer is static.
+
+        Time Complexity: O(1) Constant Time Complexity
+        '''
+        layer = self._l[0]
+        return not layer or layer.static
+
+    def copy(self) -> SetLayerStore:
+        '''
+        Returns a new store with the same layer and invert flag.
+
+        Time Complexity: O(1) Constant Time Complexity
+        '''
+        store = SetLayerStore()
+        store._l[0] = self._l[0]
+        store._inv = self._inv
+        return store
+
+    def layers(self) -> list[Layer]:
+        '''
+        Returns the current layer, if any.
+
+        Time Complexity: O(1) Constant Time Complexity
+        '''
+        layer = self._l[0]
+        return [layer] if layer else []
     
 
 class AdditiveLayerStore(LayerStore):
@@ -141,18 +228,22 @@ class AdditiveLayerStore(LayerStore):
     - erase: Remove the first layer that was added. Ignore what is currently selected.
     - special: Reverse the order of current layers (first becomes last, etc.)
     """
+
+    MAX_LAYERS = 100*20
+    INITIAL_CAPACITY = 4
     
     def __init__(self) -> None:
         '''
-        Initialize AdditiveLayerStore
+        Initialize AdditiveLayerStore.
+        The queue starts small and doubles as layers are added, up to MAX_LAYERS.
 
         Time Complexity: O(1) Constant Time Complexity
         Best Case: O(1): Method initializes layer queue with fixed size
         Worst Case: O(1): Same as best case as it due to having just one operation
     
         '''
-        self._layers = CircularQueue(100*20)
-        
+        self._layers = CircularQueue(self.INITIAL_CAPACITY)
+        self._sig_static = None
 
     def add(self, layer: Layer) -> bool:
         '''
@@ -163,17 +254,29 @@ class AdditiveLayerStore(LayerStore):
         :param layer: Layer that is to be added.
         :return: True if the addition is successful,Otherwise Return False.
 
-        Time Complexity: O(log(n)), where n is the number of layers
-        Best Case: O(1): If layer is present in the store already
-        Worst Case: O(log(n)): If layer is absent in store, and binary search is needed to trace the new position of the layer is sorted list.
+        Time Complexity: O(1) amortised Constant Time Complexity
+        Best Case: O(1): The queue has room for the layer
+        Worst Case: O(n): The queue is full and its layers are moved to one twice the size
         
         '''
-        if self._layers.is_full():
+        if len(self._layers) >= self.MAX_LAYERS:
             return False
-        else:
-            self._layers.append(layer)
-            return True
-        
+        if self._layers.is_full():
+            self._grow()
+        self._layers.append(layer)
+        self._sig_static = None
+        return True
+
+    def _grow(self) -> None:
+        '''
+        Doubles the capacity of the queue, up to MAX_LAYERS, keeping the order of the layers.
+
+        Time Complexity: O(n) Linear Time Complexity, where n is the number of layers
+        '''
+        new_queue = CircularQueue(min(2 * len(self._layers.array), self.MAX_LAYERS))
+        while not self._layers.is_empty():
+            new_queue.append(self._layers.serve())
+        self._layers = new_queue
 
     def get_color(self, start, timestamp, x, y) -> Tuple[int, int, int]:
         '''
@@ -190,20 +293,31 @@ class AdditiveLayerStore(LayerStore):
         Worst Case: O(N) Linear Time Complexity: The method loops through all the layers in the queue and applies them in order.
 
         '''
-
-        
-        new_queue = CircularQueue(100*20)
         output = start
         if self._layers.is_empty():
             return start
         else:
-            for _ in range(len(self._layers)):
-                curr_layer = self._layers.serve()
-                new_queue.append(curr_layer)
+            # Read the queue in place, from front to rear.
+            array = self._layers.array
+            front = self._layers.front
+            capacity = len(array)
+            for i in range(len(self._layers)):
+                curr_layer = array[(front + i) % capacity]
                 output = curr_layer.apply(output, timestamp,x,y)
-            self._layers = new_queue
             return output
-        
+
+    def get_color_packed(self, start: int, timestamp, x, y) -> int:
+        '''
+        get_color for packed colours.
+
+        Time Complexity: O(N) Linear Time Complexity, where N is the number of layers in store.
+        '''
+        array = self._layers.array
+        front = self._layers.front
+        capacity = len(array)
+        for i in range(len(self._layers)):
+            start = array[(front + i) % capacity].apply_packed(start, timestamp, x, y)
+        return start
 
     def erase(self, layer: Layer) -> bool:
         '''
@@ -219,6 +333,7 @@ class AdditiveLayerStore(LayerStore):
         '''
         if not self._layers.is_empty():
             self._layers.serve()
+            self._sig_static = None
             return True
         return False
         
@@ -237,7 +352,67 @@ class AdditiveLayerStore(LayerStore):
             temp_stack.push(self._layers.serve())
         while not temp_stack.is_empty():
             self._layers.append(temp_stack.pop())
-        
+        self._sig_static = None
+
+    def _refresh_signature(self) -> tuple[tuple, bool]:
+        '''
+        Recomputes the cached signature from the layers in queue order, with whether every layer is static.
+        They are published as one pair, so a renderer thread never sees one updated without the other.
+
+        Time Complexity: O(N) Linear Time Complexity, where N is the number of layers in store.
+        '''
+        layers = self.layers()
+        sig_static = (tuple(layer.index for layer in layers), all(layer.static for layer in layers))
+        self._sig_static = sig_static
+        return sig_static
+
+    def signature(self) -> tuple:
+        '''
+        Returns the indices of the layers in the order they are applied.
+
+        Time Complexity: O(1) Constant Time Complexity when cached, O(N) after the store changed.
+        '''
+        sig_static = self._sig_static
+        if sig_static is None:
+            sig_static = self._refresh_signature()
+        return sig_static[0]
+
+    def is_static(self) -> bool:
+        '''
+        True if every layer in the store is static.
+
+        Time Complexity: O(1) Constant Time Complexity when cached, O(N) after the store changed.
+        '''
+        sig_static = self._sig_static
+        if sig_static is None:
+            sig_static = self._refresh_signature()
+        return sig_static[1]
+
+    def copy(self) -> AdditiveLayerStore:
+        '''
+        Returns a new store with the same layers in the same order.
+
+        Time Complexity: O(N) Linear Time Complexity, where N is the number of layers in store.
+        '''
+        store = AdditiveLayerStore()
+        store._layers = CircularQueue(len(self._layers.array))
+        array = self._layers.array
+        front = self._layers.front
+        for i in range(len(self._layers)):
+            store._layers.append(array[(front + i) % len(array)])
+        store._sig_static = self._sig_static
+        return store
+
+    def layers(self) -> list[Layer]:
+        '''
+        Returns the layers from front to rear, without serving them.
+
+        Time Complexity: O(N) Linear Time Complexity, where N is the number of layers in store.
+        '''
+        array = self._layers.array
+        front = self._layers.front
+        capacity = len(array)
+        return [array[(front + i) % capacity] for i in range(len(self._layers))]
 
 
 class SequenceLayerStore(LayerStore):
@@ -250,6 +425,9 @@ class SequenceLayerStore(LayerStore):
         In the event of two layers being the median names, pick the lexicographically smaller one.
     """
 
+    MAX_LAYERS = 100*20
+    INITIAL_CAPACITY = 4
+
     def __init__(self) -> None:
         '''
         Initializes all the necessary attributes for SequenceLayerStore
@@ -258,8 +436,9 @@ class SequenceLayerStore(LayerStore):
         Best Case: O(1)
         Worst Case: Same as best case
         '''
-        self._layers = ArraySortedList(100*20)
-        self._layers_lex = ArraySortedList(100*20)
+        self._layers = ArraySortedList(self.INITIAL_CAPACITY)
+        self._layers_lex = ArraySortedList(self.INITIAL_CAPACITY)
+        self._sig_static = None
 
     def add(self, layer: Layer) -> bool:
         """
@@ -271,7 +450,7 @@ class SequenceLayerStore(LayerStore):
        Best Case: O(1): if layer already present in store
        Worst Case: O(log(n)): If layer is absent in store, and binary search is needed to trace the new position of the layer is sorted list.
         """
-        if not self._layers.is_full():
+        if len(self._layers) < self.MAX_LAYERS:
             item = ListItem(layer, layer.index)
             item_lex = ListItem(layer, layer.name)
             if item in self._layers:
@@ -279,6 +458,7 @@ class SequenceLayerStore(LayerStore):
             else:
                 self._layers.add(item)
                 self._layers_lex.add(item_lex)
+                self._sig_static = None
                 return True
             
         return False
@@ -302,6 +482,16 @@ class SequenceLayerStore(LayerStore):
                 curr_layer = self._layers[idx].value
                 output  =  curr_layer.apply(output,timestamp, x, y)
             return output
+
+    def get_color_packed(self, start: int, timestamp, x, y) -> int:
+        '''
+        get_color for packed colours.
+
+        Time Complexity: O(n), where n is the number of layers currently applied to the grid.
+        '''
+        for idx in range(len(self._layers)):
+            start = self._layers[idx].value.apply_packed(start, timestamp, x, y)
+        return start
            
         
 
@@ -319,6 +509,7 @@ class SequenceLayerStore(LayerStore):
             self._layers.remove(item)
             item.key = item.value.name  
             self._layers_lex.remove(item)
+            self._sig_static = None
             return True
         else:
             return False
@@ -355,9 +546,59 @@ class SequenceLayerStore(LayerStore):
             self._layers_lex.remove(item)
             item.key = item.value.index
             self._layers.remove(item)
+            self._sig_static = None
             return True
-    
 
+    def _refresh_signature(self) -> tuple[tuple, bool]:
+        '''
+        Recomputes the cached signature from the layers sorted by index, with whether every layer is static.
+        They are published as one pair, so a renderer thread never sees one updated without the other.
+
+        Time Complexity: O(N) Linear Time Complexity, where N is the number of layers in store.
+        '''
+        layers = self.layers()
+        sig_static = (tuple(layer.index for layer in layers), all(layer.static for layer in layers))
+        self._sig_static = sig_static
+        return sig_static
+
+    def signature(self) -> tuple:
+        '''
+        Returns the indices of the applied layers in the order they are applied.
+
+        Time Complexity: O(1) Constant Time Complexity when cached, O(N) after the store changed.
+        '''
+        sig_static = self._sig_static
+        if sig_static is None:
+            sig_static = self._refresh_signature()
+        return sig_static[0]
+
+    def is_static(self) -> bool:
+        '''
+        True if every applied layer is static.
+
+        Time Complexity: O(1) Constant Time Complexity when cached, O(N) after the store changed.
+        '''
+        sig_static = self._sig_static
+        if sig_static is None:
+            sig_static = self._refresh_signature()
+        return sig_static[1]
+
+    def copy(self) -> SequenceLayerStore:
+        '''
+        Returns a new store with the same applied layers.
 
+        Time Complexity: O(N) Linear Time Complexity, where N is the number of layers in store, as the layers are already sorted.
+        '''
+        store = SequenceLayerStore()
+        for source, target in ((self._layers, store._layers), (self._layers_lex, store._layers_lex)):
+            target.add_many([ListItem(source[idx].value, source[idx].key) for idx in range(len(source))])
+        store._sig_static = self._sig_static
+        return store
 
-    
\ No newline at end of file
+    def layers(self) -> list[Layer]:
+        '''
+        Returns the applied layers sorted by index.
+
+        Time Complexity: O(N) Linear Time Complexity, where N is the number of layers in store.
+        '''
+        return [self._layers[idx].value for idx in range(len(self._layers))]
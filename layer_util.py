@@ -6,11 +6,27 @@ No need to edit unless adding new features.
 
 from __future__ import annotations
 from dataclasses import dataclass, field
+from fractions import Fraction
 from data_structures.referential_array import ArrayR
 
 LAYERS: ArrayR[Layer] = ArrayR(20)
 cur_layer_index = 0
 
+def pack(color: tuple[int, int, int]) -> int:
+    """An (r, g, b) colour as one int, 0xRRGGBB."""
+    return color[0] << 16 | color[1] << 8 | color[2]
+
+def unpack(color: int) -> tuple[int, int, int]:
+    """The (r, g, b) of a colour packed by pack()."""
+    return (color >> 16, color >> 8 & 0xFF, color & 0xFF)
+
+def _packed_adapter(func):
+    """A packed form of a layer that only has a tuple form."""
+    def adapted(color, timestamp, x, y):
+        return pack(func(unpack(color), timestamp, x, y))
+    adapted.__name__ = func.__name__
+    return adapted
+
 @dataclass
 class Layer:
 
@@ -18,10 +34,18 @@ class Layer:
     apply: function
     name: str = field(init=False)
     bg: tuple[int, int, int] | None = None
+    static: bool = field(init=False, default=False)
+    period: Fraction | None = field(init=False, default=None)
+    step: Fraction | None = field(init=False, default=None)
+    apply_packed: function = field(init=False, repr=False)
 
     def __post_init__(self):
         if hasattr(self.apply, "__bg__"):
             self.bg = self.apply.__bg__
+        self.static = getattr(self.apply, "__static__", False)
+        self.period = getattr(self.apply, "__period__", None)
+        self.step = getattr(self.apply, "__step__", None)
+        self.apply_packed = getattr(self.apply, "__packed__", None) or _packed_adapter(self.apply)
         self.name = self.apply.__name__
 
 class background(object):
@@ -43,6 +67,71 @@ class background(object):
         func.__bg__ = self.val
         return layer
 
+def static(layer: function|Layer):
+    """Decorator marking a layer whose output only depends on the input colour,
+    and not on the timestamp or the x/y position.
+
+    Usage:  @register
+            @static
+            def my_flat_layer(...):
+    """
+    if isinstance(layer, Layer):
+        layer.apply.__static__ = True
+        layer.static = True
+    else:
+        layer.__static__ = True
+    return layer
+
+class animated(object):
+    """Decorator describing how a layer changes over time, so that rendered frames can be reused.
+    - period: the output repeats every `period` seconds.
+    - step: the output only changes every `step` seconds, and may be treated
+      as constant in between. A period must be a whole number of steps.
+
+    Use Fractions for values that are not exact in binary, e.g. Fraction(1, 3).
+
+    Usage:  @register
+            @animated(period=20, step=Fraction(1, 20))
+            def my_moving_layer(...):
+    """
+    def __init__(self, period=None, step=None):
+        self.period = None if period is None else Fraction(period).limit_denominator(10**6)
+        self.step = None if step is None else Fraction(step).limit_denominator(10**6)
+        if self.period is not None and self.step is not None and (self.period / self.step).denominator != 1:
+            raise ValueError("period must be a whole number of steps")
+
+    def __call__(self, layer: function|Layer):
+        if isinstance(layer, Layer):
+            func = layer.apply
+            layer.period = self.period
+            layer.step = self.step
+        else:
+            func = layer
+        func.__period__ = self.period
+        func.__step__ = self.step
+        return layer
+
+class packed(object):
+    """Decorator giving a layer a form working on colours packed with pack(),
+    so a stack of layers can be applied without making a tuple per layer.
+    The packed form must give the same colour as the layer, packed.
+    Layers without one are adapted, converting to and from tuples.
+
+    Usage:  @register
+            @packed(lambda color, timestamp, x, y: color ^ 0xFFFFFF)
+            def my_inverting_layer(...):
+    """
+    def __init__(self, func):
+        self.func = func
+
+    def __call__(self, layer: function|Layer):
+        if isinstance(layer, Layer):
+            layer.apply.__packed__ = self.func
+            layer.apply_packed = self.func
+        else:
+            layer.__packed__ = self.func
+        return layer
+
 def register(func):
     """
     Layer register function.
@@ -4,10 +4,42 @@ All layers are defined here.
 from layer_util import get_layers
 
 import colorsys
-from layer_util import background, register
+from fractions import Fraction
+from layer_util import animated, background, packed, register, static
+
+# Packed forms of the layers (see layer_util.packed) work on 0xRRGGBB ints.
+
+def _rainbow_packed(color, timestamp, x, y):
+    r, g, b = colorsys.hls_to_rgb((timestamp/20 + x/20 + y/20)%1, 0.6, 0.6)
+    return int(255*r) << 16 | int(255*g) << 8 | int(255*b)
+
+def _lighten_packed(color, timestamp, x, y):
+    return min(255, (color >> 16) + 40) << 16 | min(255, (color >> 8 & 0xFF) + 40) << 8 | min(255, (color & 0xFF) + 40)
+
+def _darken_packed(color, timestamp, x, y):
+    return max(0, (color >> 16) - 40) << 16 | max(0, (color >> 8 & 0xFF) - 40) << 8 | max(0, (color & 0xFF) - 40)
+
+def _sparkles(timestamp, x, y):
+    """Whether sparkle lightens (rather than darkens) the square at this time."""
+    ts = int((timestamp + x/3 + y/5) * 3)
+    other = x
+    for _ in range(10 + (ts * 31 % 17)):
+        other = (1103515245 * other + 12345) % (1 << 31)
+    other += y
+    for _ in range(10 + (ts * 31 % 17)):
+        other = (1103515245 * other + 12345) % (1 << 31)
+    other = (other & ((1 << 31)-1)) >> 16
+    return other/(1 << 15) < 0.1
+
+def _sparkle_packed(color, timestamp, x, y):
+    if _sparkles(timestamp, x, y):
+        return _lighten_packed(color, timestamp, x, y)
+    return _darken_packed(color, timestamp, x, y)
 
 @register
 @background(200, 0, 120)
+@animated(period=20, step=Fraction(1, 20))
+@packed(_rainbow_packed)
 def rainbow(color, timestamp, x, y):
     return tuple(
         int(255*x)
@@ -16,11 +48,15 @@ def rainbow(color, timestamp, x, y):
 
 @register
 @background(170, 170, 170)
+@static
+@packed(lambda color, timestamp, x, y: 0x000000)
 def black(color, timestamp, x, y):
     return (0, 0, 0)
 
 @register
 @background(240, 240, 240)
+@static
+@packed(_lighten_packed)
 def lighten(color, timestamp, x, y):
     return tuple(
         min(255, x + 40)
@@ -29,6 +65,8 @@ def lighten(color, timestamp, x, y):
 
 @register
 @background(0, 255, 255)
+@static
+@packed(lambda color, timestamp, x, y: color ^ 0xFFFFFF)
 def invert(color, timestamp, x, y):
     return tuple(
         255 - c
@@ -37,37 +75,38 @@ def invert(color, timestamp, x, y):
 
 @register
 @background(255, 0, 0)
+@static
+@packed(lambda color, timestamp, x, y: 0xFF0000)
 def red(color, timestamp, x, y):
     return (255, 0, 0)
 
 @register
 @background(0, 255, 0)
+@static
+@packed(lambda color, timestamp, x, y: 0x00FF00)
 def green(color, timestamp, x, y):
     return (0, 255, 0)
 
 @register
 @background(0, 0, 255)
+@static
+@packed(lambda color, timestamp, x, y: 0x0000FF)
 def blue(color, timestamp, x, y):
     return (0, 0, 255)
 
 @register
 @background(100, 170, 255)
+@animated(period=Fraction(17, 3), step=Fraction(1, 15))
+@packed(_sparkle_packed)
 def sparkle(color, timestamp, x, y):
-    ts = int((timestamp + x/3 + y/5) * 3)
-    other = x
-    for _ in range(10 + (ts * 31 % 17)):
-        other = (1103515245 * other + 12345) % (1 << 31)
-    other += y
-    for _ in range(10 + (ts * 31 % 17)):
-        other = (1103515245 * other + 12345) % (1 << 31)
-    ts = int((timestamp + x/10 + y/20) * 3)
-    other = (other & ((1 << 31)-1)) >> 16
-    if other/(1 << 15) < 0.1:
+    if _sparkles(timestamp, x, y):
         return lighten.apply(color, timestamp, x, y)
     return darken.apply(color, timestamp, x, y)
 
 @register
 @background(30, 30, 30)
+@static
+@packed(_darken_packed)
 def darken(color, timestamp, x, y):
     return tuple(
         max(0, x - 40)
@@ -1,11 +1,19 @@
+import argparse
 import arcade
 import arcade.key as keys
 import math
+import time
 from grid import Grid
-from layer_util import get_layers, Layer
+from layer_util import get_layers, Layer, pack, unpack
 from layers import lighten
-from undo import UndoTracker
-from replay import ReplayTracker
+from controller import PaintController
+from journal import Journal
+from renderer import Frame, FrameBudget, FrameCache, GridRenderer, RenderThread
+from replay import ReplayPlayer
+from memory import MemoryMonitor
+from mipmap import Mipmap
+from telemetry import FrameTelemetry
+from viewport import Viewport
 from action import *
 
 class MyWindow(arcade.Window):
@@ -17,7 +25,21 @@ class MyWindow(arcade.Window):
     BUTTONS_HEIGHT = 100
     SCREEN_TITLE = "Paint"
 
+    # Seconds between two replayed actions at speed 1, and seconds of replaying per update at most.
     REPLAY_TIMER_DELTA = 0.05
+    REPLAY_BUDGET = 0.008
+
+    # Chunks of a cleared canvas freed per update, spreading the cost over many frames.
+    RELEASE_CHUNKS_PER_UPDATE = 4
+
+    # Actions undone or redone at once by Ctrl+Shift+Z / Ctrl+Shift+Y.
+    UNDO_JUMP = 100
+
+    TELEMETRY_EXPORT_PATH = "telemetry.jsonl"
+    # Seconds of rendering per frame above which animated squares are updated less often.
+    FRAME_BUDGET = 0.012
+    # Seconds between two memory audits, when auditing.
+    MEMORY_AUDIT_INTERVAL = 5.0
 
     GRID_SIZE_X = 32
     GRID_SIZE_Y = 32
@@ -27,35 +49,75 @@ class MyWindow(arcade.Window):
     # SCAFFOLD PART
     # Unless you're adding new features, you shouldn't need to touch this.
 
-    def __init__(self) -> None:
+    # Zoom factor per mouse wheel notch, and fraction of the panel panned per arrow key.
+    ZOOM_STEP = 1.25
+    PAN_STEP = 0.1
+
+    def __init__(self, grid_size_x: int = None, grid_size_y: int = None, render_workers: int = 1, render_thread: bool = False,
+                 memory_audit: bool = False, frame_budget: float = FRAME_BUDGET, replay_speed: float = 1,
+                 journal_path: str = None, journal_fsync: float = Journal.FSYNC_INTERVAL) -> None:
         """Initialise visual and logic variables."""
         super().__init__(self.SCREEN_WIDTH, self.SCREEN_HEIGHT, self.SCREEN_TITLE)
+        if grid_size_x is not None:
+            self.GRID_SIZE_X = grid_size_x
+        if grid_size_y is not None:
+            self.GRID_SIZE_Y = grid_size_y
         arcade.set_background_color(self.BG)
-        self.grid: Grid = None
         self.draw_style = Grid.DRAW_STYLE_SET
         self.z_pressed = False
         self.y_pressed = False
         self.z_timer = 0
         self.y_timer = 0
+        self.undo_count = 1
         self.enable_ui = True
-        self.replay_timer = 0
+        # The replay being played, if any, and the speed the next one starts at.
+        self.replay = None
+        self.replay_speed = replay_speed
+        # Frames of an unchanged grid are reused, as far as its animated layers allow.
+        self.renderer = FrameCache(GridRenderer(render_workers))
+        # When renders take longer than frame_budget seconds, animated squares are updated less often.
+        self.frame_budget = FrameBudget(frame_budget) if frame_budget > 0 else None
+        # When set, frames are computed on a background thread from grid snapshots.
+        self.render_thread = RenderThread(self.renderer, self.frame_budget) if render_thread else None
+        self.telemetry = FrameTelemetry()
+        self.show_hud = False
+        self.panning = False
+        # When set, the session is journalled there, and recovered from it on start.
+        self.journal_path = journal_path
+        self.journal_fsync = journal_fsync
         self.on_init()
+        if self.controller.replay_tracker.is_replaying and not self.controller.replay_tracker.actions.is_empty():
+            # The journal ends in the middle of a replay: carry on playing it.
+            self.enable_ui = False
+            self.replay = ReplayPlayer(self.on_replay_next_step, self.REPLAY_TIMER_DELTA, self.replay_speed, self.REPLAY_BUDGET)
+        self.memory = MemoryMonitor(self.controller)
+        # Averaged colours, drawn instead of the squares when many squares share a pixel.
+        self.mipmap = Mipmap(self.grid)
+        self.memory_audit = None
+        self.memory_audit_timer = 0
+        if memory_audit:
+            self.memory.start_audit()
 
     def reset(self) -> None:
         """Reset the screen."""
-        self.grid = Grid(self.draw_style, self.GRID_SIZE_X, self.GRID_SIZE_Y)
         self.timestamp = 0
 
         self.selected_layer_index = -1
         self.dragging = None
         self.prev_drawn = None
         self.prev_pos = None
+        # Mouse positions to draw at, painted together on the next update.
+        self.stroke = []
+        # The selected rectangle of squares (x0, y0, x1, y1), chosen by dragging with Alt held,
+        # and the last mouse position over the grid, where Ctrl+V pastes.
+        self.selection = None
+        self.selection_start = None
+        self.cursor = None
         self.draw_size = 2
 
         # Visual calculations
         self.DRAW_PANEL = self.SCREEN_WIDTH - self.SIDEBAR_WIDTH
-        self.GRID_SQ_WIDTH = self.DRAW_PANEL / self.GRID_SIZE_X
-        self.GRID_SQ_HEIGHT = self.SCREEN_HEIGHT / self.GRID_SIZE_Y
+        self.viewport = Viewport(self.GRID_SIZE_X, self.GRID_SIZE_Y, self.DRAW_PANEL, self.SCREEN_HEIGHT)
         self.LAYER_BUTTON_SIZE = self.SIDEBAR_WIDTH / 2
         # Action button sprites
         self.action_buttons = arcade.SpriteList()
@@ -106,33 +168,91 @@ class MyWindow(arcade.Window):
     def on_draw(self) -> None:
         """Draw everything"""
         self.clear()
-        # UI - Layers
-        for i, layer in enumerate(get_layers()):
-            if layer is None: break
-            xstart = (i % 2) * self.LAYER_BUTTON_SIZE + self.DRAW_PANEL
-            xend = ((i % 2)+1) * self.LAYER_BUTTON_SIZE + self.DRAW_PANEL
-            ystart = self.SCREEN_HEIGHT - (i//2) * self.LAYER_BUTTON_SIZE
-            yend = self.SCREEN_HEIGHT - (i//2+1) * self.LAYER_BUTTON_SIZE
-            bg = lighten.apply(layer.bg or self.BG[:], 0, 0, 0) if self.selected_layer_index == i else (layer.bg or self.BG[:])
-            if not self.enable_ui:
-                bg = lighten.apply(bg, 0, 0, 0)
-            arcade.draw_lrtb_rectangle_filled(xstart, xend, ystart, yend, bg)
-            arcade.draw_lrtb_rectangle_outline(
-                xstart, xend, ystart, yend, (0, 0, 0), border_width=1,
-            )
-            arcade.draw_text(str(i), xstart, (ystart+yend)/2, (0, 0, 0), 18, width=xend-xstart, align="center", bold=True, anchor_y="center")
-        # UI - Draw Modes / Action buttons
-        self.action_buttons.draw()
         # Grid
-        for x in range(self.GRID_SIZE_X):
-            for y in range(self.GRID_SIZE_Y):
-                arcade.draw_lrtb_rectangle_filled(
-                    self.GRID_SQ_WIDTH * x,
-                    self.GRID_SQ_WIDTH * (x+1),
-                    self.GRID_SQ_HEIGHT * (y+1),
-                    self.GRID_SQ_HEIGHT * y,
-                    self.grid[x][y].get_color(self.BG[:], self.timestamp, x, y),
+        with self.telemetry.phase(FrameTelemetry.GRID_EVAL):
+            region = self.viewport.visible_region()
+            level = self.mipmap.level_for_zoom(self.viewport.zoom)
+            if level > 0:
+                self.mipmap.update(tuple(self.BG), self.timestamp)
+                frame = self.mipmap.render(level, region)
+                self.telemetry.count_get_color(self.grid.draw_style, self.mipmap.evaluations)
+            elif self.render_thread is None and self.frame_budget is None:
+                frame = self.renderer.render(self.grid, tuple(self.BG), self.timestamp, region)
+                self.telemetry.count_get_color(self.grid.draw_style, self.renderer.evaluations)
+            elif self.render_thread is None:
+                start = time.perf_counter()
+                frame = self.renderer.render(
+                    self.grid, tuple(self.BG), self.timestamp, region,
+                    self.frame_budget.previous, self.frame_budget.next_interleave(),
+                )
+                self.frame_budget.record(frame, time.perf_counter() - start)
+                self.telemetry.count_get_color(self.grid.draw_style, self.renderer.evaluations)
+            else:
+                # Present the last finished frame, and start the next one if the thread is free.
+                if not self.render_thread.busy:
+                    self.render_thread.submit(self.grid.snapshot(), tuple(self.BG), self.timestamp, region)
+                    self.telemetry.count_get_color(self.grid.draw_style, self.render_thread.evaluations)
+                frame = self.render_thread.front
+        with self.telemetry.phase(FrameTelemetry.DRAW):
+            if frame is not None:
+                self.draw_frame(frame)
+            if self.selection is not None:
+                x0, y0, x1, y1 = self.selection
+                left, _, _, bottom = self.viewport.cell_rect(x0, y0)
+                _, right, top, _ = self.viewport.cell_rect(x1 - 1, y1 - 1)
+                arcade.draw_lrtb_rectangle_outline(left, right, top, bottom, (0, 120, 255), 2)
+        with self.telemetry.phase(FrameTelemetry.SIDEBAR):
+            # The grid may extend under the sidebar when zoomed in.
+            arcade.draw_lrtb_rectangle_filled(self.DRAW_PANEL, self.SCREEN_WIDTH, self.SCREEN_HEIGHT, 0, self.BG)
+            # UI - Layers
+            for i, layer in enumerate(get_layers()):
+                if layer is None: break
+                xstart = (i % 2) * self.LAYER_BUTTON_SIZE + self.DRAW_PANEL
+                xend = ((i % 2)+1) * self.LAYER_BUTTON_SIZE + self.DRAW_PANEL
+                ystart = self.SCREEN_HEIGHT - (i//2) * self.LAYER_BUTTON_SIZE
+                yend = self.SCREEN_HEIGHT - (i//2+1) * self.LAYER_BUTTON_SIZE
+                bg = lighten.apply(layer.bg or self.BG[:], 0, 0, 0) if self.selected_layer_index == i else (layer.bg or self.BG[:])
+                if not self.enable_ui:
+                    bg = lighten.apply(bg, 0, 0, 0)
+                arcade.draw_lrtb_rectangle_filled(xstart, xend, ystart, yend, bg)
+                arcade.draw_lrtb_rectangle_outline(
+                    xstart, xend, ystart, yend, (0, 0, 0), border_width=1,
                 )
+                arcade.draw_text(str(i), xstart, (ystart+yend)/2, (0, 0, 0), 18, width=xend-xstart, align="center", bold=True, anchor_y="center")
+            # UI - Draw Modes / Action buttons
+            self.action_buttons.draw()
+            if self.replay is not None and not self.replay.finished:
+                status = f"replay {self.replay.speed:g}x" + (" (paused)" if self.replay.paused else "")
+                arcade.draw_text(status, self.DRAW_PANEL + 4, 3 * self.LAYER_BUTTON_SIZE + 4, (0, 0, 0), 10)
+        self.telemetry.end_frame()
+        if self.show_hud:
+            self.draw_hud()
+
+    def draw_frame(self, frame: Frame) -> None:
+        """Draw the squares (or blocks of squares, for a mipmap frame) of a rendered frame through the viewport."""
+        bg = pack(self.BG)
+        cell_rect = self.viewport.cell_rect
+        scale = frame.scale
+        colors = iter(frame.colors)
+        for x in range(frame.x0, frame.x1):
+            for y in range(frame.y0, frame.y1):
+                color = next(colors)
+                # The window is already cleared to the background colour.
+                if color != bg:
+                    arcade.draw_lrtb_rectangle_filled(*cell_rect(x * scale, y * scale, scale), unpack(color))
+
+    def draw_hud(self) -> None:
+        """Draw the frame-time and memory overlay in the top left corner of the grid."""
+        lines = self.telemetry.summary() + self.memory.summary(self.memory_audit)
+        if self.frame_budget is not None and self.frame_budget.interleave > 1:
+            lines.append(f"animation: 1/{self.frame_budget.interleave} of squares per frame")
+        line_height = 14
+        top = self.SCREEN_HEIGHT - 4
+        arcade.draw_lrtb_rectangle_filled(
+            0, 320, self.SCREEN_HEIGHT, top - line_height * len(lines) - 4, (0, 0, 0, 160),
+        )
+        for i, line in enumerate(lines):
+            arcade.draw_text(line, 4, top - line_height * i, (255, 255, 255), 10, anchor_y="top")
 
     def on_mouse_press(self, x: int, y: int, button: int, modifiers: int) -> None:
         """Called when the mouse buttons are pressed."""
@@ -180,18 +300,42 @@ class MyWindow(arcade.Window):
             yend = 2 * self.LAYER_BUTTON_SIZE
             if xstart <= x < xend and yend <= y < ystart:
                 self.on_special()
+        elif button == arcade.MOUSE_BUTTON_LEFT and modifiers & keys.MOD_SHIFT:
+            self.fill_at(x, y)
+        elif button == arcade.MOUSE_BUTTON_LEFT and modifiers & keys.MOD_ALT:
+            self.selection_start = self.viewport.screen_to_cell(x, y)
+            self.select_to(x, y)
+        elif button != arcade.MOUSE_BUTTON_LEFT:
+            self.panning = True
         else:
             self.dragging = True
             self.try_draw(x, y)
 
     def on_mouse_release(self, x: int, y: int, button: int, modifiers: int):
         """Called when the mouse buttons are released."""
+        self.paint_stroke()
         self.dragging = False
+        self.panning = False
+        self.selection_start = None
         self.prev_drawn = None
         self.prev_pos = None
 
+    def on_mouse_scroll(self, x: int, y: int, scroll_x: int, scroll_y: int) -> None:
+        """Called when the mouse wheel is used. Zooms around the cursor."""
+        if x > self.DRAW_PANEL:
+            return
+        self.viewport.zoom_at(self.ZOOM_STEP ** scroll_y, x, y)
+
     def on_mouse_motion(self, x, y, dx, dy) -> None:
         """Called when the mouse moves."""
+        if x <= self.DRAW_PANEL:
+            self.cursor = (x, y)
+        if self.selection_start is not None:
+            self.select_to(x, y)
+            return
+        if self.panning:
+            self.viewport.pan(dx, dy)
+            return
         if not self.dragging:
             return
         if not(0 <= self.selected_layer_index < len(get_layers())):
@@ -202,16 +346,70 @@ class MyWindow(arcade.Window):
 
     def on_key_press(self, symbol: int, modifiers: int) -> None:
         """Called when a keyboard key is pressed."""
+        if symbol == keys.F3:
+            # Toggle the frame-time overlay.
+            self.show_hud = not self.show_hud
+            if self.show_hud:
+                self.telemetry.enable()
+            elif not self.telemetry.exporting:
+                self.telemetry.disable()
+            return
+        if symbol == keys.F4:
+            # Toggle exporting frame times as JSON lines.
+            if self.telemetry.exporting:
+                self.telemetry.stop_export()
+                if not self.show_hud:
+                    self.telemetry.disable()
+            else:
+                self.telemetry.enable()
+                self.telemetry.start_export(self.TELEMETRY_EXPORT_PATH)
+            return
+        if self.replay is not None and not self.replay.finished:
+            # Space pauses and resumes the replay, + and - change its speed.
+            if symbol == keys.SPACE:
+                self.replay.toggle_pause()
+            elif symbol in (keys.PLUS, keys.EQUAL, keys.NUM_ADD):
+                self.replay.faster()
+            elif symbol in (keys.MINUS, keys.NUM_SUBTRACT):
+                self.replay.slower()
+            self.replay_speed = self.replay.speed
         if not self.enable_ui:
             return
         self.z_pressed = keys.Z == symbol and (modifiers & keys.MOD_CTRL)
         self.y_pressed = keys.Y == symbol and (modifiers & keys.MOD_CTRL)
+        # With shift held, each undo or redo jumps over many actions at once.
+        self.undo_count = self.UNDO_JUMP if modifiers & keys.MOD_SHIFT else 1
         if self.z_pressed:
-            self.on_undo()
+            with self.telemetry.phase(FrameTelemetry.UNDO_REDO):
+                self.on_undo(self.undo_count)
             self.z_timer = 0.5
         if self.y_pressed:
-            self.on_redo()
+            with self.telemetry.phase(FrameTelemetry.UNDO_REDO):
+                self.on_redo(self.undo_count)
             self.y_timer = 0.5
+        # Ctrl+C copies the selection, Ctrl+V pastes it at the cursor, and Delete empties the selection.
+        if symbol == keys.C and modifiers & keys.MOD_CTRL and self.selection is not None:
+            self.on_copy(*self.selection)
+        elif symbol == keys.V and modifiers & keys.MOD_CTRL and self.cursor is not None:
+            px, py = self.viewport.screen_to_cell(*self.cursor)
+            if 0 <= px < self.GRID_SIZE_X and 0 <= py < self.GRID_SIZE_Y:
+                with self.telemetry.phase(FrameTelemetry.PAINT):
+                    self.on_paste(px, py)
+        elif symbol == keys.DELETE and self.selection is not None:
+            with self.telemetry.phase(FrameTelemetry.PAINT):
+                self.on_clear_region(*self.selection)
+        pan_x = self.PAN_STEP * self.DRAW_PANEL
+        pan_y = self.PAN_STEP * self.SCREEN_HEIGHT
+        if symbol == keys.LEFT:
+            self.viewport.pan(pan_x, 0)
+        elif symbol == keys.RIGHT:
+            self.viewport.pan(-pan_x, 0)
+        elif symbol == keys.UP:
+            self.viewport.pan(0, -pan_y)
+        elif symbol == keys.DOWN:
+            self.viewport.pan(0, pan_y)
+        elif symbol == keys.HOME:
+            self.viewport.fit()
 
     def on_key_release(self, symbol: int, modifiers: int) -> None:
         """Called when a keyboard key is released."""
@@ -219,62 +417,98 @@ class MyWindow(arcade.Window):
         self.y_pressed = False
 
     def try_draw(self, x, y) -> None:
-        """Attempt to draw at a position, but safely fail if an invalid square."""
+        """
+        Queue a position to draw at. Motion events arrive faster than frames,
+        so the positions are painted together by paint_stroke on the next update.
+        """
         if self.selected_layer_index == -1:
             return
+        self.stroke.append((x, y))
+
+    def paint_stroke(self) -> None:
+        """Paint the squares visited by the queued positions as one stroke, safely skipping invalid squares."""
+        if not self.stroke:
+            return
+        positions, self.stroke = self.stroke, []
         layer = get_layers()[self.selected_layer_index]
-        if self.prev_pos is not None:
-            # Try draw in increments of 0.5 to avoid skipping squares.
-            mhat_dist = abs(x - self.prev_pos[0]) + abs(y - self.prev_pos[1])
-            increment = 0.5
-            points_to_draw = []
-            for d in range(1, math.ceil(mhat_dist/increment)+1):
-                distance = min(d * increment / mhat_dist, 1)
-                nx = distance * (x - self.prev_pos[0]) + self.prev_pos[0]
-                ny = distance * (y - self.prev_pos[1]) + self.prev_pos[1]
-                nx_pos = int(nx // self.GRID_SQ_WIDTH)
-                ny_pos = int(ny // self.GRID_SQ_HEIGHT)
-                points_to_draw.append((nx_pos, ny_pos))
-        else:
-            x_pos = int(x // self.GRID_SQ_WIDTH)
-            y_pos = int(y // self.GRID_SQ_HEIGHT)
-            points_to_draw = [
-                (x_pos, y_pos)
-            ]
-        for px, py in points_to_draw:
-            if self.prev_drawn is None or (px, py) != self.prev_drawn:
-                if 0 <= px < self.GRID_SIZE_X and 0 <= py < self.GRID_SIZE_Y:
-                    self.on_paint(layer, px, py)
-                    self.prev_drawn = (px, py)
-        self.prev_pos = (x, y)
+        points_to_paint = []
+        for x, y in positions:
+            if self.prev_pos is not None:
+                # Try draw in increments of 0.5 to avoid skipping squares.
+                mhat_dist = abs(x - self.prev_pos[0]) + abs(y - self.prev_pos[1])
+                increment = 0.5
+                points_to_draw = []
+                for d in range(1, math.ceil(mhat_dist/increment)+1):
+                    distance = min(d * increment / mhat_dist, 1)
+                    nx = distance * (x - self.prev_pos[0]) + self.prev_pos[0]
+                    ny = distance * (y - self.prev_pos[1]) + self.prev_pos[1]
+                    points_to_draw.append(self.viewport.screen_to_cell(nx, ny))
+            else:
+                points_to_draw = [
+                    self.viewport.screen_to_cell(x, y)
+                ]
+            for px, py in points_to_draw:
+                if self.prev_drawn is None or (px, py) != self.prev_drawn:
+                    if 0 <= px < self.GRID_SIZE_X and 0 <= py < self.GRID_SIZE_Y:
+                        points_to_paint.append((px, py))
+                        self.prev_drawn = (px, py)
+            self.prev_pos = (x, y)
+        if points_to_paint:
+            with self.telemetry.phase(FrameTelemetry.PAINT):
+                self.on_paint_stroke(layer, points_to_paint)
+
+    def fill_at(self, x, y) -> None:
+        """Flood fill from the square under the screen position (x, y) with the selected layer."""
+        if self.selected_layer_index == -1:
+            return
+        px, py = self.viewport.screen_to_cell(x, y)
+        if 0 <= px < self.GRID_SIZE_X and 0 <= py < self.GRID_SIZE_Y:
+            with self.telemetry.phase(FrameTelemetry.PAINT):
+                self.on_fill(get_layers()[self.selected_layer_index], px, py)
+
+    def select_to(self, x, y) -> None:
+        """Stretch the selection from where it was started to the square under (x, y), clipped to the grid."""
+        (sx, sy), (ex, ey) = self.selection_start, self.viewport.screen_to_cell(x, y)
+        x0, x1 = max(0, min(sx, ex)), min(self.GRID_SIZE_X, max(sx, ex) + 1)
+        y0, y1 = max(0, min(sy, ey)), min(self.GRID_SIZE_Y, max(sy, ey) + 1)
+        self.selection = (x0, y0, x1, y1) if x0 < x1 and y0 < y1 else None
 
     def start_replay(self) -> None:
         """Begin the replay mode."""
         self.enable_ui = False
-        self.grid = Grid(self.draw_style, self.GRID_SIZE_X, self.GRID_SIZE_Y)
-        self.replay_timer = self.REPLAY_TIMER_DELTA
+        self.on_clear()
         self.on_replay_start()
+        self.replay = ReplayPlayer(self.on_replay_next_step, self.REPLAY_TIMER_DELTA, self.replay_speed, self.REPLAY_BUDGET)
 
     def on_update(self, delta_time) -> None:
         """Movement and game logic."""
         self.timestamp += delta_time
+        self.paint_stroke()
+        self.grid.release_stale(self.RELEASE_CHUNKS_PER_UPDATE)
+        if self.memory.auditing and self.show_hud:
+            self.memory_audit_timer -= delta_time
+            if self.memory_audit_timer <= 0:
+                self.memory_audit_timer = self.MEMORY_AUDIT_INTERVAL
+                self.memory_audit = self.memory.audit()
         if self.z_pressed:
             self.z_timer -= delta_time
             if self.z_timer <= 0:
-                self.on_undo()
+                with self.telemetry.phase(FrameTelemetry.UNDO_REDO):
+                    self.on_undo(self.undo_count)
                 self.z_timer += 0.05
         if self.y_pressed:
             self.y_timer -= delta_time
             if self.y_timer <= 0:
-                self.on_redo()
+                with self.telemetry.phase(FrameTelemetry.UNDO_REDO):
+                    self.on_redo(self.undo_count)
                 self.y_timer += 0.05
         if not self.enable_ui:
-            self.replay_timer -= delta_time
-            if self.replay_timer <= 0:
-                self.replay_timer += self.REPLAY_TIMER_DELTA
-                finished = self.on_replay_next_step()
-                if finished:
-                    self.enable_ui = True
+            # As many actions as are due at the replay's speed and fit in its budget; the window
+            # draws once per update, so the states in between are never rendered.
+            with self.telemetry.phase(FrameTelemetry.REPLAY):
+                self.replay.advance(delta_time)
+            if self.replay.finished:
+                self.enable_ui = True
 
     def change_draw_mode(self) -> None:
         """Changes the draw mode of the application, and resets the window."""
@@ -284,86 +518,134 @@ class MyWindow(arcade.Window):
             self.draw_style = Grid.DRAW_STYLE_SEQUENCE
         elif self.draw_style == Grid.DRAW_STYLE_SEQUENCE:
             self.draw_style = Grid.DRAW_STYLE_SET
+        self.on_clear(self.draw_style)
         self.reset()
 
     # STUDENT PART
+    # The paint logic lives in controller.PaintController; the window forwards to it.
 
     def on_init(self):
         """Initialisation that occurs after the system initialisation."""
-        self.undo_tracker = UndoTracker()
-        self.replay_tracker = ReplayTracker()
+        controller = PaintController.recover(self.journal_path) if self.journal_path else None
+        if controller is None:
+            controller = PaintController(Grid(self.draw_style, self.GRID_SIZE_X, self.GRID_SIZE_Y))
+        else:
+            self.GRID_SIZE_X, self.GRID_SIZE_Y = controller.grid.x, controller.grid.y
+            self.draw_style = controller.grid.draw_style
+        if self.journal_path:
+            controller.attach_journal(Journal(self.journal_path, self.journal_fsync))
+        self.controller = controller
+
+    @property
+    def grid(self) -> Grid:
+        """The canvas, owned by the controller."""
+        return self.controller.grid
 
     def on_reset(self):
         """Called when a window reset is requested."""
-        self.on_init
-    
-    
+        self.controller.on_reset()
+
+    def on_clear(self, draw_style: str = None):
+        """Called when the whole canvas is cleared, switching it to draw_style if given."""
+        self.controller.on_clear(draw_style)
+
     def on_paint(self, layer: Layer, px, py):
-        """
-        Called when a grid square is clicked on, which should trigger painting in the vicinity.
-        Vicinity squares outside of the range [0, GRID_SIZE_X) or [0, GRID_SIZE_Y) can be safely ignored.
+        """Called when a grid square is clicked on, which should trigger painting in the vicinity."""
+        self.controller.on_paint(layer, px, py)
 
-        layer: The layer being applied.
-        px: x position of the brush.
-        py: y position of the brush.
-        """
-        paint_action = PaintAction()
-        # paint_step_list = []
-        list_to_create_paint_action = self.grid.on_paint(layer, px, py)
-        for layer in list_to_create_paint_action:
-            paint_step = PaintStep((layer[1], layer[2]), layer[0])
-            # paint_step_list.append(paint_step)
-            paint_action.add_step(paint_step)
-        
-        # paint_action.add_step(paint_step_list)
-        
-        self.undo_tracker.add_action(paint_action)
-        self.replay_tracker.add_action(paint_action)
-       
-
-    def on_undo(self):
-        """Called when an undo is requested."""
-        action = self.undo_tracker.undo(self.grid)
-        if action:
-            self.replay_tracker.add_action(action, is_undo=True)
-
-    def on_redo(self):
-        """Called when a redo is requested."""
-        action = self.undo_tracker.redo(self.grid)
-        if action:
-            self.replay_tracker.add_action(action, is_undo=False)
+    def on_paint_stroke(self, layer: Layer, points):
+        """Called once per update with the brush positions visited since the last one."""
+        self.controller.on_paint_stroke(layer, points)
+
+    def on_fill(self, layer: Layer, px, py):
+        """Called when a grid square is shift-clicked on, which should flood fill from it."""
+        self.controller.on_fill(layer, px, py)
+
+    def on_copy(self, x0, y0, x1, y1):
+        """Called when the selected rectangle is copied."""
+        self.controller.on_copy(x0, y0, x1, y1)
+
+    def on_paste(self, px, py):
+        """Called when the copied rectangle is pasted with its first square at (px, py)."""
+        self.controller.on_paste(px, py)
+
+    def on_clear_region(self, x0, y0, x1, y1):
+        """Called when the selected rectangle is emptied."""
+        self.controller.on_clear_region(x0, y0, x1, y1)
+
+    def on_undo(self, n: int = 1):
+        """Called when an undo of n actions is requested."""
+        self.controller.on_undo(n)
+
+    def on_redo(self, n: int = 1):
+        """Called when a redo of n actions is requested."""
+        self.controller.on_redo(n)
 
     def on_special(self):
         """Called when the special action is requested."""
-        self.grid.special() 
-        paintaction = PaintAction([], True)
-        self.undo_tracker.add_action(paintaction)
-        
+        self.controller.on_special()
 
     def on_replay_start(self):
         """Called when the replay starting is requested."""
-        self.replay_tracker.start_replay()
+        self.controller.on_replay_start()
 
     def on_replay_next_step(self) -> bool:
         """
         Called when the next step of the replay is requested.
         Returns whether the replay is finished.
         """
-        return self.replay_tracker.play_next_action(self.grid)
+        return self.controller.on_replay_next_step()
 
     def on_increase_brush_size(self):
         """Called when an increase to the brush size is requested."""
-        self.grid.increase_brush_size()
+        self.controller.on_increase_brush_size()
 
     def on_decrease_brush_size(self):
         """Called when a decrease to the brush size is requested."""
-        self.grid.decrease_brush_size()
+        self.controller.on_decrease_brush_size()
 
 def main():
     """ Main function """
-    window = MyWindow()
+    p = argparse.ArgumentParser(description="Paint.")
+    p.add_argument("--grid-width", type=int, default=MyWindow.GRID_SIZE_X, help="Number of grid squares across.")
+    p.add_argument("--grid-height", type=int, default=MyWindow.GRID_SIZE_Y, help="Number of grid squares down.")
+    p.add_argument(
+        "--render-workers", type=int, default=1,
+        help=f"Threads evaluating grid colours. {GridRenderer.AUTO_WORKERS} uses one per core, 1 renders on the window thread.",
+    )
+    p.add_argument("--render-thread", action="store_true", help="Compute frames on a background thread.")
+    p.add_argument(
+        "--frame-budget", type=float, default=MyWindow.FRAME_BUDGET * 1000,
+        help="Milliseconds of rendering per frame before animations are updated in interleaved parts. 0 always renders them fully.",
+    )
+    p.add_argument(
+        "--replay-speed", type=float, default=1,
+        help=f"Replay speed, from {ReplayPlayer.MIN_SPEED} to {ReplayPlayer.MAX_SPEED}. Space pauses a replay, + and - change its speed.",
+    )
+    p.add_argument(
+        "--memory-audit", action="store_true",
+        help="Measure memory use per subsystem with tracemalloc (slower), shown with F3 and printed on exit.",
+    )
+    p.add_argument(
+        "--journal", metavar="PATH",
+        help="Journal the session to PATH, recovering it from there first if PATH exists.",
+    )
+    p.add_argument(
+        "--journal-fsync", type=float, default=Journal.FSYNC_INTERVAL * 1000,
+        help="Milliseconds between two syncs of the journal to disk at most, the work a crash can lose.",
+    )
+    args = p.parse_args()
+    if not ReplayPlayer.MIN_SPEED <= args.replay_speed <= ReplayPlayer.MAX_SPEED:
+        p.error(f"--replay-speed must be between {ReplayPlayer.MIN_SPEED} and {ReplayPlayer.MAX_SPEED}")
+    window = MyWindow(args.grid_width, args.grid_height, args.render_workers, args.render_thread, args.memory_audit,
+                      args.frame_budget / 1000, args.replay_speed, args.journal, args.journal_fsync / 1000)
     window.setup()
     arcade.run()
+    if window.controller.journal is not None:
+        window.controller.journal.close()
+    if args.memory_audit:
+        for line in window.memory.summary(window.memory.audit()):
+            print(line)
 
 def run_with_func(func, pause=False):
     from threading import Thread
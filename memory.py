@@ -0,0 +1,247 @@
+"""
+Memory accounting.
+
+Estimates the bytes and objects held by each subsystem of a paint session
+(the grid, the undo history, the replay log and the layer registry) so that
+long sessions can be watched and given budgets.
+
+Estimates come from counters the subsystems keep up to date as they change
+(see Grid.memory_counts), multiplied by the measured size of each kind of
+object, so they cost the same however large the canvas is. Every store is
+counted as holding one layer, and every action step as one square.
+
+The optional audit mode uses tracemalloc to measure what was actually
+allocated since it started, attributed to the subsystem whose code made the
+allocation. It slows allocation down noticeably, so it is off by default.
+"""
+from __future__ import annotations
+import ctypes
+import os
+import sys
+import tracemalloc
+
+import layer_util
+from action import PaintAction, PaintStep
+from data_structures.bitmap import Bitmap
+from data_structures.referential_array import ArrayR
+from grid import GridColumn
+from layer_util import Layer
+
+GRID = "grid"
+UNDO = "undo"
+REPLAY = "replay"
+LAYERS = "layers"
+OTHER = "other"
+SUBSYSTEMS = (GRID, UNDO, REPLAY, LAYERS)
+
+# Which subsystem an allocation made by each module belongs to. Allocations made
+# in other modules, such as data_structures, go to the nearest caller listed here.
+_MODULE_SUBSYSTEMS = {
+    "grid": GRID,
+    "layer_store": GRID,
+    "action": UNDO,
+    "undo": UNDO,
+    "controller": UNDO,
+    "replay": REPLAY,
+    "layer_util": LAYERS,
+    "layers": LAYERS,
+}
+_GENERIC_DIRS = ("data_structures",)
+
+_POINTER = ctypes.sizeof(ctypes.c_void_p)
+_sizes = {}
+
+
+def measure(make, n: int = 256) -> int:
+    """
+    Average bytes allocated by make(i) for i in range(n), as measured by tracemalloc.
+    Measuring rather than adding up sys.getsizeof accounts for what getsizeof
+    leaves out (ctypes buffers, lazily created instance dicts, fresh ints).
+    n is larger than the free lists of lists and dicts, whose reuse tracemalloc does not see.
+    """
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    try:
+        kept = [None] * n
+        before = tracemalloc.get_traced_memory()[0]
+        for i in range(n):
+            kept[i] = make(i)
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+    return max(0, (after - before) // n)
+
+
+def _size_of(kind, make, n: int = 256) -> int:
+    """The size of the object made by make(i), measured once per kind."""
+    size = _sizes.get(kind)
+    if size is None:
+        size = _sizes[kind] = measure(make, n)
+    return size
+
+
+def _painted(blank):
+    store = blank.copy()
+    store.add(layer_util.get_layers()[0])
+    return store
+
+
+def format_bytes(n: float) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if abs(n) < 1024:
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} GiB"
+
+
+def grid_usage(grid) -> dict:
+    """Estimated bytes and objects of a grid: its stores by type, chunks, and chunks waiting to be freed."""
+    counts = grid.memory_counts()
+    store_type = type(grid.blank_store)
+    # A store holding one layer, made as the grid makes them.
+    store = _size_of(store_type, lambda i: _painted(grid.blank_store))
+    side = grid.CHUNK_SIZE
+    chunk = _size_of(("chunk", side), lambda i: [None] * (side * side), 16)
+    bitmap = _size_of(("bitmap", side), lambda i: Bitmap(side, side))
+    column = _size_of(GridColumn, lambda i: GridColumn(None, 1000 + i))
+    # The blank store stands for every square not created yet.
+    stores = counts["stores"] + counts["stale_stores"] + 1
+    chunks = counts["chunks"] + counts["stale_chunks"]
+    return {
+        "bytes": stores * store + chunks * chunk + counts["dirty_bitmaps"] * bitmap
+                 + counts["columns"] * (column + _POINTER),
+        "objects": {
+            store_type.__name__: counts["stores"],
+            "stale stores": counts["stale_stores"],
+            "chunks": counts["chunks"],
+            "stale chunks": counts["stale_chunks"],
+            "dirty bitmaps": counts["dirty_bitmaps"],
+        },
+    }
+
+
+def undo_usage(tracker) -> dict:
+    """Estimated bytes and objects of an undo history, both stacks included."""
+    counts = tracker.memory_counts()
+    action = _size_of(PaintAction, lambda i: PaintAction())
+    step = _size_of(PaintStep, lambda i: PaintStep((1000 + i, 1000 + i), None))
+    actions = counts["actions"] + counts["undone_actions"]
+    steps = counts["steps"] + counts["undone_steps"]
+    return {
+        "bytes": counts["capacity"] * _POINTER + actions * action + steps * (step + _POINTER),
+        "objects": {"actions": actions, "steps": steps},
+    }
+
+
+def replay_usage(tracker) -> dict:
+    """
+    Estimated bytes and objects of a replay log.
+    Its actions are also in the undo history, so only the log's own entries are counted here.
+    """
+    counts = tracker.memory_counts()
+    # Pairs come from the tuple free list, which tracemalloc does not see, so they are not measured.
+    entry = sys.getsizeof((None, False))
+    return {
+        "bytes": (counts["capacity"] + counts["undo_capacity"]) * _POINTER + counts["entries"] * entry,
+        "objects": {"entries": counts["entries"]},
+    }
+
+
+def layers_usage() -> dict:
+    """Estimated bytes and objects of the layer registry. The layer functions themselves are not counted."""
+    registered = layer_util.cur_layer_index
+    layer = _size_of(Layer, lambda i: Layer(i, format_bytes))
+    table = _size_of("layer table", lambda i: ArrayR(len(layer_util.LAYERS)))
+    return {
+        "bytes": table + registered * layer,
+        "objects": {"layers": registered},
+    }
+
+
+class MemoryMonitor:
+    """
+    Memory use of the grid, undo history and replay log of a PaintController,
+    and of the layer registry.
+
+    Usage:  monitor = MemoryMonitor(controller)
+            monitor.usage()        # estimates, cheap enough to call every frame
+            monitor.start_audit()  # optional, measured with tracemalloc from now on
+            monitor.audit()
+    """
+
+    # Frames kept per allocation: enough to reach a subsystem module from data_structures.
+    AUDIT_FRAMES = 10
+
+    def __init__(self, controller) -> None:
+        self.controller = controller
+
+    def usage(self) -> dict[str, dict]:
+        """Estimated {"bytes", "objects"} of each subsystem."""
+        return {
+            GRID: grid_usage(self.controller.grid),
+            UNDO: undo_usage(self.controller.undo_tracker),
+            REPLAY: replay_usage(self.controller.replay_tracker),
+            LAYERS: layers_usage(),
+        }
+
+    def total(self) -> int:
+        """Estimated bytes of every subsystem together."""
+        return sum(part["bytes"] for part in self.usage().values())
+
+    @property
+    def auditing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start_audit(self) -> None:
+        """Start tracing allocations. Only allocations made from now on are audited."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.AUDIT_FRAMES)
+
+    def stop_audit(self) -> None:
+        """Stop tracing allocations, and free the traces."""
+        tracemalloc.stop()
+
+    def audit(self) -> dict[str, int]:
+        """
+        Bytes allocated since start_audit() and still alive, by subsystem,
+        with OTHER for allocations made outside the subsystems.
+        """
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("The audit has not been started")
+        # Not filtered: tracemalloc's own allocations fall under OTHER, and filtering takes longer than grouping.
+        snapshot = tracemalloc.take_snapshot()
+        result = dict.fromkeys(SUBSYSTEMS + (OTHER,), 0)
+        owners = {}
+        for stat in snapshot.statistics("traceback"):
+            result[self._owner(stat.traceback, owners)] += stat.size
+        return result
+
+    @staticmethod
+    def _owner(traceback: tracemalloc.Traceback, owners: dict) -> str:
+        """The subsystem of the most recent frame of the traceback in a known module."""
+        for frame in reversed(traceback):
+            owner = owners.get(frame.filename)
+            if owner is None:
+                directory, name = os.path.split(frame.filename)
+                if os.path.basename(directory) in _GENERIC_DIRS:
+                    owner = ""
+                else:
+                    owner = _MODULE_SUBSYSTEMS.get(os.path.splitext(name)[0], OTHER)
+                owners[frame.filename] = owner
+            if owner:
+                return owner
+        return OTHER
+
+    def summary(self, audit: dict[str, int] = None) -> list[str]:
+        """Lines describing the estimates, and an audit if given, for the on-screen overlay."""
+        usage = self.usage()
+        lines = [f"memory: {format_bytes(sum(part['bytes'] for part in usage.values()))}"]
+        for name, part in usage.items():
+            objects = ", ".join(f"{n} {kind}" for kind, n in part["objects"].items() if n)
+            lines.append(f"{name}: {format_bytes(part['bytes'])}" + (f" ({objects})" if objects else ""))
+        if audit is not None:
+            for name, n in audit.items():
+                lines.append(f"audited {name}: {format_bytes(n)}")
+        return lines
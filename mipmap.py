@@ -0,0 +1,251 @@
+"""
+Zoomed-out rendering.
+
+When a screen pixel covers many grid squares, drawing every square is
+wasted work. Mipmap keeps a pyramid of averaged colours: level k holds one
+colour per 2^k x 2^k block of squares. Drawing from the level whose blocks
+are about one pixel wide costs as much as the screen has pixels, however
+large the canvas.
+
+Within a chunk, levels 1 up to the chunk's own size are stored with the
+chunk. Above that, a block covers several chunks, and only the blocks with
+an allocated chunk in them are stored; the rest of each block is blank.
+
+Colours are kept as sums of the squares' colours, so updating a square is
+exact, and only the blocks above it are recomputed. The pyramid follows the
+grid through Grid.take_dirty(), so it must be the only user of it for that
+grid.
+"""
+from __future__ import annotations
+import math
+from collections import OrderedDict
+
+from data_structures.typed_array import ArrayT
+from grid import Grid
+from layer_util import pack
+from renderer import Frame
+
+
+class Mipmap:
+    """
+    Averaged colours of a grid at every power of two of block size.
+
+    Usage:  mipmap.update(bg, timestamp)   # once per frame, before rendering
+            frame = mipmap.render(mipmap.level_for_zoom(zoom), region)
+
+    - Squares written to since the last update are re-evaluated, with the
+      blocks above them.
+    - After special() or clear(), which may change every square, the allocated
+      chunks are rebuilt a few per update, showing their previous colours until then.
+    - Animated squares change with time, so the chunks holding them are
+      re-evaluated a few per update, in turn.
+    """
+
+    REBUILD_CHUNKS_PER_UPDATE = 16
+    ANIMATED_CHUNKS_PER_UPDATE = 4
+
+    def __init__(self, grid: Grid) -> None:
+        """
+        Time Complexity: O(C) where C is the number of allocated chunks, which are rebuilt by later updates.
+        """
+        self.grid = grid
+        self.chunk_levels = grid.CHUNK_SIZE.bit_length() - 1
+        # The top level is a single block covering the whole canvas.
+        self.levels = max(self.chunk_levels, (max(grid.x, grid.y) - 1).bit_length())
+        # (cx, cy) -> sums of levels 1 .. chunk_levels, each an ArrayT of r, g, b per block, column by column.
+        self._chunks = {}
+        # level -> (bx, by) -> [r, g, b, number of allocated chunks in the block], above chunk_levels.
+        self._upper = {level: {} for level in range(self.chunk_levels + 1, self.levels + 1)}
+        self._pending = set(grid.chunk_keys())
+        self._animated = OrderedDict()
+        self._bg = None
+        self._timestamp = 0
+        self._blank = None
+        self._cache = {}
+        self.evaluations = 0
+
+    def level_for_zoom(self, zoom: float) -> int:
+        """
+        The level whose blocks are the smallest to be at least one pixel wide,
+        at zoom pixels per square. 0 means squares should be drawn one by one.
+        """
+        if zoom >= 1:
+            return 0
+        return min(self.levels, math.ceil(math.log2(1 / zoom) - 1e-9))
+
+    def update(self, bg: tuple[int, int, int], timestamp: float) -> None:
+        """
+        Bring the pyramid up to date with the grid.
+
+        Time Complexity: O(D + R * CHUNK_SIZE^2 + L) where D is the number of squares
+        written to since the last update, R the chunks rebuilt or refreshed, and L the number of levels.
+        """
+        self.evaluations = 0
+        self._timestamp = timestamp
+        # Static colours by store signature, for this update.
+        self._cache = {}
+        dirty, everything = self.grid.take_dirty()
+        bg = pack(bg)
+        if everything or bg != self._bg:
+            self._bg = bg
+            allocated = set(self.grid.chunk_keys())
+            for key in [key for key in self._chunks if key not in allocated]:
+                self._drop(key)
+            self._pending = allocated
+            self._animated.clear()
+        self._blank = self._color(self.grid.blank_store, 0, 0)[0]
+        for key, cells in dirty.items():
+            if key not in self._pending:
+                self._refresh(key, cells)
+        for _ in range(min(self.REBUILD_CHUNKS_PER_UPDATE, len(self._pending))):
+            self._refresh(self._pending.pop())
+        for _ in range(min(self.ANIMATED_CHUNKS_PER_UPDATE, len(self._animated))):
+            key, _ = self._animated.popitem(last=False)
+            if key not in self._pending:
+                self._refresh(key)
+
+    def _color(self, store, x: int, y: int) -> tuple[int, bool]:
+        """The packed colour of a store at (x, y), and whether it is animated."""
+        if store.is_static():
+            sig = store.signature()
+            color = self._cache.get(sig)
+            if color is None:
+                color = self._cache[sig] = store.get_color_packed(self._bg, self._timestamp, x, y)
+                self.evaluations += 1
+            return color, False
+        self.evaluations += 1
+        return store.get_color_packed(self._bg, self._timestamp, x, y), True
+
+    def _refresh(self, key: tuple[int, int], cells=None) -> None:
+        """
+        Re-evaluate the given squares (a Bitmap of chunk positions) of a chunk, or all of them,
+        and the blocks above them.
+        """
+        stores = self.grid.chunk_stores(*key)
+        if stores is None:
+            return
+        size = self.grid.CHUNK_SIZE
+        levels = self._chunks.get(key)
+        if levels is None:
+            levels = self._chunks[key] = [ArrayT(3 * (size >> k) ** 2, 'q') for k in range(1, self.chunk_levels + 1)]
+            old = None
+            cells = None
+        else:
+            old = tuple(levels[-1].array[0:3])
+        half = size >> 1
+        if cells is None:
+            blocks = [(u, v) for u in range(half) for v in range(half)]
+        else:
+            blocks = {(x >> 1, y >> 1) for x, y in cells}
+
+        # Level 1, from the squares.
+        blank = self.grid.blank_store
+        x0, y0 = key[0] * size, key[1] * size
+        sums = levels[0].array
+        animated = False
+        for u, v in blocks:
+            r = g = b = 0
+            for x in (2 * u, 2 * u + 1):
+                for y in (2 * v, 2 * v + 1):
+                    color, moving = self._color(stores[x * size + y] or blank, x0 + x, y0 + y)
+                    animated = animated or moving
+                    r += color >> 16
+                    g += color >> 8 & 0xFF
+                    b += color & 0xFF
+            i = 3 * (u * half + v)
+            sums[i] = r
+            sums[i + 1] = g
+            sums[i + 2] = b
+        if cells is None or animated:
+            if animated:
+                self._animated[key] = True
+            else:
+                self._animated.pop(key, None)
+
+        # Levels 2 .. chunk_levels, from the level below.
+        for k in range(2, self.chunk_levels + 1):
+            below, side_below = sums, size >> (k - 1)
+            sums, side = levels[k - 1].array, size >> k
+            blocks = {(u >> 1, v >> 1) for u, v in blocks}
+            for u, v in blocks:
+                # Blocks (2u, 2v), (2u, 2v + 1), (2u + 1, 2v), (2u + 1, 2v + 1) of the level below.
+                i = 3 * (2 * u * side_below + 2 * v)
+                j = i + 3 * side_below
+                o = 3 * (u * side + v)
+                for c in range(3):
+                    sums[o + c] = below[i + c] + below[i + 3 + c] + below[j + c] + below[j + 3 + c]
+
+        top = tuple(sums[0:3])
+        if old is None:
+            self._propagate(key, top, 1)
+        else:
+            self._propagate(key, tuple(a - b for a, b in zip(top, old)), 0)
+
+    def _propagate(self, key: tuple[int, int], delta: tuple[int, int, int], chunks: int) -> None:
+        """Add a change of a chunk's sums, and of the number of chunks, to the blocks above it."""
+        for level, blocks in self._upper.items():
+            shift = level - self.chunk_levels
+            block = (key[0] >> shift, key[1] >> shift)
+            entry = blocks.get(block)
+            if entry is None:
+                entry = blocks[block] = [0, 0, 0, 0]
+            for c in range(3):
+                entry[c] += delta[c]
+            entry[3] += chunks
+            if entry[3] == 0:
+                del blocks[block]
+
+    def _drop(self, key: tuple[int, int]) -> None:
+        """Forget a chunk that is no longer allocated."""
+        levels = self._chunks.pop(key)
+        self._propagate(key, tuple(-s for s in levels[-1].array[0:3]), -1)
+        self._animated.pop(key, None)
+
+    def render(self, level: int, region: tuple[int, int, int, int] = None) -> Frame:
+        """
+        The blocks of a level that cover the region (x0, y0, x1, y1) of squares,
+        defaulting to the whole grid, as a Frame of scale 2^level. Squares beyond
+        the edge of the canvas count as blank. Call update() first.
+        Level 0 is the squares themselves, which GridRenderer draws.
+
+        Time Complexity: O(B) where B is the number of blocks returned
+        """
+        if not 1 <= level <= self.levels:
+            raise ValueError(f"level must be between 1 and {self.levels}")
+        x0, y0, x1, y1 = region or (0, 0, self.grid.x, self.grid.y)
+        scale = 1 << level
+        frame = Frame(x0 >> level, y0 >> level, -(-x1 // scale), -(-y1 // scale))
+        frame.scale = scale
+        area = scale * scale
+        blank = self._blank
+        colors = frame.colors
+        k = 0
+        if level <= self.chunk_levels:
+            shift = self.chunk_levels - level
+            side = self.grid.CHUNK_SIZE >> level
+            for bx in range(frame.x0, frame.x1):
+                cx, u = bx >> shift, bx & ((1 << shift) - 1)
+                for by in range(frame.y0, frame.y1):
+                    cy, v = by >> shift, by & ((1 << shift) - 1)
+                    levels = self._chunks.get((cx, cy))
+                    if levels is None:
+                        colors[k] = blank
+                    else:
+                        sums = levels[level - 1].array
+                        i = 3 * (u * side + v)
+                        colors[k] = (sums[i] // area) << 16 | (sums[i + 1] // area) << 8 | sums[i + 2] // area
+                    k += 1
+            return frame
+        chunk_area = self.grid.CHUNK_SIZE ** 2
+        blank_rgb = (blank >> 16, blank >> 8 & 0xFF, blank & 0xFF)
+        blocks = self._upper[level]
+        for bx in range(frame.x0, frame.x1):
+            for by in range(frame.y0, frame.y1):
+                entry = blocks.get((bx, by))
+                if entry is None:
+                    colors[k] = blank
+                else:
+                    blanks = area - entry[3] * chunk_area
+                    colors[k] = pack(tuple((entry[c] + blanks * blank_rgb[c]) // area for c in range(3)))
+                k += 1
+        return frame
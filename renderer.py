@@ -0,0 +1,463 @@
+"""
+Grid rendering.
+
+Turns the LayerStores of a Grid into the colours shown on screen for one frame.
+"""
+from __future__ import annotations
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from fractions import Fraction
+from grid import Grid, GridSnapshot
+from layer_util import Layer, pack, unpack
+
+
+class Frame:
+    """
+    The colours of a rectangular block of grid squares for one frame.
+    Colours are stored column by column, so frame[x, y] follows grid[x][y].
+    `colors` holds them packed (see layer_util.pack); frame[x, y] gives an (r, g, b) tuple.
+
+    A frame of scale s holds one colour per s x s block of squares (see
+    mipmap.Mipmap): frame[x, y] is the block of squares [x*s, (x+1)*s) x [y*s, (y+1)*s).
+
+    Frames rendered with an interleave also keep, in `sources`, the signature
+    of each animated square's store (None for other squares), so that the next
+    frame can tell which colours it may carry over.
+    """
+
+    def __init__(self, x0: int, y0: int, x1: int, y1: int) -> None:
+        self.x0 = x0
+        self.y0 = y0
+        self.x1 = x1
+        self.y1 = y1
+        self.height = y1 - y0
+        self.colors = [None] * ((x1 - x0) * self.height)
+        self.scale = 1
+        self.sources: list[tuple | None] | None = None
+
+    def __getitem__(self, pos: tuple[int, int]) -> tuple[int, int, int]:
+        return unpack(self.packed(*pos))
+
+    def packed(self, x: int, y: int) -> int:
+        """The colour at (x, y), packed."""
+        return self.colors[(x - self.x0) * self.height + (y - self.y0)]
+
+
+class GridRenderer:
+    """
+    Evaluates the colour of every grid square in a region.
+
+    Squares whose stores are static only depend on the layers they hold,
+    so each distinct static stack is evaluated once per frame and its
+    colour is shared by every square holding that stack. Chunks of the
+    grid that were never allocated are filled with the blank colour
+    without visiting their squares.
+
+    Each chunk of the region is an independent tile writing to its own part
+    of the frame. With more than one worker the tiles are evaluated on a
+    thread pool; with one worker they are evaluated in order on the calling
+    thread. Both give the same frame.
+
+    After each render, animated_layers holds the layers of the region whose
+    output depends on the timestamp or position.
+
+    A render may be interleaved, (phase, n), to update animated squares less
+    often: only the animated squares with (x + y * n // 2) % n == phase are
+    evaluated, and the others keep their colour from the previous frame, as
+    long as it showed the same stack there. Other squares are always
+    evaluated, so painting shows up at once. Every block of n // 2 x 2
+    squares (2 x 2 for n = 2) is spread over all the phases.
+    """
+
+    # Pass as workers to use one thread per core.
+    AUTO_WORKERS = 0
+
+    def __init__(self, workers: int = 1) -> None:
+        self.workers = workers if workers != self.AUTO_WORKERS else (os.cpu_count() or 1)
+        self.evaluations = 0
+        self.animated_layers: list[Layer] = []
+        self._pool = None
+
+    def close(self) -> None:
+        """Shut down the worker threads, if any were started."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def render(self, grid: Grid | GridSnapshot, bg: tuple[int, int, int], timestamp: float, region: tuple[int, int, int, int] = None,
+               previous: Frame = None, interleave: tuple[int, int] = None) -> Frame:
+        """
+        Render the region (x0, y0, x1, y1) of the grid, defaulting to the whole grid.
+        With an interleave (phase, n), the frame records its sources, and if n > 1 only
+        a subset of the animated squares is evaluated, the rest being copied from
+        the previous frame when it covers the same region.
+
+        Time Complexity: O(N*L) where N is the number of created squares in the region
+        and L the number of layers per square. Static squares cost O(1) each
+        once their stack has been evaluated in this frame, and so do the animated
+        squares carried over from the previous frame.
+        """
+        x0, y0, x1, y1 = region or (0, 0, grid.x, grid.y)
+        frame = Frame(x0, y0, x1, y1)
+        # Colours go through the stores packed, and are only unpacked when read from the frame.
+        bg = pack(bg)
+        reuse = None
+        if interleave is not None:
+            frame.sources = [None] * len(frame.colors)
+            phase, n = interleave
+            if (n > 1 and previous is not None and previous.sources is not None
+                    and (previous.x0, previous.y0, previous.x1, previous.y1) == (x0, y0, x1, y1)):
+                reuse = (previous, phase, n)
+        self.evaluations = 0
+        self.animated_layers = []
+        if x1 <= x0 or y1 <= y0:
+            return frame
+        # Colours of static stacks, shared by all tiles. Two tiles racing on the
+        # same stack both evaluate it and store the same colour.
+        shared = {}
+        # One store for each distinct stack that is not static.
+        animated = {}
+        size = grid.CHUNK_SIZE
+        tiles = [
+            (cx, cy)
+            for cx in range(x0 // size, (x1 - 1) // size + 1)
+            for cy in range(y0 // size, (y1 - 1) // size + 1)
+        ]
+        if self.workers <= 1 or len(tiles) == 1:
+            for cx, cy in tiles:
+                self.evaluations += self._render_chunk(grid, frame, shared, animated, cx, cy, bg, timestamp, reuse)
+        else:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="render")
+            futures = [
+                self._pool.submit(self._render_chunk, grid, frame, shared, animated, cx, cy, bg, timestamp, reuse)
+                for cx, cy in tiles
+            ]
+            self.evaluations = sum(future.result() for future in futures)
+        layers = {}
+        for store in animated.values():
+            for layer in store.layers():
+                if not layer.static:
+                    layers[layer.index] = layer
+        self.animated_layers = list(layers.values())
+        return frame
+
+    def _render_chunk(self, grid: Grid | GridSnapshot, frame: Frame, shared: dict, animated: dict, cx: int, cy: int,
+                      bg: int, timestamp: float, reuse: tuple[Frame, int, int] = None) -> int:
+        """
+        Render the part of chunk (cx, cy) that lies inside the frame.
+        reuse is (previous frame, phase, n) for an interleaved render.
+        Returns the number of get_color calls made.
+        """
+        size = grid.CHUNK_SIZE
+        ax0 = max(frame.x0, cx * size)
+        ax1 = min(frame.x1, (cx + 1) * size)
+        ay0 = max(frame.y0, cy * size)
+        ay1 = min(frame.y1, (cy + 1) * size)
+        colors = frame.colors
+        height = frame.height
+        blank = grid.blank_store
+        stores = grid.chunk_stores(cx, cy)
+        if stores is None:
+            # Untouched chunk: every square shows the blank colour.
+            evaluations = 0
+            color = shared.get(blank.signature())
+            if color is None:
+                color = shared[blank.signature()] = blank.get_color_packed(bg, timestamp, ax0, ay0)
+                evaluations = 1
+            column = [color] * (ay1 - ay0)
+            for x in range(ax0, ax1):
+                k = (x - frame.x0) * height + (ay0 - frame.y0)
+                colors[k:k + len(column)] = column
+            return evaluations
+        sources = frame.sources
+        if reuse is not None:
+            previous, phase, n = reuse
+            old_colors, old_sources = previous.colors, previous.sources
+            skew = n // 2
+        evaluations = 0
+        for x in range(ax0, ax1):
+            k = (x - frame.x0) * height + (ay0 - frame.y0)
+            base = (x - cx * size) * size - cy * size
+            for y in range(ay0, ay1):
+                store = stores[base + y] or blank
+                if store.is_static():
+                    sig = store.signature()
+                    color = shared.get(sig)
+                    if color is None:
+                        color = shared[sig] = store.get_color_packed(bg, timestamp, x, y)
+                        evaluations += 1
+                else:
+                    sig = store.signature()
+                    if sig not in animated:
+                        animated[sig] = store
+                    if reuse is not None and (x + skew * y) % n != phase and old_sources[k] == sig:
+                        color = old_colors[k]
+                    else:
+                        color = store.get_color_packed(bg, timestamp, x, y)
+                        evaluations += 1
+                    if sources is not None:
+                        sources[k] = sig
+                colors[k] = color
+                k += 1
+        return evaluations
+
+
+def animation_timing(layers: list[Layer]) -> tuple[Fraction, Fraction | None] | None:
+    """
+    The (step, period) shared by a set of layers: frames rendered within the
+    same step of the period look the same.
+    - step is the largest step that every layer's step is a multiple of.
+    - period is the smallest common multiple of the periods, or None if some layer never repeats.
+    Returns None if some layer has no step, so its frames can not be reused.
+    No layers gives (1, 1): the frame never changes.
+
+    Time Complexity: O(L) where L is the number of layers
+    """
+    step = period = Fraction(1)
+    first = True
+    for layer in layers:
+        if layer.step is None:
+            return None
+        if first:
+            step, period = layer.step, layer.period
+            first = False
+            continue
+        step = _fraction_gcd(step, layer.step)
+        if period is not None and layer.period is not None:
+            period = period * layer.period / _fraction_gcd(period, layer.period)
+        else:
+            period = None
+    return step, period
+
+
+def _fraction_gcd(a: Fraction, b: Fraction) -> Fraction:
+    return Fraction(math.gcd(a.numerator * b.denominator, b.numerator * a.denominator), a.denominator * b.denominator)
+
+
+class FrameCache:
+    """
+    Reuses rendered frames while the grid is unchanged.
+
+    A frame is looked up by the grid version, region and background colour,
+    and by the timestamp quantised with the animation_timing of the layers
+    found in the region: the step number, wrapped around the period. When
+    the frame has to be rendered, it is rendered at the start of its step,
+    so every timestamp of the step shows the same picture. An idle animated
+    canvas stops rendering once it has shown a whole period.
+
+    Frames are kept in least recently used order, up to max_cells grid squares in total.
+    Interleaved frames that carried colours over are returned but not kept.
+    Offers the same interface as GridRenderer, and the frames returned must not be modified.
+    """
+
+    MAX_CELLS = 1 << 19
+    # How many (version, region, background) combinations to remember the timing of.
+    MAX_TIMINGS = 64
+
+    def __init__(self, renderer: GridRenderer, max_cells: int = MAX_CELLS) -> None:
+        self.renderer = renderer
+        self.max_cells = max_cells
+        self.evaluations = 0
+        self.hits = 0
+        self.misses = 0
+        self._frames = OrderedDict()
+        self._cells = 0
+        self._timings = OrderedDict()
+
+    def close(self) -> None:
+        self.renderer.close()
+
+    def clear(self) -> None:
+        """Forget every cached frame."""
+        self._frames.clear()
+        self._timings.clear()
+        self._cells = 0
+
+    def render(self, grid: Grid | GridSnapshot, bg: tuple[int, int, int], timestamp: float, region: tuple[int, int, int, int] = None,
+               previous: Frame = None, interleave: tuple[int, int] = None) -> Frame:
+        """
+        The frame GridRenderer.render would give, reusing a cached one if possible.
+
+        Time Complexity: O(1) on a hit, the cost of GridRenderer.render on a miss.
+        """
+        region = region or (0, 0, grid.x, grid.y)
+        base = (grid.version, region, bg)
+        exact = interleave is None or interleave[1] == 1
+        timing = self._timings.get(base, False)
+        if timing is False:
+            # First frame of this grid state: the render tells which layers are animated.
+            # It stands for its whole step, as the layers allow.
+            frame = self.renderer.render(grid, bg, timestamp, region, previous, interleave)
+            self.evaluations = self.renderer.evaluations
+            self.misses += 1
+            timing = self._timings[base] = animation_timing(self.renderer.animated_layers)
+            if len(self._timings) > self.MAX_TIMINGS:
+                self._timings.popitem(last=False)
+            if timing is not None and exact:
+                self._store((base, self._quantise(timestamp, timing)[0]), frame)
+            return frame
+        if timing is None:
+            frame = self.renderer.render(grid, bg, timestamp, region, previous, interleave)
+            self.evaluations = self.renderer.evaluations
+            self.misses += 1
+            return frame
+        self._timings.move_to_end(base)
+        step, start = self._quantise(timestamp, timing)
+        key = (base, step)
+        frame = self._frames.get(key)
+        if frame is not None:
+            self._frames.move_to_end(key)
+            self.evaluations = 0
+            self.hits += 1
+            return frame
+        frame = self.renderer.render(grid, bg, start, region, previous, interleave)
+        self.evaluations = self.renderer.evaluations
+        self.misses += 1
+        if exact:
+            self._store(key, frame)
+        return frame
+
+    @staticmethod
+    def _quantise(timestamp: float, timing: tuple[Fraction, Fraction | None]) -> tuple[int, float]:
+        """The step number of the timestamp, and the time at which that step starts."""
+        step, period = timing
+        n = math.floor(Fraction(timestamp) / step)
+        if period is not None:
+            n %= int(period / step)
+        return n, float(n * step)
+
+    def _store(self, key: tuple, frame: Frame) -> None:
+        self._frames[key] = frame
+        self._cells += len(frame.colors)
+        while self._cells > self.max_cells and len(self._frames) > 1:
+            _, old = self._frames.popitem(last=False)
+            self._cells -= len(old.colors)
+
+
+class FrameBudget:
+    """
+    Chooses the interleave of each render from how long recent renders took.
+
+    While renders take longer than `budget` seconds, animated squares are updated
+    in more and more interleaved subsets (1, 2, 4, then 8 frames to update them
+    all), so each frame evaluates fewer of them. Once renders take well under the
+    budget again, the interleave is reduced. Static squares and newly painted
+    squares are evaluated in every frame (see GridRenderer).
+
+    Usage:  frame = renderer.render(grid, bg, t, region, budget.previous, budget.next_interleave())
+            budget.record(frame, seconds)
+    """
+
+    LEVELS = (1, 2, 4, 8)
+    # Weight of the latest render time in the running average.
+    SMOOTHING = 0.2
+    # Below this fraction of the budget, the interleave is reduced.
+    RELAX = 0.4
+    # Renders to wait after changing the interleave, for the average to follow.
+    SETTLE = 15
+
+    def __init__(self, budget: float) -> None:
+        self.budget = budget
+        self.level = 0
+        self.average = 0.0
+        self.previous: Frame | None = None
+        self._frame = 0
+        self._settle = 0
+
+    @property
+    def interleave(self) -> int:
+        """In how many frames every animated square is updated."""
+        return self.LEVELS[self.level]
+
+    def next_interleave(self) -> tuple[int, int]:
+        """The (phase, n) to render the next frame with."""
+        self._frame += 1
+        n = self.interleave
+        return self._frame % n, n
+
+    def record(self, frame: Frame, seconds: float) -> None:
+        """
+        Account for a finished render, and keep its frame for the next one to carry colours over from.
+
+        Time Complexity: O(1) Constant Time Complexity
+        """
+        self.previous = frame
+        self.average += (seconds - self.average) * self.SMOOTHING
+        if self._settle > 0:
+            self._settle -= 1
+            return
+        if self.average > self.budget and self.level < len(self.LEVELS) - 1:
+            self.level += 1
+        elif self.average < self.budget * self.RELAX and self.level > 0:
+            self.level -= 1
+        else:
+            return
+        self._settle = self.SETTLE
+
+
+class RenderThread:
+    """
+    Renders frames on a background thread, so the window can keep handling
+    input and presenting the last finished frame while the next one is computed.
+
+    The window hands over a snapshot of the grid with submit(), and reads the
+    most recent finished frame from `front`. Publishing a frame is a single
+    reference assignment, so neither side ever waits for the other.
+
+    With a FrameBudget, the thread times its renders and interleaves them as the budget asks.
+    """
+
+    def __init__(self, renderer: GridRenderer | FrameCache, budget: FrameBudget = None) -> None:
+        self.renderer = renderer
+        self.budget = budget
+        self.front: Frame | None = None
+        self.evaluations = 0
+        self._job = None
+        self._busy = False
+        self._stopped = False
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="render", daemon=True)
+        self._thread.start()
+
+    @property
+    def busy(self) -> bool:
+        """True while a submitted frame has not been finished."""
+        return self._busy
+
+    def submit(self, grid: GridSnapshot, bg: tuple[int, int, int], timestamp: float, region: tuple[int, int, int, int] = None) -> None:
+        """Request a frame of the snapshot. Replaces any request that has not started yet."""
+        self._busy = True
+        self._job = (grid, bg, timestamp, region)
+        self._wake.set()
+
+    def stop(self) -> None:
+        """Stop the thread after the frame in progress, if any."""
+        self._stopped = True
+        self._wake.set()
+        self._thread.join()
+        self.renderer.close()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            if self._stopped:
+                return
+            job, self._job = self._job, None
+            if job is None:
+                continue
+            if self.budget is None:
+                frame = self.renderer.render(*job)
+            else:
+                start = time.perf_counter()
+                frame = self.renderer.render(*job, self.budget.previous, self.budget.next_interleave())
+                self.budget.record(frame, time.perf_counter() - start)
+            self.evaluations = self.renderer.evaluations
+            self.front = frame
+            if self._job is None:
+                self._busy = False
@@ -1,4 +1,5 @@
 from __future__ import annotations
+import time
 from action import PaintAction, PaintStep
 from grid import Grid
 from data_structures.stack_adt import ArrayStack
@@ -75,6 +76,105 @@ class ReplayTracker:
         else:
             return True
 
+    def memory_counts(self) -> dict[str, int]:
+        """
+        The actions queued for replay, and the space of the undo history used while replaying
+        (see memory.MemoryMonitor).
+
+        Time Complexity: O(1) Constant Time Complexity
+        """
+        return {
+            "entries": len(self.actions),
+            "capacity": len(self.actions.array),
+            "undo_capacity": len(self.undo.stack.array) + len(self.undo.undo_stack.array),
+        }
+
+class ReplayPlayer:
+    """
+    Plays a replay back at a chosen speed, within a time budget per frame.
+
+    At speed 1, one action is due every `interval` seconds; at speed s, s times as many.
+    Each frame, advance() plays the actions that have become due, stopping once `budget`
+    seconds have been spent, so a fast replay never stalls the window. The window then
+    draws once, so the states in between are never rendered. Actions that did not fit
+    in the budget are dropped from the count due rather than carried over, so the replay
+    runs as fast as the budget allows and a lower speed takes effect at once.
+
+    Usage:  player = ReplayPlayer(controller.on_replay_next_step, speed=10)
+            player.advance(delta_time)     # once per update, until player.finished
+    """
+
+    MIN_SPEED = 0.25
+    MAX_SPEED = 1000
+    # The speeds faster() and slower() step through.
+    SPEEDS = (0.25, 0.5, 1, 2, 4, 10, 30, 100, 300, 1000)
+
+    def __init__(self, step, interval: float = 0.05, speed: float = 1, budget: float = 0.008, clock=time.perf_counter) -> None:
+        """
+        - step: plays the next action, returning True once there is nothing left to play,
+          as ReplayTracker.play_next_action does.
+        - interval: seconds between two actions at speed 1.
+        - budget: seconds of playing per advance(). At least one due action is played each time.
+        """
+        self.step = step
+        self.interval = interval
+        self.budget = budget
+        self.clock = clock
+        self.speed = speed
+        self.paused = False
+        self.finished = False
+        self.played = 0
+        self._due = 0.0
+
+    @property
+    def speed(self) -> float:
+        return self._speed
+
+    @speed.setter
+    def speed(self, speed: float) -> None:
+        if not self.MIN_SPEED <= speed <= self.MAX_SPEED:
+            raise ValueError(f"speed must be between {self.MIN_SPEED} and {self.MAX_SPEED}")
+        self._speed = speed
+
+    def faster(self) -> None:
+        """Switch to the next speed of SPEEDS, if any."""
+        self.speed = next((s for s in self.SPEEDS if s > self.speed), self.speed)
+
+    def slower(self) -> None:
+        """Switch to the previous speed of SPEEDS, if any."""
+        self.speed = next((s for s in reversed(self.SPEEDS) if s < self.speed), self.speed)
+
+    def toggle_pause(self) -> None:
+        """Pause a playing replay, or resume a paused one where it stopped."""
+        self.paused = not self.paused
+
+    def advance(self, delta_time: float) -> int:
+        """
+        Play the actions due after delta_time more seconds, within the budget.
+        Returns the number of actions played.
+
+        Time Complexity: O(A) where A is the number of actions played, at most those due
+        """
+        if self.paused or self.finished:
+            return 0
+        self._due += delta_time * self.speed / self.interval
+        deadline = self.clock() + self.budget
+        played = 0
+        while self._due >= 1:
+            if self.step():
+                self.finished = True
+                self._due = 0.0
+                break
+            self._due -= 1
+            played += 1
+            if self.clock() >= deadline:
+                # Behind: drop the rest rather than carry it over.
+                self._due %= 1
+                break
+        self.played += played
+        return played
+
+
 if __name__ == "__main__":
     action1 = PaintAction([], is_special=True)
     action2 = PaintAction([])
@@ -0,0 +1,291 @@
+"""
+Local canvas server.
+
+Lets several viewers share one canvas over a local socket. The server owns
+a PaintController, as the window does; clients send commands and receive
+the squares that changed.
+
+Messages are JSON objects, one per line.
+
+Client to server:
+    {"op": "paint", "layer": "red", "x": 3, "y": 4}     optional "brush": size for this paint
+    {"op": "fill", "layer": "red", "x": 3, "y": 4}      flood fill from (x, y)
+    {"op": "copy", "x0": 0, "y0": 0, "x1": 8, "y1": 8}  copy the rectangle [x0, x1) x [y0, y1)
+    {"op": "paste", "x": 3, "y": 4}                     paste the last copy, from any client, at (x, y)
+    {"op": "clear", "x0": 0, "y0": 0, "x1": 8, "y1": 8} empty the rectangle
+    {"op": "undo"}  {"op": "redo"}  {"op": "special"}
+
+Server to client:
+    {"type": "init", "width", "height", "draw_style", "tick"}    once, on connecting
+    {"type": "state", "tick", "blank", "cells"}    every square, on connecting or after falling behind
+    {"type": "delta", "tick", "blank", "cells"}    squares changed in the last tick
+    {"type": "error", "message"}
+
+"cells" groups squares by the signature of their LayerStore (see LayerStore.signature):
+[[signature, [x0, y0, x1, y1, ...]], ...]. A square that is not listed in a "state"
+shows "blank", the signature of squares that were never painted.
+
+Commands are queued as they arrive and applied together once per tick, after
+which a single delta, encoded once, is written to every client.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+
+from controller import PaintController
+from grid import Grid
+from layer_util import get_layers
+
+
+class CanvasServer:
+    """
+    Applies the commands of every client to one canvas, in batched ticks.
+
+    - tick: seconds between batches.
+    - max_buffer: bytes a client may have waiting to be sent before it is
+      considered behind. Its deltas are then skipped, and it gets a full
+      state once it has caught up.
+    """
+
+    TICK = 1 / 30
+    MAX_BUFFER = 1 << 20
+
+    def __init__(self, draw_style: str, width: int, height: int, tick: float = TICK, max_buffer: int = MAX_BUFFER) -> None:
+        self.controller = PaintController(Grid(draw_style, width, height))
+        self.tick = tick
+        self.max_buffer = max_buffer
+        self.ticks = 0
+        self.layers = {layer.name: layer for layer in get_layers() if layer is not None}
+        self._pending = []
+        self._clients = {}
+        self._tasks = set()
+        self._wake = asyncio.Event()
+        self._server = None
+        self._ticker = None
+
+    @property
+    def grid(self) -> Grid:
+        """The shared canvas, owned by the controller."""
+        return self.controller.grid
+
+    @property
+    def clients(self) -> int:
+        """Number of connected clients."""
+        return len(self._clients)
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0, path: str = None) -> None:
+        """Listen on a unix socket at path, or else on host:port (port 0 picks a free one)."""
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self._serve, path)
+        else:
+            self._server = await asyncio.start_server(self._serve, host, port)
+        self._ticker = asyncio.create_task(self._run())
+
+    @property
+    def port(self) -> int:
+        """The TCP port listened on."""
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        """Stop listening, and disconnect every client."""
+        self._ticker.cancel()
+        self._server.close()
+        for writer in list(self._clients):
+            writer.close()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self._server.wait_closed()
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Handle one client: greet it, then queue its commands until it disconnects."""
+        self._tasks.add(asyncio.current_task())
+        # Every new client needs the whole canvas on the next tick.
+        self._clients[writer] = True
+        writer.write(self._encode({
+            "type": "init",
+            "width": self.grid.x,
+            "height": self.grid.y,
+            "draw_style": self.grid.draw_style,
+            "tick": self.tick,
+        }))
+        self._wake.set()
+        try:
+            while True:
+                try:
+                    line = await reader.readuntil(b"\n")
+                except asyncio.IncompleteReadError as e:
+                    # The client disconnected, possibly after a last line without a newline.
+                    line = e.partial
+                except asyncio.LimitOverrunError:
+                    writer.write(self._encode({"type": "error", "message": "Command too long"}))
+                    await self._skip_line(reader)
+                    continue
+                if not line:
+                    break
+                try:
+                    command = json.loads(line)
+                    self._check(command)
+                except (ValueError, KeyError, TypeError) as e:
+                    writer.write(self._encode({"type": "error", "message": str(e)}))
+                    continue
+                self._pending.append(command)
+                self._wake.set()
+        except ConnectionError:
+            pass
+        finally:
+            self._clients.pop(writer, None)
+            self._tasks.discard(asyncio.current_task())
+            writer.close()
+
+    @staticmethod
+    async def _skip_line(reader: asyncio.StreamReader) -> None:
+        """Discard a line longer than the stream limit, up to and including its newline, a buffer at a time."""
+        while True:
+            try:
+                await reader.readuntil(b"\n")
+                return
+            except asyncio.LimitOverrunError as e:
+                await reader.readexactly(e.consumed)
+            except asyncio.IncompleteReadError:
+                return
+
+    def _check(self, command: dict) -> None:
+        """Raise ValueError if the command can not be applied."""
+        op = command["op"]
+        if op in ("paint", "fill") and command["layer"] not in self.layers:
+            raise ValueError(f"Unknown layer {command['layer']}")
+        if op in ("paint", "fill", "paste"):
+            if not (isinstance(command["x"], int) and isinstance(command["y"], int)):
+                raise ValueError("x and y must be integers")
+        if op == "paint":
+            brush = command.get("brush", self.grid.brush_size)
+            if not (isinstance(brush, int) and Grid.MIN_BRUSH <= brush <= Grid.MAX_BRUSH):
+                raise ValueError(f"brush must be between {Grid.MIN_BRUSH} and {Grid.MAX_BRUSH}")
+        elif op in ("fill", "paste"):
+            if not (0 <= command["x"] < self.grid.x and 0 <= command["y"] < self.grid.y):
+                raise ValueError("x and y must be inside the grid")
+        elif op in ("copy", "clear"):
+            x0, y0, x1, y1 = (command[k] for k in ("x0", "y0", "x1", "y1"))
+            if not all(isinstance(v, int) for v in (x0, y0, x1, y1)):
+                raise ValueError("x0, y0, x1 and y1 must be integers")
+            if not (max(0, x0) < min(self.grid.x, x1) and max(0, y0) < min(self.grid.y, y1)):
+                raise ValueError("The rectangle has no square inside the grid")
+        elif op not in ("undo", "redo", "special"):
+            raise ValueError(f"Unknown op {op}")
+
+    async def _run(self) -> None:
+        """Every tick with something to do: apply the queued commands and send the changes."""
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            self.step()
+            await asyncio.sleep(self.tick)
+
+    def step(self) -> None:
+        """
+        Apply every queued command, then send one delta to the clients that are
+        up to date, and the whole canvas to those that need it.
+
+        Time Complexity: O(P + D + N) where P is the painted squares of the commands,
+        D the squares changed and N the number of clients; O(S) for the full state of S created squares.
+        """
+        commands, self._pending = self._pending, []
+        for command in commands:
+            self.apply(command)
+        self.ticks += 1
+        chunks, everything = self.grid.take_dirty()
+        delta = None
+        state = None
+        for writer, needs_state in list(self._clients.items()):
+            if writer.is_closing():
+                continue
+            if writer.transport.get_write_buffer_size() > self.max_buffer:
+                # Behind: skip its deltas, and resend everything once it has caught up.
+                self._clients[writer] = True
+                self._wake.set()
+                continue
+            if needs_state or everything:
+                if state is None:
+                    state = self._encode(self._state())
+                writer.write(state)
+                self._clients[writer] = False
+            elif chunks:
+                if delta is None:
+                    delta = self._encode(self._delta(chunks))
+                writer.write(delta)
+
+    def apply(self, command: dict) -> None:
+        """Apply one command to the canvas, through the controller, as the window does."""
+        op = command["op"]
+        if op == "paint":
+            brush = self.grid.brush_size
+            self.grid.brush_size = command.get("brush", brush)
+            self.controller.on_paint(self.layers[command["layer"]], command["x"], command["y"])
+            self.grid.brush_size = brush
+        elif op == "fill":
+            self.controller.on_fill(self.layers[command["layer"]], command["x"], command["y"])
+        elif op == "copy":
+            self.controller.on_copy(command["x0"], command["y0"], command["x1"], command["y1"])
+        elif op == "paste":
+            self.controller.on_paste(command["x"], command["y"])
+        elif op == "clear":
+            self.controller.on_clear_region(command["x0"], command["y0"], command["x1"], command["y1"])
+        elif op == "undo":
+            self.controller.on_undo()
+        elif op == "redo":
+            self.controller.on_redo()
+        elif op == "special":
+            self.controller.on_special()
+
+    def _delta(self, chunks: dict) -> dict:
+        size = self.grid.CHUNK_SIZE
+        groups = {}
+        for (cx, cy), bitmap in chunks.items():
+            for x, y in bitmap:
+                x += cx * size
+                y += cy * size
+                # Squares marked around a region may not have been created.
+                store = self.grid.peek(x, y) or self.grid.blank_store
+                groups.setdefault(store.signature(), []).extend((x, y))
+        return {"type": "delta", "tick": self.ticks, "blank": self.grid.blank_store.signature(), "cells": list(groups.items())}
+
+    def _state(self) -> dict:
+        blank = self.grid.blank_store.signature()
+        groups = {}
+        for x, y, store in self.grid.created_stores():
+            signature = store.signature()
+            if signature != blank:
+                groups.setdefault(signature, []).extend((x, y))
+        return {"type": "state", "tick": self.ticks, "blank": blank, "cells": list(groups.items())}
+
+    @staticmethod
+    def _encode(message: dict) -> bytes:
+        return json.dumps(message, separators=(",", ":")).encode() + b"\n"
+
+
+async def _main(args) -> None:
+    server = CanvasServer(args.draw_style, args.grid_width, args.grid_height, args.tick)
+    await server.start(args.host, args.port, args.socket)
+    where = args.socket or f"{args.host}:{server.port}"
+    print(f"Serving a {args.grid_width}x{args.grid_height} {args.draw_style} canvas on {where}")
+    await asyncio.Event().wait()
+
+
+def main():
+    p = argparse.ArgumentParser(description="Share a canvas with local clients.")
+    p.add_argument("--draw-style", choices=Grid.DRAW_STYLE_OPTIONS, default=Grid.DRAW_STYLE_SET)
+    p.add_argument("--grid-width", type=int, default=32)
+    p.add_argument("--grid-height", type=int, default=32)
+    p.add_argument("--tick", type=float, default=CanvasServer.TICK, help="Seconds between batches of commands.")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--socket", help="Listen on this unix socket path instead of TCP.")
+    args = p.parse_args()
+    try:
+        asyncio.run(_main(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
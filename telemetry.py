@@ -0,0 +1,168 @@
+"""
+Frame-time instrumentation.
+
+Times the phases of each frame and counts colour evaluations, so regressions
+can be found without attaching a profiler. Disabled by default; when disabled
+every hook is a single attribute check.
+"""
+from __future__ import annotations
+import json
+import threading
+import time
+from layer_util import get_layers
+
+
+class _Phase:
+    """Context manager adding the time spent inside it to a phase of the current frame."""
+
+    def __init__(self, telemetry: FrameTelemetry, name: str) -> None:
+        self.telemetry = telemetry
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self) -> None:
+        if self.telemetry.enabled:
+            self.start = time.perf_counter()
+
+    def __exit__(self, *exc) -> None:
+        if self.telemetry.enabled:
+            phases = self.telemetry.current
+            phases[self.name] = phases.get(self.name, 0.0) + time.perf_counter() - self.start
+
+
+class FrameTelemetry:
+    """
+    Per-frame phase timers and call counters.
+
+    Usage:  with telemetry.phase(FrameTelemetry.PAINT):
+                ...
+            telemetry.end_frame()
+    """
+
+    SIDEBAR = "sidebar"
+    GRID_EVAL = "grid_eval"
+    DRAW = "draw"
+    PAINT = "paint"
+    UNDO_REDO = "undo_redo"
+    REPLAY = "replay"
+    PHASES = (SIDEBAR, GRID_EVAL, DRAW, PAINT, UNDO_REDO, REPLAY)
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.frame = 0
+        self.current: dict[str, float] = {}
+        self.get_color_calls: dict[str, int] = {}
+        self.apply_calls: dict[str, int] = {}
+        self.last: dict = None
+        self._phases = {name: _Phase(self, name) for name in self.PHASES}
+        self._wrapped = {}
+        # Depth of counted calls on each thread, so layers applied by other layers are not counted again.
+        self._nesting = threading.local()
+        self._export = None
+        self._frame_start = time.perf_counter()
+
+    def phase(self, name: str) -> _Phase:
+        """Returns the timer for a phase, to be used in a with statement."""
+        return self._phases[name]
+
+    def enable(self) -> None:
+        """
+        Start collecting, wrapping every registered layer to count its apply calls.
+        A layer applied from inside another one, as sparkle applies lighten or darken,
+        is counted only under the outer layer.
+        """
+        if self.enabled:
+            return
+        self.enabled = True
+        for layer in get_layers():
+            if layer is None:
+                break
+            self._wrapped[layer.index] = layer.apply, layer.apply_packed
+            layer.apply = self._counting(layer.name, layer.apply)
+            layer.apply_packed = self._counting(layer.name, layer.apply_packed)
+        self._reset_frame()
+
+    def disable(self) -> None:
+        """Stop collecting and restore the original layer functions."""
+        if not self.enabled:
+            return
+        self.enabled = False
+        for layer in get_layers():
+            if layer is None:
+                break
+            if layer.index in self._wrapped:
+                layer.apply, layer.apply_packed = self._wrapped.pop(layer.index)
+        self.stop_export()
+
+    def _counting(self, name: str, func):
+        calls = self.apply_calls
+        nesting = self._nesting
+        def counted(color, timestamp, x, y):
+            depth = getattr(nesting, "depth", 0)
+            if not depth:
+                calls[name] = calls.get(name, 0) + 1
+            nesting.depth = depth + 1
+            try:
+                return func(color, timestamp, x, y)
+            finally:
+                nesting.depth = depth
+        counted.__name__ = func.__name__
+        return counted
+
+    def count_get_color(self, store_type: str, n: int) -> None:
+        """Record n LayerStore.get_color calls made for stores of the given type."""
+        if self.enabled:
+            self.get_color_calls[store_type] = self.get_color_calls.get(store_type, 0) + n
+
+    def start_export(self, path: str) -> None:
+        """Append one JSON object per frame to the file at path."""
+        self.stop_export()
+        self._export = open(path, "a")
+
+    def stop_export(self) -> None:
+        if self._export is not None:
+            self._export.close()
+            self._export = None
+
+    @property
+    def exporting(self) -> bool:
+        return self._export is not None
+
+    def _reset_frame(self) -> None:
+        self.current = {}
+        self.get_color_calls.clear()
+        self.apply_calls.clear()
+        self._frame_start = time.perf_counter()
+
+    def end_frame(self) -> None:
+        """Close the current frame: keep its figures in `last` and export them if requested."""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.frame += 1
+        self.last = {
+            "frame": self.frame,
+            "time": time.time(),
+            "frame_ms": (now - self._frame_start) * 1000,
+            "phases_ms": {name: self.current.get(name, 0.0) * 1000 for name in self.PHASES},
+            "get_color": dict(self.get_color_calls),
+            "apply": dict(self.apply_calls),
+        }
+        if self._export is not None:
+            self._export.write(json.dumps(self.last) + "\n")
+        self._reset_frame()
+
+    def summary(self) -> list[str]:
+        """Lines describing the last finished frame, for the on-screen overlay."""
+        if self.last is None:
+            return []
+        lines = [f"frame {self.last['frame']}: {self.last['frame_ms']:.1f} ms"]
+        for name, ms in self.last["phases_ms"].items():
+            lines.append(f"{name}: {ms:.2f} ms")
+        for store_type, n in self.last["get_color"].items():
+            lines.append(f"get_color {store_type}: {n}")
+        for name, n in sorted(self.last["apply"].items(), key=lambda kv: -kv[1]):
+            lines.append(f"apply {name}: {n}")
+        if self.exporting:
+            lines.append("exporting")
+        return lines
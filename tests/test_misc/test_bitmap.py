@@ -0,0 +1,48 @@
+import unittest
+from ed_utils.decorators import number
+
+from data_structures.bitmap import Bitmap
+
+class TestBitmap(unittest.TestCase):
+
+    @number("14.1")
+    def test_bitmap(self):
+        a = Bitmap(130, 6)
+        a.fill_rect(60, 1, 129, 4)
+        self.assertEqual(len(a), 69 * 3)
+        self.assertIn((128, 3), a)
+        self.assertNotIn((129, 3), a)
+        self.assertNotIn((59, 1), a)
+        self.assertNotIn((200, 1), a)
+        a.clear_rect(-5, 2, 500, 3)
+        self.assertEqual(len(a), 69 * 2)
+        b = Bitmap(130, 6)
+        b.add(0, 0)
+        b.add(100, 1)
+        b.add(129, 5)
+        self.assertEqual(list(a & b), [(100, 1)])
+        self.assertEqual(list(b - a), [(0, 0), (129, 5)])
+        self.assertEqual(len(a | b), 69 * 2 + 2)
+        self.assertEqual(list(b), [(0, 0), (100, 1), (129, 5)])
+        b.discard(100, 1)
+        self.assertEqual(len(b), 2)
+        c = b.copy()
+        c |= a
+        self.assertEqual(c, a | b)
+        self.assertEqual(len(b), 2)
+        self.assertRaises(ValueError, a.union, Bitmap(10, 10))
+        self.assertRaises(IndexError, a.add, 130, 0)
+        c.clear()
+        self.assertTrue(c.is_empty())
+
+    @number("14.2")
+    def test_rows(self):
+        a = Bitmap(130, 3)
+        a.set_row(1, (1 << 129) | 0b101)
+        self.assertEqual(list(a), [(0, 1), (2, 1), (129, 1)])
+        self.assertEqual(a.row(1), (1 << 129) | 0b101)
+        self.assertEqual(a.row(0), 0)
+        a.fill_rect(0, 2, 130, 3)
+        self.assertEqual(a.row(2), (1 << 130) - 1)
+        self.assertRaises(ValueError, a.set_row, 0, 1 << 130)
+        self.assertRaises(IndexError, a.row, 3)
@@ -0,0 +1,54 @@
+import json
+import subprocess
+import sys
+import unittest
+from ed_utils.decorators import number
+
+from controller import PaintController
+from grid import Grid
+from layers import red
+
+# Seconds a fresh interpreter may spend importing the engine. It takes about
+# 0.05s; importing main (arcade and pyglet) takes several times the budget.
+IMPORT_BUDGET = 0.25
+GUI_MODULES = ("arcade", "pyglet")
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import controller
+elapsed = time.perf_counter() - start
+print(json.dumps({"elapsed": elapsed, "modules": sorted(m for m in sys.modules if m.split(".")[0] in %r)}))
+""" % (GUI_MODULES,)
+
+
+def probe_import() -> dict:
+    out = subprocess.run([sys.executable, "-c", PROBE], capture_output=True, text=True, check=True).stdout
+    return json.loads(out)
+
+
+class TestController(unittest.TestCase):
+
+    @number("16.1")
+    def test_headless_import(self):
+        self.assertEqual(probe_import()["modules"], [])
+
+    @number("16.2")
+    def test_import_budget(self):
+        # Best of three, so a busy machine does not fail the check on its own.
+        elapsed = min(probe_import()["elapsed"] for _ in range(3))
+        self.assertLess(elapsed, IMPORT_BUDGET)
+
+    @number("16.3")
+    def test_history(self):
+        grid = Grid(Grid.DRAW_STYLE_SET, 5, 5)
+        controller = PaintController(grid)
+        controller.on_paint(red, 2, 2)
+        controller.on_special()
+        self.assertEqual(len(controller.undo_tracker.stack), 2)
+        controller.on_undo(2)
+        self.assertEqual(grid.peek(2, 2).get_color((0, 0, 0), 0, 2, 2), (0, 0, 0))
+        controller.on_redo()
+        self.assertEqual(grid.peek(2, 2).get_color((0, 0, 0), 0, 2, 2), (255, 0, 0))
+        # Replay records the paint, both undone actions and the redo.
+        self.assertEqual(len(controller.replay_tracker.actions), 4)
@@ -0,0 +1,58 @@
+import os
+import struct
+import tempfile
+import unittest
+import zlib
+from ed_utils.decorators import number
+
+from action import PaintAction, PaintStep
+from export import export_animation, FORMAT_RAW, FORMAT_PNG
+from grid import Grid
+from layers import red, rainbow
+from replay import ReplayTracker
+
+class TestExport(unittest.TestCase):
+
+    @number("11.1")
+    def test_raw(self):
+        grid = Grid(Grid.DRAW_STYLE_SET, 4, 3)
+        grid[0][2].add(red)
+        grid[3][0].add(rainbow)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "out.rgb")
+            n = export_animation(grid, path, 0, 1, 5, fmt=FORMAT_RAW, bg=(0, 0, 0), scale=2)
+            with open(path, "rb") as f:
+                data = f.read()
+        self.assertEqual(n, 5)
+        frame_size = 8 * 6 * 3
+        self.assertEqual(len(data), 5 * frame_size)
+        # Square (0, 2) is the top left 2x2 pixels.
+        self.assertEqual(data[0:3], bytes((255, 0, 0)))
+        self.assertEqual(data[8 * 3 + 3:8 * 3 + 6], bytes((255, 0, 0)))
+        # Square (3, 0) is the bottom right, and animated.
+        last = lambda i: data[i * frame_size + frame_size - 3:(i + 1) * frame_size]
+        self.assertEqual(last(0), bytes(rainbow.apply((0, 0, 0), 0, 3, 0)))
+        self.assertEqual(last(4), bytes(rainbow.apply((0, 0, 0), 0.8, 3, 0)))
+
+    @number("11.2")
+    def test_png_replay(self):
+        replay = ReplayTracker()
+        replay.add_action(PaintAction([PaintStep((1, 1), red)]))
+        grid = Grid(Grid.DRAW_STYLE_SET, 3, 3)
+        with tempfile.TemporaryDirectory() as tmp:
+            n = export_animation(grid, tmp, 0, 0.2, 10, fmt=FORMAT_PNG, replay=replay, action_interval=0.1)
+            frames = [self.read_png(os.path.join(tmp, f"frame_{i:05d}.png")) for i in range(n)]
+        self.assertEqual(n, 2)
+        # The action is played 0.1s in.
+        self.assertEqual(frames[0][1][10 + 1 + 3:10 + 1 + 6], bytes((255, 255, 255)))
+        self.assertEqual(frames[1][1][10 + 1 + 3:10 + 1 + 6], bytes((255, 0, 0)))
+
+    def read_png(self, path):
+        """Returns the (width, raw rows) of a PNG written by export."""
+        with open(path, "rb") as f:
+            data = f.read()
+        self.assertEqual(data[:8], b"\x89PNG\r\n\x1a\n")
+        width, height = struct.unpack(">II", data[16:24])
+        idat_len = struct.unpack(">I", data[33:37])[0]
+        self.assertEqual(data[37:41], b"IDAT")
+        return width, zlib.decompress(data[41:41 + idat_len])
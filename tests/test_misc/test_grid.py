@@ -0,0 +1,239 @@
+import unittest
+from ed_utils.decorators import number
+
+import random
+import time
+from layers import blue, green, red, lighten, rainbow
+from grid import Grid
+from renderer import GridRenderer
+
+class TestGrid(unittest.TestCase):
+
+    @number("10.1")
+    def test_sparse_allocation(self):
+        grid = Grid(Grid.DRAW_STYLE_ADD, 100000, 100000)
+        self.assertEqual(grid.allocated_chunks(), 0)
+        grid.on_paint(red, 99999, 5)
+        self.assertEqual(grid.allocated_chunks(), 1)
+        self.assertIsNone(grid.peek(0, 0))
+        self.assertEqual(grid.peek(99999, 5).get_color((0, 0, 0), 0, 99999, 5), (255, 0, 0))
+        self.assertEqual(len(grid[99999]), 100000)
+        with self.assertRaises(IndexError):
+            grid[0][100000]
+
+    @number("10.2")
+    def test_on_paint_brush(self):
+        for brush in range(Grid.MAX_BRUSH + 1):
+            grid = Grid(Grid.DRAW_STYLE_SET, 7, 9)
+            grid.brush_size = brush
+            painted = grid.on_paint(red, 1, 6)
+            expected = [
+                (red, i, j)
+                for i in range(7) for j in range(9)
+                if grid.manhattan_distance(1, 6, i, j) <= brush
+            ]
+            self.assertEqual(painted, expected)
+
+    @number("10.3")
+    def test_special_untouched(self):
+        grid = Grid(Grid.DRAW_STYLE_SET, 200, 200)
+        grid.on_paint(lighten, 10, 10)
+        grid.special()
+        # Squares created after the special still show it.
+        self.assertEqual(grid[150][150].get_color((100, 100, 100), 0, 150, 150), (155, 155, 155))
+        grid[150][150].add(rainbow)
+        frame = GridRenderer().render(grid, (100, 100, 100), 3)
+        self.assertEqual(frame[199, 199], (155, 155, 155))
+        self.assertEqual(frame[10, 10], (115, 115, 115))
+        self.assertEqual(frame[150, 150], grid[150][150].get_color((100, 100, 100), 3, 150, 150))
+
+    @number("10.4")
+    def test_dirty_tracking(self):
+        grid = Grid(Grid.DRAW_STYLE_SET, 100000, 100000)
+        grid.brush_size = 1
+        grid.on_paint(red, 64, 10)
+        grid.peek(64, 10)
+        chunks, everything = grid.take_dirty()
+        self.assertFalse(everything)
+        self.assertEqual(set(chunks), {(0, 0), (1, 0)})
+        cells = {(cx * Grid.CHUNK_SIZE + x, cy * Grid.CHUNK_SIZE + y) for (cx, cy), bitmap in chunks.items() for x, y in bitmap}
+        self.assertEqual(cells, {(63, 10), (64, 9), (64, 10), (64, 11), (65, 10)})
+        self.assertEqual(grid.take_dirty(), ({}, False))
+        grid.special()
+        self.assertTrue(grid.take_dirty()[1])
+
+    @number("10.5")
+    def test_paint_stroke(self):
+        points = [(0, 0), (1, 0), (2, 1), (3, 1), (60, 70), (99, 99)]
+        for size in (0, 2, Grid.MAX_BRUSH):
+            grid = Grid(Grid.DRAW_STYLE_SET, 100, 100)
+            grid.brush_size = size
+            control = set()
+            for px, py in points:
+                control.update((i, j) for _, i, j in grid.on_paint(red, px, py))
+            grid = Grid(Grid.DRAW_STYLE_SET, 100, 100)
+            grid.brush_size = size
+            painted = grid.on_paint_stroke(red, points)
+            self.assertEqual(len(painted), len(control))
+            self.assertEqual({(i, j) for _, i, j in painted}, control)
+            self.assertEqual(painted, sorted(painted, key=lambda step: (step[1], step[2])))
+        self.assertEqual(grid.on_paint_stroke(red, [(-20, -20)]), [])
+
+    @number("10.6")
+    def test_clear(self):
+        grid = Grid(Grid.DRAW_STYLE_ADD, 1000, 1000)
+        grid.brush_size = Grid.MAX_BRUSH
+        for x in range(0, 1000, 50):
+            grid.on_paint(red, x, x)
+        grid.special()
+        snapshot = grid.snapshot()
+        version = grid.version
+        chunks = grid.allocated_chunks()
+
+        grid.clear(Grid.DRAW_STYLE_SEQUENCE)
+        self.assertNotEqual(grid.version, version)
+        self.assertEqual(grid.allocated_chunks(), 0)
+        self.assertEqual(grid.brush_size, Grid.DEFAULT_BRUSH_SIZE)
+        self.assertIsNone(grid.peek(100, 100))
+        self.assertEqual(grid[100][100].get_color((1, 2, 3), 0, 100, 100), (1, 2, 3))
+        self.assertEqual(type(grid[100][100]).__name__, "SequenceLayerStore")
+        self.assertTrue(grid.take_dirty()[1])
+        # Snapshots taken before keep the old canvas.
+        self.assertEqual(snapshot.peek(100, 100).get_color((1, 2, 3), 0, 100, 100), (255, 0, 0))
+
+        self.assertEqual(grid.release_stale(1), chunks - 1)
+        self.assertEqual(grid.release_stale(10 ** 6), 0)
+        self.assertEqual(grid.release_stale(), 0)
+
+        # A rejected style leaves the grid as it was.
+        grid.on_paint(blue, 100, 100)
+        version, brush = grid.version, grid.brush_size
+        with self.assertRaises(ValueError):
+            grid.clear("bogus")
+        self.assertEqual((grid.draw_style, grid.version, grid.brush_size), (Grid.DRAW_STYLE_SEQUENCE, version, brush))
+        self.assertEqual(grid.peek(100, 100).get_color((1, 2, 3), 0, 100, 100), (0, 0, 255))
+        grid.on_paint(red, 500, 500)
+        self.assertEqual(type(grid[500][500]).__name__, "SequenceLayerStore")
+
+    @number("10.7")
+    def test_fill(self):
+        for style in Grid.DRAW_STYLE_OPTIONS:
+            grid = Grid(style, 150, 100)
+            grid.brush_size = 0
+            # A wall across the grid at x = 70, with a gap at y = 99, and a square inside the left part.
+            for y in range(99):
+                grid.on_paint(blue, 70, y)
+            grid.on_paint(blue, 10, 10)
+            x0, y0, region = grid.on_fill(red, 0, 0)
+            filled = {(x0 + i, y0 + j) for j, i in region}
+            self.assertEqual(len(filled), 150 * 100 - 99 - 1)
+            self.assertNotIn((10, 10), filled)
+            self.assertIn((149, 0), filled)
+            self.assertEqual(grid[149][0].get_color((0, 0, 0), 0, 149, 0), (255, 0, 0))
+            self.assertEqual(grid[70][5].get_color((0, 0, 0), 0, 70, 5), (0, 0, 255))
+            # Filled squares share a store until written to.
+            grid[0][0].add(blue)
+            self.assertNotEqual(grid.peek(0, 0).signature(), grid.peek(0, 1).signature())
+            self.assertEqual(grid.store_count, sum(1 for _ in grid.created_stores()))
+
+            # Filling the wall only takes the wall.
+            x0, y0, region = grid.on_fill(lighten, 70, 50)
+            self.assertEqual((x0, y0, region.width, region.height, len(region)), (70, 0, 99, 1, 99))
+
+    @number("10.8")
+    def test_fill_large(self):
+        grid = Grid(Grid.DRAW_STYLE_SEQUENCE, 1000, 1000)
+        start = time.perf_counter()
+        x0, y0, region = grid.on_fill(red, 500, 500)
+        elapsed = time.perf_counter() - start
+        self.assertEqual(len(region), 1000 * 1000)
+        self.assertLess(elapsed, 1)
+        self.assertEqual(grid.peek(999, 999).get_color((0, 0, 0), 0, 999, 999), (255, 0, 0))
+        # Every chunk is marked as changed.
+        dirty, _ = grid.take_dirty()
+        self.assertEqual(sum(len(bitmap) for bitmap in dirty.values()), 1000 * 1000)
+
+        # Filling a painted canvas compares every chunk against many distinct stores.
+        rng = random.Random(8)
+        for _ in range(2000):
+            grid.brush_size = rng.randint(0, 3)
+            grid.on_paint(rng.choice([blue, green]), rng.randrange(1000), rng.randrange(1000))
+        start = time.perf_counter()
+        x0, y0, region = grid.on_fill(blue, 500, 500)
+        elapsed = time.perf_counter() - start
+        self.assertLess(elapsed, 1)
+        self.assertIn((500 - y0, 500 - x0), region)
+        self.assertEqual(grid.peek(500, 500).get_color((0, 0, 0), 0, 500, 500), (0, 0, 255))
+
+    @number("10.9")
+    def test_regions(self):
+        for style in Grid.DRAW_STYLE_OPTIONS:
+            grid = Grid(style, 300, 300)
+            grid.brush_size = 1
+            for x in range(0, 200, 4):
+                for y in range(0, 200, 4):
+                    grid.on_paint(red if (x + y) % 8 else blue, x, y)
+            before = {(x, y): grid[x][y].signature() for x in range(200) for y in range(200)}
+            count = grid.store_count
+
+            start = time.perf_counter()
+            clip = grid.copy_region(0, 0, 200, 200)
+            # Writing to the source after copying leaves the clip as it was.
+            grid[0][0].add(lighten)
+            replaced = grid.paste_region(clip, 100, 100)
+            elapsed = time.perf_counter() - start
+            self.assertLess(elapsed, 0.5)
+            self.assertEqual((replaced.width, replaced.height), (200, 200))
+            for x, y in [(1, 1), (4, 8), (99, 0), (199, 199)]:
+                self.assertEqual(grid.peek(100 + x, 100 + y).signature(), before[x, y])
+            self.assertNotEqual(grid.peek(0, 0).signature(), grid.peek(100, 100).signature())
+            # Pasted squares share the clip's stores until written to.
+            grid[101][101].add(lighten)
+            self.assertEqual(clip.columns[1][1].signature(), before[1, 1])
+            self.assertEqual(grid.store_count, sum(1 for _ in grid.created_stores()))
+
+            # Pasting what was replaced undoes the paste.
+            grid.paste_region(replaced, 100, 100)
+            self.assertEqual(grid.store_count, count)
+            self.assertEqual(grid.peek(150, 150).signature(), before[150, 150])
+            self.assertIsNone(grid.peek(250, 250))
+
+            cleared = grid.clear_region(-10, -10, 50, 60)
+            self.assertEqual((cleared.width, cleared.height), (50, 60))
+            self.assertIsNone(grid.peek(20, 20))
+            self.assertEqual(grid.peek(20, 60).signature(), before[20, 60])
+            self.assertRaises(ValueError, grid.clear_region, 300, 0, 310, 10)
+            self.assertRaises(IndexError, grid.paste_region, clip, -1, 0)
+
+        # Stores of another draw style are converted.
+        source = Grid(Grid.DRAW_STYLE_SET, 10, 10)
+        source.on_paint(blue, 4, 4)
+        grid = Grid(Grid.DRAW_STYLE_SEQUENCE, 10, 10)
+        grid.paste_region(source.copy_region(0, 0, 10, 10), 0, 0)
+        self.assertEqual(grid.peek(4, 4).layers(), [blue])
+        self.assertEqual(type(grid.peek(4, 4)).__name__, "SequenceLayerStore")
+
+        # A clip pastes the canvas as it was copied, blank squares included.
+        for style in Grid.DRAW_STYLE_OPTIONS:
+            grid = Grid(style, 10, 10)
+            grid.brush_size = 0
+            grid.on_paint(red, 0, 0)
+            colors = {(x, y): (grid.peek(x, y) or grid.blank_store).get_color((0, 0, 0), 0, x, y)
+                      for x in range(2) for y in range(2)}
+            clip = grid.copy_region(0, 0, 2, 2)
+            # Unchanged blank squares are pasted as uncreated ones.
+            grid.paste_region(clip, 6, 6)
+            self.assertIsNone(grid.peek(7, 7))
+            grid.special()
+            count = grid.store_count
+            replaced = grid.paste_region(clip, 4, 4)
+            for (x, y), color in colors.items():
+                store = grid.peek(4 + x, 4 + y) or grid.blank_store
+                self.assertEqual(store.get_color((0, 0, 0), 0, 4 + x, 4 + y), color, (style, x, y))
+            # Blank squares are only created when special() changed how blank squares look.
+            changed = grid.blank_store.signature() != clip.blank_store.signature()
+            self.assertEqual(grid.store_count, count + (4 if changed else 1))
+            self.assertEqual(grid.store_count, sum(1 for _ in grid.created_stores()))
+            grid.paste_region(replaced, 4, 4)
+            self.assertIsNone(grid.peek(5, 5))
+            self.assertEqual(grid.store_count, count)
@@ -0,0 +1,185 @@
+import os
+import random
+import tempfile
+import time
+import unittest
+from ed_utils.decorators import number
+
+from controller import PaintController
+from grid import Grid
+from journal import Journal, read_journal
+from layers import black, blue, invert, lighten, red
+
+# Seconds per frame at 60 frames per second; journalling may cost 1% of it per request.
+FRAME = 1 / 60
+
+
+def squares(grid: Grid) -> dict:
+    """Every square that is not blank, with the signature of its store."""
+    blank = grid.blank_store.signature()
+    return {(x, y): store.signature() for x, y, store in grid.created_stores() if store.signature() != blank}
+
+
+def session(controller: PaintController, rng: random.Random, n: int) -> None:
+    """n random requests, of every kind that is journalled."""
+    grid = controller.grid
+    for _ in range(n):
+        op = rng.random()
+        layer = rng.choice([red, blue, lighten, invert, black])
+        x, y = rng.randrange(grid.x), rng.randrange(grid.y)
+        if op < 0.3:
+            grid.brush_size = rng.randint(0, 3)
+            controller.on_paint(layer, x, y)
+        elif op < 0.45:
+            controller.on_paint_stroke(layer, [(x, y), (min(grid.x - 1, x + 3), y), (x, min(grid.y - 1, y + 2))])
+        elif op < 0.5:
+            controller.on_fill(layer, x, y)
+        elif op < 0.55:
+            controller.on_copy(x, y, x + rng.randint(1, 6), y + rng.randint(1, 6))
+        elif op < 0.6:
+            controller.on_paste(x, y)
+        elif op < 0.65:
+            controller.on_clear_region(x - 2, y - 2, x + 2, y + 2)
+        elif op < 0.8:
+            controller.on_undo(rng.randint(1, 3))
+        elif op < 0.9:
+            controller.on_redo(rng.randint(1, 2))
+        elif op < 0.95:
+            controller.on_special()
+        else:
+            controller.on_clear(rng.choice(Grid.DRAW_STYLE_OPTIONS))
+
+
+class TestJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "session.journal")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def assertSameSession(self, recovered: PaintController, original: PaintController):
+        self.assertEqual(recovered.grid.draw_style, original.grid.draw_style)
+        self.assertEqual(squares(recovered.grid), squares(original.grid))
+        self.assertEqual(recovered.undo_tracker.memory_counts(), original.undo_tracker.memory_counts())
+        self.assertEqual(recovered.replay_tracker.memory_counts(), original.replay_tracker.memory_counts())
+        # Both histories play back the same way.
+        for _ in range(5):
+            recovered.on_undo()
+            original.on_undo()
+            self.assertEqual(squares(recovered.grid), squares(original.grid))
+        for controller in (recovered, original):
+            controller.on_clear()
+            controller.on_replay_start()
+            while not controller.on_replay_next_step():
+                pass
+        self.assertEqual(squares(recovered.grid), squares(original.grid))
+
+    @number("19.1")
+    def test_recover(self):
+        self.assertIsNone(PaintController.recover(self.path))
+        rng = random.Random(50)
+        for style in Grid.DRAW_STYLE_OPTIONS:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            original = PaintController(Grid(style, 40, 30), Journal(self.path))
+            session(original, rng, 150)
+            original.journal.close()
+
+            recovered = PaintController.recover(self.path)
+            self.assertIsNone(recovered.journal)
+            self.assertSameSession(recovered, original)
+
+            # Recording carries on after recovery, without a second header.
+            recovered = PaintController.recover(self.path)
+            recovered.attach_journal(Journal(self.path))
+            original = PaintController.recover(self.path)
+            for controller in (recovered, original):
+                session(controller, random.Random(7), 40)
+            recovered.journal.close()
+            self.assertEqual([r["op"] for r in read_journal(self.path)].count("init"), 1)
+            self.assertSameSession(PaintController.recover(self.path), original)
+
+    @number("19.2")
+    def test_torn_record(self):
+        controller = PaintController(Grid(Grid.DRAW_STYLE_SET, 10, 10), Journal(self.path))
+        controller.on_paint(red, 2, 2)
+        controller.on_paint(blue, 7, 7)
+        controller.journal.close()
+        # A crash in the middle of writing the last record.
+        size = os.path.getsize(self.path)
+        os.truncate(self.path, size - 5)
+        recovered = PaintController.recover(self.path)
+        self.assertEqual(recovered.undo_tracker.memory_counts()["actions"], 1)
+        self.assertIn((2, 2), squares(recovered.grid))
+        self.assertNotIn((7, 7), squares(recovered.grid))
+        # The torn line is gone, so new records start on a line of their own.
+        recovered.attach_journal(Journal(self.path))
+        recovered.on_paint(blue, 7, 7)
+        recovered.journal.close()
+        self.assertEqual(squares(PaintController.recover(self.path).grid), squares(recovered.grid))
+
+        with open(self.path, "w") as f:
+            f.write('{"op": "paint"}\n')
+        with self.assertRaises(ValueError):
+            PaintController.recover(self.path)
+
+    @number("19.3")
+    def test_group_commit(self):
+        journal = Journal(self.path, fsync_interval=60)
+        controller = PaintController(Grid(Grid.DRAW_STYLE_ADD, 50, 50), journal)
+        n = 2000
+        start = time.perf_counter()
+        for i in range(n):
+            controller._record("paint", layer="red", x=i % 50, y=i // 50, brush=2)
+        per_record = (time.perf_counter() - start) / n
+        self.assertLess(per_record, FRAME / 100)
+
+        # Records are written in batches as they come, but synced at most once per interval.
+        deadline = time.monotonic() + 10
+        while journal.written < n + 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(journal.written, n + 1)
+        self.assertEqual(journal.syncs, 0)
+        journal.flush()
+        self.assertEqual(journal.syncs, 1)
+        self.assertEqual(len(read_journal(self.path)), n + 1)
+        journal.close()
+        self.assertEqual(journal.syncs, 1)
+
+        journal = Journal(self.path, fsync_interval=0.05)
+        self.assertFalse(journal.is_new)
+        journal.append("special", {})
+        deadline = time.monotonic() + 10
+        while journal.syncs == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(journal.syncs, 1)
+        journal.close()
+
+    @number("19.4")
+    def test_rejected(self):
+        controller = PaintController(Grid(Grid.DRAW_STYLE_SET, 10, 10), Journal(self.path))
+        controller.on_paint(red, 2, 2)
+        controller.on_copy(0, 0, 4, 4)
+        # Requests the grid rejects are not recorded, so recovery does not raise them again.
+        for request, args in ((controller.on_copy, (20, 20, 30, 30)), (controller.on_fill, (red, 10, 3)),
+                              (controller.on_paste, (-1, 3)), (controller.on_clear_region, (20, 20, 30, 30)),
+                              (controller.on_clear, ("bogus",))):
+            with self.assertRaises((ValueError, IndexError)):
+                request(*args)
+        controller.on_paste(5, 5)
+        controller.journal.close()
+        self.assertEqual([r["op"] for r in read_journal(self.path)], ["init", "paint", "copy", "paste"])
+        self.assertEqual(squares(PaintController.recover(self.path).grid), squares(controller.grid))
+
+        # A record that cannot be encoded stops the journal, without leaving flush() waiting.
+        journal = Journal(self.path)
+        journal.append("paint", {"layer": red})
+        with self.assertRaises(TypeError):
+            journal.flush()
+        with self.assertRaises(TypeError):
+            journal.append("special", {})
+        with self.assertRaises(TypeError):
+            journal.close()
+        self.assertEqual(len(read_journal(self.path)), 4)
@@ -0,0 +1,80 @@
+import unittest
+from ed_utils.decorators import number
+
+from controller import PaintController
+from grid import Grid
+from layers import red, blue
+from memory import MemoryMonitor, GRID, UNDO, REPLAY, LAYERS, OTHER
+
+class TestMemory(unittest.TestCase):
+
+    @number("17.1")
+    def test_grid_counts(self):
+        grid = Grid(Grid.DRAW_STYLE_ADD, 300, 300)
+        for x in range(0, 300, 7):
+            grid.on_paint(red, x, 299 - x)
+        counts = grid.memory_counts()
+        self.assertEqual(counts["stores"], sum(1 for _ in grid.created_stores()))
+        self.assertEqual(counts["chunks"], grid.allocated_chunks())
+
+        stores, chunks = counts["stores"], counts["chunks"]
+        grid.clear()
+        grid.on_paint(blue, 0, 0)
+        counts = grid.memory_counts()
+        self.assertEqual((counts["stores"], counts["chunks"]), (6, 1))
+        self.assertEqual((counts["stale_stores"], counts["stale_chunks"]), (stores, chunks))
+        grid.release_stale(10 ** 6)
+        counts = grid.memory_counts()
+        self.assertEqual((counts["stale_stores"], counts["stale_chunks"]), (0, 0))
+
+    @number("17.2")
+    def test_undo_counts(self):
+        controller = PaintController(Grid(Grid.DRAW_STYLE_SET, 20, 20))
+        monitor = MemoryMonitor(controller)
+        empty = monitor.usage()
+        controller.on_paint(red, 5, 5)      # 13 squares
+        controller.on_paint(blue, 10, 10)   # 13 squares
+        controller.on_special()
+        controller.on_undo(2)
+        counts = controller.undo_tracker.memory_counts()
+        self.assertEqual((counts["actions"], counts["undone_actions"]), (1, 2))
+        self.assertEqual((counts["steps"], counts["undone_steps"]), (13, 13))
+        controller.on_redo()
+        self.assertEqual(controller.undo_tracker.memory_counts()["steps"], 26)
+        controller.on_paint(red, 0, 0)      # 6 squares, clears the redo stack
+        counts = controller.undo_tracker.memory_counts()
+        self.assertEqual((counts["steps"], counts["undone_steps"]), (32, 0))
+
+        usage = monitor.usage()
+        self.assertEqual(usage[UNDO]["objects"], {"actions": 3, "steps": 32})
+        self.assertEqual(usage[REPLAY]["objects"], {"entries": 6})
+        self.assertEqual(usage[GRID]["objects"]["SetLayerStore"], 32)
+        for name in (GRID, UNDO, REPLAY):
+            self.assertGreater(usage[name]["bytes"], empty[name]["bytes"])
+        self.assertGreater(usage[LAYERS]["objects"]["layers"], 0)
+        self.assertEqual(monitor.total(), sum(part["bytes"] for part in usage.values()))
+
+    @number("17.3")
+    def test_audit(self):
+        monitor = MemoryMonitor(PaintController(Grid(Grid.DRAW_STYLE_SEQUENCE, 100, 100)))
+        with self.assertRaises(RuntimeError):
+            monitor.audit()
+        monitor.start_audit()
+        try:
+            before = monitor.audit()
+            grid = monitor.controller.grid
+            grid.brush_size = Grid.MAX_BRUSH
+            for x in range(0, 100, 5):
+                monitor.controller.on_paint(red, x, x)
+            after = monitor.audit()
+            self.assertEqual(set(after), {GRID, UNDO, REPLAY, LAYERS, OTHER})
+            self.assertGreater(after[GRID], before[GRID])
+            self.assertGreater(after[UNDO], before[UNDO])
+            # The estimate is of the same order as what was measured.
+            estimate = monitor.usage()[GRID]["bytes"]
+            self.assertLess(estimate / 2, after[GRID] - before[GRID])
+            self.assertLess(after[GRID] - before[GRID], estimate * 2)
+            self.assertTrue(any("audited grid" in line for line in monitor.summary(after)))
+        finally:
+            monitor.stop_audit()
+        self.assertFalse(monitor.auditing)
@@ -0,0 +1,91 @@
+import random
+import unittest
+from ed_utils.decorators import number
+
+from grid import Grid
+from layer_util import pack
+from layers import black, blue, invert, lighten, rainbow, red
+from mipmap import Mipmap
+
+BG = (255, 255, 255)
+
+
+def averaged(grid: Grid, level: int, timestamp: float) -> dict:
+    """Every block of the level, averaged square by square; squares beyond the canvas are blank."""
+    size = 1 << level
+    blank = grid.blank_store.get_color(BG, timestamp, 0, 0)
+    blocks = {}
+    for bx in range(-(-grid.x // size)):
+        for by in range(-(-grid.y // size)):
+            total = [0, 0, 0]
+            for x in range(bx * size, bx * size + size):
+                for y in range(by * size, by * size + size):
+                    store = grid.peek(x, y) if x < grid.x and y < grid.y else None
+                    color = store.get_color(BG, timestamp, x, y) if store else blank
+                    for c in range(3):
+                        total[c] += color[c]
+            blocks[bx, by] = tuple(t // (size * size) for t in total)
+    return blocks
+
+
+class TestMipmap(unittest.TestCase):
+
+    def assertMatches(self, mipmap: Mipmap, grid: Grid, timestamp: float = 1):
+        for level in range(1, mipmap.levels + 1):
+            frame = mipmap.render(level)
+            self.assertEqual(frame.scale, 1 << level)
+            for block, color in averaged(grid, level, timestamp).items():
+                self.assertEqual(frame[block], color, (level, block))
+
+    @number("18.1")
+    def test_levels(self):
+        rng = random.Random(45)
+        for style in Grid.DRAW_STYLE_OPTIONS:
+            grid = Grid(style, 150, 100)
+            grid.on_paint(red, 5, 5)
+            # Chunks painted before the mipmap exists are rebuilt by its updates.
+            mipmap = Mipmap(grid)
+            self.assertEqual(mipmap.levels, 8)
+            for round in range(3):
+                for _ in range(20):
+                    grid.brush_size = rng.randint(0, Grid.MAX_BRUSH)
+                    layer = rng.choice([red, blue, lighten, invert, black])
+                    grid.on_paint(layer, rng.randrange(150), rng.randrange(100))
+                if round == 1:
+                    grid.special()
+                for _ in range(3):
+                    mipmap.update(BG, 1)
+                self.assertMatches(mipmap, grid)
+            grid.clear()
+            mipmap.update(BG, 1)
+            self.assertEqual(set(mipmap.render(mipmap.levels).colors), {pack(BG)})
+
+    @number("18.2")
+    def test_incremental(self):
+        grid = Grid(Grid.DRAW_STYLE_SET, 1000, 1000)
+        mipmap = Mipmap(grid)
+        self.assertEqual(mipmap.levels, 10)
+        for x in range(0, 1000, 50):
+            grid.on_paint(blue, x, x)
+        mipmap.update(BG, 0)
+        grid.brush_size = 0
+        grid.on_paint(red, 500, 500)
+        mipmap.update(BG, 0)
+        # One square changed: its 2 x 2 block is evaluated, once per static stack.
+        self.assertLessEqual(mipmap.evaluations, 3)
+        # One red square among three blue ones.
+        self.assertEqual(mipmap.render(1, (500, 500, 502, 502))[250, 250], (63, 0, 191))
+        # Frames hold one colour per block, so their size follows the level, not the canvas.
+        self.assertEqual(len(mipmap.render(mipmap.level_for_zoom(1 / 1000)).colors), 1)
+        self.assertEqual(len(mipmap.render(mipmap.level_for_zoom(900 / 1000)).colors), 500 * 500)
+        self.assertEqual(mipmap.level_for_zoom(1), 0)
+
+    @number("18.3")
+    def test_animated(self):
+        grid = Grid(Grid.DRAW_STYLE_ADD, 64, 64)
+        grid.on_paint(rainbow, 10, 10)
+        mipmap = Mipmap(grid)
+        mipmap.update(BG, 0)
+        # The chunk holding an animated square is re-evaluated on later updates.
+        mipmap.update(BG, 7)
+        self.assertMatches(mipmap, grid, 7)
@@ -0,0 +1,249 @@
+import unittest
+from ed_utils.decorators import number
+
+from layers import black, lighten, rainbow, invert, red
+from grid import Grid
+from renderer import GridRenderer
+
+class TestRenderer(unittest.TestCase):
+
+    @number("7.1")
+    def test_matches_stores(self):
+        for style in Grid.DRAW_STYLE_OPTIONS:
+            grid = Grid(style, 6, 5)
+            grid.on_paint(red, 1, 1)
+            grid.on_paint(rainbow, 4, 3)
+            grid.on_paint(lighten, 2, 2)
+            grid[0][4].add(invert)
+            grid.special()
+            frame = GridRenderer().render(grid, (100, 100, 100), 7)
+            for x in range(6):
+                for y in range(5):
+                    self.assertEqual(
+                        frame[x, y],
+                        grid[x][y].get_color((100, 100, 100), 7, x, y),
+                        f"Wrong colour at ({x}, {y}) for {style}",
+                    )
+
+    @number("7.2")
+    def test_static_stacks_shared(self):
+        grid = Grid(Grid.DRAW_STYLE_ADD, 10, 10)
+        for x in range(10):
+            for y in range(10):
+                grid[x][y].add(black)
+                grid[x][y].add(lighten)
+        renderer = GridRenderer()
+        frame = renderer.render(grid, (255, 255, 255), 0)
+        self.assertEqual(renderer.evaluations, 1)
+        self.assertEqual(frame[3, 7], (40, 40, 40))
+
+        # Animated layers are evaluated for every square they cover.
+        grid[5][5].add(rainbow)
+        grid[5][6].add(rainbow)
+        frame = renderer.render(grid, (255, 255, 255), 3)
+        self.assertEqual(renderer.evaluations, 3)
+        self.assertEqual(frame[5, 6], grid[5][6].get_color((255, 255, 255), 3, 5, 6))
+
+    @number("7.3")
+    def test_region(self):
+        grid = Grid(Grid.DRAW_STYLE_SEQUENCE, 8, 8)
+        grid.on_paint(rainbow, 4, 4)
+        frame = GridRenderer().render(grid, (0, 0, 0), 2, (2, 3, 6, 5))
+        self.assertEqual(len(frame.colors), 8)
+        self.assertEqual(frame[4, 4], grid[4][4].get_color((0, 0, 0), 2, 4, 4))
+        self.assertEqual(frame[2, 3], (0, 0, 0))
+
+    @number("7.4")
+    def test_workers(self):
+        grid = Grid(Grid.DRAW_STYLE_ADD, 300, 200)
+        grid.brush_size = Grid.MAX_BRUSH
+        for x, y in [(10, 10), (63, 64), (150, 100), (299, 199), (200, 30)]:
+            grid.on_paint(rainbow, x, y)
+            grid.on_paint(black, x + 2, y)
+            grid.on_paint(lighten, x, y + 1)
+        single = GridRenderer(1)
+        expected = single.render(grid, (20, 30, 40), 5)
+        threaded = GridRenderer(4)
+        try:
+            for region in [None, (5, 5, 290, 190), (64, 64, 128, 128)]:
+                frame = threaded.render(grid, (20, 30, 40), 5, region)
+                check = single.render(grid, (20, 30, 40), 5, region)
+                self.assertEqual(frame.colors, check.colors)
+        finally:
+            threaded.close()
+        self.assertEqual(len(expected.colors), 300 * 200)
+
+    @number("7.5")
+    def test_snapshot(self):
+        grid = Grid(Grid.DRAW_STYLE_ADD, 100, 100)
+        grid.on_paint(red, 5, 5)
+        grid.on_paint(black, 80, 80)
+        snapshot = grid.snapshot()
+        before = GridRenderer().render(snapshot, (255, 255, 255), 0)
+        # Changes after the snapshot, including to shared squares and untouched chunks.
+        grid.on_paint(lighten, 5, 5)
+        grid[80][80].add(invert)
+        grid.on_paint(red, 40, 40)
+        after = GridRenderer().render(snapshot, (255, 255, 255), 0)
+        self.assertEqual(before.colors, after.colors)
+        self.assertEqual(after[5, 5], (255, 0, 0))
+        self.assertEqual(after[40, 40], (255, 255, 255))
+        self.assertEqual(grid[5][5].get_color((255, 255, 255), 0, 5, 5), (255, 40, 40))
+        self.assertEqual(grid[80][80].get_color((255, 255, 255), 0, 80, 80), (255, 255, 255))
+
+        # Special touches every square, and the untouched ones through the blank store.
+        grid = Grid(Grid.DRAW_STYLE_SET, 100, 100)
+        grid.on_paint(red, 5, 5)
+        snapshot = grid.snapshot()
+        grid.special()
+        after = GridRenderer().render(snapshot, (255, 255, 255), 0)
+        self.assertEqual(after[5, 5], (255, 0, 0))
+        self.assertEqual(after[90, 90], (255, 255, 255))
+        self.assertEqual(grid[90][90].get_color((255, 255, 255), 0, 90, 90), (0, 0, 0))
+
+    @number("7.6")
+    def test_render_thread(self):
+        from renderer import RenderThread
+        import time
+        grid = Grid(Grid.DRAW_STYLE_SET, 50, 50)
+        grid.on_paint(red, 10, 10)
+        thread = RenderThread(GridRenderer())
+        try:
+            thread.submit(grid.snapshot(), (0, 0, 0), 0)
+            # Painting carries on while the frame is rendered.
+            grid.on_paint(black, 10, 10)
+            deadline = time.time() + 5
+            while thread.busy and time.time() < deadline:
+                time.sleep(0.001)
+            self.assertEqual(thread.front[10, 10], (255, 0, 0))
+        finally:
+            thread.stop()
+
+    @number("7.7")
+    def test_animation_timing(self):
+        from fractions import Fraction
+        from renderer import animation_timing
+        from layers import sparkle
+        self.assertEqual(animation_timing([]), (1, 1))
+        self.assertEqual(animation_timing([rainbow]), (Fraction(1, 20), 20))
+        self.assertEqual(animation_timing([rainbow, sparkle]), (Fraction(1, 60), 340))
+        # The declared period and step hold for every square.
+        for x, y in [(0, 0), (3, 7), (31, 12)]:
+            for t in [0, 0.4, 2.75]:
+                self.assertEqual(
+                    sparkle.apply((9, 9, 9), t, x, y),
+                    sparkle.apply((9, 9, 9), t + float(Fraction(17, 3)), x, y),
+                )
+                self.assertEqual(rainbow.apply((9, 9, 9), t, x, y), rainbow.apply((9, 9, 9), t + 20, x, y))
+
+    @number("7.8")
+    def test_frame_cache(self):
+        from renderer import FrameCache
+        grid = Grid(Grid.DRAW_STYLE_ADD, 20, 20)
+        grid.on_paint(black, 3, 3)
+        cache = FrameCache(GridRenderer())
+        frame = cache.render(grid, (255, 255, 255), 0)
+        # Without animated layers the frame never changes.
+        self.assertIs(cache.render(grid, (255, 255, 255), 123.4), frame)
+        self.assertEqual(cache.evaluations, 0)
+        # Any change to the grid is a new frame. Squares are read with peek,
+        # as grid[x][y] gives write access and so counts as a change.
+        grid.on_paint(rainbow, 10, 10)
+        frame = cache.render(grid, (255, 255, 255), 1)
+        self.assertEqual(frame[10, 10], grid.peek(10, 10).get_color((255, 255, 255), 1, 10, 10))
+        # Once a whole period has been shown, no more squares are evaluated.
+        for i in range(400):
+            cache.render(grid, (255, 255, 255), i / 20 + 0.01)
+        misses = cache.misses
+        for i in range(800):
+            frame = cache.render(grid, (255, 255, 255), 40 + i / 20 + 0.02)
+            self.assertEqual(frame[10, 10], grid.peek(10, 10).get_color((255, 255, 255), i % 400 / 20, 10, 10))
+        self.assertEqual(cache.misses, misses)
+        # A new grid never reuses the frames of another.
+        other = Grid(Grid.DRAW_STYLE_ADD, 20, 20)
+        self.assertEqual(cache.render(other, (255, 255, 255), 1)[3, 3], (255, 255, 255))
+
+    @number("7.9")
+    def test_frame_cache_bounded(self):
+        from renderer import FrameCache
+        grid = Grid(Grid.DRAW_STYLE_SET, 10, 10)
+        grid.on_paint(rainbow, 5, 5)
+        cache = FrameCache(GridRenderer(), max_cells=1000)
+        for i in range(100):
+            cache.render(grid, (0, 0, 0), i / 20)
+        self.assertEqual(len(cache._frames), 10)
+        self.assertEqual(cache._cells, 1000)
+
+    @number("7.10")
+    def test_interleaved_render(self):
+        from layers import sparkle
+        grid = Grid(Grid.DRAW_STYLE_ADD, 12, 12)
+        grid.brush_size = Grid.MAX_BRUSH
+        grid.on_paint(sparkle, 3, 3)
+        grid.on_paint(red, 9, 9)
+        bg = (255, 255, 255)
+        renderer = GridRenderer()
+        first = renderer.render(grid, bg, 0, interleave=(0, 1))
+        full = renderer.evaluations
+        grid[0][11].add(sparkle)
+        second = renderer.render(grid, bg, 1, previous=first, interleave=(1, 4))
+        self.assertLess(renderer.evaluations, full)
+        for x in range(12):
+            for y in range(12):
+                store = grid.peek(x, y) or grid.blank_store
+                now = store.get_color(bg, 1, x, y)
+                if store.is_static() or (x + 2 * y) % 4 == 1 or (x, y) == (0, 11):
+                    # Static, in this frame's subset, or newly painted: evaluated.
+                    self.assertEqual(second[x, y], now)
+                else:
+                    self.assertEqual(second[x, y], first[x, y])
+        # A frame of another region carries nothing over.
+        third = renderer.render(grid, bg, 2, (0, 0, 6, 6), previous=second, interleave=(2, 4))
+        self.assertEqual(third[2, 2], grid.peek(2, 2).get_color(bg, 2, 2, 2))
+
+    @number("7.11")
+    def test_frame_budget(self):
+        from renderer import FrameBudget, FrameCache
+        budget = FrameBudget(0.01)
+        self.assertEqual(budget.next_interleave()[1], 1)
+        for _ in range(200):
+            budget.record(None, 0.05)
+        self.assertEqual(budget.interleave, 8)
+        self.assertEqual({budget.next_interleave()[0] for _ in range(8)}, set(range(8)))
+        for _ in range(200):
+            budget.record(None, 0.001)
+        self.assertEqual(budget.interleave, 1)
+
+        # Interleaved frames that carried colours over are not cached.
+        from layers import sparkle
+        grid = Grid(Grid.DRAW_STYLE_SET, 10, 10)
+        grid.on_paint(sparkle, 5, 5)
+        cache = FrameCache(GridRenderer())
+        first = cache.render(grid, (0, 0, 0), 0, interleave=(0, 1))
+        cache.render(grid, (0, 0, 0), 1, previous=first, interleave=(1, 2))
+        self.assertEqual(len(cache._frames), 1)
+
+    @number("7.12")
+    def test_packed_colors(self):
+        from layer_util import get_layers, pack
+        layers = [layer for layer in get_layers() if layer is not None]
+        for layer in layers:
+            for color in [(0, 0, 0), (255, 255, 255), (12, 200, 99)]:
+                for timestamp, x, y in [(0, 0, 0), (3.7, 5, 9), (41, 120, 7)]:
+                    self.assertEqual(
+                        layer.apply_packed(pack(color), timestamp, x, y),
+                        pack(layer.apply(color, timestamp, x, y)),
+                        layer.name,
+                    )
+        for style in Grid.DRAW_STYLE_OPTIONS:
+            grid = Grid(style, 4, 4)
+            for i, layer in enumerate(layers):
+                grid.brush_size = i % 3
+                grid.on_paint(layer, i % 4, i // 4 % 4)
+            grid.special()
+            frame = GridRenderer().render(grid, (30, 60, 90), 5)
+            for x in range(4):
+                for y in range(4):
+                    store = grid[x][y]
+                    self.assertEqual(store.get_color_packed(pack((30, 60, 90)), 5, x, y), pack(frame[x, y]))
+                    self.assertEqual(frame[x, y], store.get_color((30, 60, 90), 5, x, y))
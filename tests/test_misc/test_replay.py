@@ -115,6 +115,47 @@ class TestReplay(unittest.TestCase):
         self.assertGridEqual(grid, control_grid)
         self.assertEqual(replay.play_next_action(grid), True) # Finished.
 
+    @number("5.4")
+    def test_player(self):
+        from replay import ReplayPlayer
+        grid = Grid(Grid.DRAW_STYLE_ADD, 10, 10)
+        replay = ReplayTracker()
+        for x in range(10):
+            replay.add_action(PaintAction([PaintStep((x, x), green)]))
+        replay.start_replay()
+        # A clock that moves on by a millisecond each time it is read.
+        ticks = iter(range(10 ** 6))
+        player = ReplayPlayer(lambda: replay.play_next_action(grid), interval=0.05, budget=0.0035,
+                              clock=lambda: next(ticks) / 1000)
+
+        # At speed 1, one action per interval; at a quarter speed, one per four.
+        self.assertEqual(player.advance(0.05), 1)
+        player.speed = 0.25
+        self.assertEqual([player.advance(0.05) for _ in range(4)], [0, 0, 0, 1])
+        # Fast replays stop at the budget, and do not carry the rest over.
+        player.speed = 1000
+        self.assertEqual(player.advance(0.05), 4)
+        player.toggle_pause()
+        self.assertEqual(player.advance(10), 0)
+        player.toggle_pause()
+        player.speed = 1
+        self.assertEqual(player.advance(0.05), 1)
+        self.assertEqual(player.advance(100), 3)
+        self.assertTrue(player.finished)
+        self.assertEqual(player.played, 10)
+        self.assertEqual(player.advance(1), 0)
+        self.assertEqual(grid[9][9].get_color((0, 0, 0), 0, 9, 9), green.apply((0, 0, 0), 0, 9, 9))
+
+        self.assertRaises(ValueError, setattr, player, "speed", 2000)
+        player.speed = 300
+        player.faster()
+        player.faster()
+        self.assertEqual(player.speed, ReplayPlayer.MAX_SPEED)
+        player.speed = 0.5
+        player.slower()
+        player.slower()
+        self.assertEqual(player.speed, ReplayPlayer.MIN_SPEED)
+
     # def assertGridEqual(self, grid1: Grid, grid2: Grid):
     #     for x in range(len(grid1.grid)):
     #         for y in range(len(grid1[x])):
@@ -0,0 +1,126 @@
+import asyncio
+import json
+import unittest
+from ed_utils.decorators import number
+
+from grid import Grid
+from layers import red, blue
+from server import CanvasServer
+
+async def read(reader):
+    return json.loads(await asyncio.wait_for(reader.readline(), 5))
+
+def cells(message):
+    return {(xy[i], xy[i + 1]): tuple(sig) for sig, xy in message["cells"] for i in range(0, len(xy), 2)}
+
+class TestServer(unittest.TestCase):
+
+    @number("15.1")
+    def test_deltas(self):
+        async def run():
+            server = CanvasServer(Grid.DRAW_STYLE_SET, 20, 20, tick=0.01)
+            await server.start()
+            try:
+                a_reader, a_writer = await asyncio.open_connection("127.0.0.1", server.port)
+                b_reader, b_writer = await asyncio.open_connection("127.0.0.1", server.port)
+                for reader in (a_reader, b_reader):
+                    init = await read(reader)
+                    self.assertEqual((init["type"], init["width"], init["draw_style"]), ("init", 20, "SET"))
+                    state = await read(reader)
+                    self.assertEqual((state["type"], state["cells"]), ("state", []))
+
+                a_writer.write(b'{"op": "paint", "layer": "red", "x": 5, "y": 5, "brush": 1}\n')
+                a_writer.write(b'{"op": "paint", "layer": "blue", "x": 5, "y": 6, "brush": 0}\n')
+                a_writer.write(b'{"op": "fly"}\n')
+                await a_writer.drain()
+                error = await read(a_reader)
+                self.assertEqual(error["type"], "error")
+                delta = await read(b_reader)
+                self.assertEqual(delta["type"], "delta")
+                self.assertEqual(cells(delta), {
+                    (5, 5): (red.index, False), (4, 5): (red.index, False), (6, 5): (red.index, False),
+                    (5, 4): (red.index, False), (5, 6): (blue.index, False),
+                })
+                self.assertEqual(delta, await read(a_reader))
+
+                # A client joining later gets the whole canvas; special resends it to everyone.
+                c_reader, c_writer = await asyncio.open_connection("127.0.0.1", server.port)
+                await read(c_reader)
+                self.assertEqual(len(cells(await read(c_reader))), 5)
+                b_writer.write(b'{"op": "special"}\n{"op": "undo"}\n{"op": "undo"}\n')
+                await b_writer.drain()
+                state = await read(c_reader)
+                self.assertEqual(state["type"], "state")
+                # The second undo erases the blue square, which in SET mode leaves it blank.
+                self.assertEqual(cells(state), {(x, y): (red.index, False) for x, y in [(5, 5), (4, 5), (6, 5), (5, 4)]})
+                self.assertEqual(server.grid.peek(5, 6).get_color((0, 0, 0), 0, 5, 6), (0, 0, 0))
+                for writer in (a_writer, b_writer, c_writer):
+                    writer.close()
+            finally:
+                await server.stop()
+        asyncio.run(run())
+
+    @number("15.2")
+    def test_many_clients_batched(self):
+        async def run():
+            server = CanvasServer(Grid.DRAW_STYLE_ADD, 64, 64, tick=0.05)
+            await server.start()
+            try:
+                clients = [await asyncio.open_connection("127.0.0.1", server.port) for _ in range(200)]
+                for reader, _ in clients:
+                    await read(reader)
+                    await read(reader)
+                ticks = server.ticks
+                for i, (_, writer) in enumerate(clients):
+                    writer.write(json.dumps({"op": "paint", "layer": "red", "x": i % 64, "y": i // 64, "brush": 0}).encode() + b"\n")
+                    await writer.drain()
+                painted = {}
+                for reader, _ in clients[:3]:
+                    painted = {}
+                    while len(painted) < 200:
+                        painted.update(cells(await read(reader)))
+                self.assertEqual(len(server.controller.undo_tracker.stack), 200)
+                self.assertLess(server.ticks - ticks, 20)
+                for _, writer in clients:
+                    writer.close()
+            finally:
+                await server.stop()
+        asyncio.run(run())
+
+    @number("15.3")
+    def test_fill(self):
+        server = CanvasServer(Grid.DRAW_STYLE_SET, 100, 100)
+        server.grid.brush_size = 0
+        for y in range(100):
+            server.controller.on_paint(blue, 50, y)
+        server.grid.take_dirty()
+        command = {"op": "fill", "layer": "red", "x": 70, "y": 3}
+        server._check(command)
+        self.assertRaises(ValueError, server._check, dict(command, x=100))
+        server.apply(command)
+        delta = cells(server._delta(server.grid.take_dirty()[0]))
+        self.assertEqual({xy for xy, sig in delta.items() if sig == (red.index, False)},
+                         {(x, y) for x in range(51, 100) for y in range(100)})
+
+    @number("15.4")
+    def test_line_too_long(self):
+        async def run():
+            server = CanvasServer(Grid.DRAW_STYLE_SET, 8, 8, tick=0.01)
+            await server.start()
+            try:
+                reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+                await read(reader)
+                await read(reader)
+                writer.write(b'{"op": "paint", "layer": "' + b"x" * (1 << 17) + b'"}\n')
+                await writer.drain()
+                error = await read(reader)
+                self.assertEqual((error["type"], error["message"]), ("error", "Command too long"))
+                # The rest of the line is skipped, and the next command is applied.
+                writer.write(b'{"op": "paint", "layer": "red", "x": 1, "y": 1, "brush": 0}\n')
+                await writer.drain()
+                delta = await read(reader)
+                self.assertEqual((delta["type"], cells(delta)), ("delta", {(1, 1): (red.index, False)}))
+                writer.close()
+            finally:
+                await server.stop()
+        asyncio.run(run())
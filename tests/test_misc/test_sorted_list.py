@@ -0,0 +1,58 @@
+import random
+import unittest
+from ed_utils.decorators import number
+
+from data_structures.array_sorted_list import ArraySortedList
+from data_structures.sorted_list_adt import ListItem
+
+class TestSortedList(unittest.TestCase):
+
+    @number("12.1")
+    def test_equal_keys(self):
+        sl = ArraySortedList(1)
+        items = [ListItem(name, key) for name, key in [("a", 2), ("b", 1), ("c", 2), ("d", 3), ("e", 2)]]
+        for item in items:
+            sl.add(item)
+        self.assertEqual([sl[i].value for i in range(len(sl))], ["b", "a", "c", "e", "d"])
+        for item in items:
+            self.assertIn(ListItem(item.value, item.key), sl)
+        self.assertNotIn(ListItem("f", 2), sl)
+        self.assertNotIn(ListItem("a", 1), sl)
+        self.assertEqual(sl.index(ListItem("e", 2)), 3)
+        sl.remove(ListItem("c", 2))
+        self.assertEqual([sl[i].value for i in range(len(sl))], ["b", "a", "e", "d"])
+        self.assertRaises(ValueError, sl.index, ListItem("c", 2))
+
+    @number("12.2")
+    def test_matches_sorted(self):
+        rng = random.Random(35)
+        sl = ArraySortedList(1)
+        expected = []
+        for step in range(2000):
+            if expected and rng.random() < 0.4:
+                value, key = expected.pop(rng.randrange(len(expected)))
+                sl.remove(ListItem(value, key))
+            else:
+                value, key = step, rng.randrange(50)
+                sl.add(ListItem(value, key))
+                expected.append((value, key))
+            self.assertEqual(len(sl), len(expected))
+        expected.sort(key=lambda pair: pair[1])
+        self.assertEqual([(sl[i].value, sl[i].key) for i in range(len(sl))], expected)
+        # Removed items do not linger past the end of the list.
+        self.assertTrue(all(sl.array[i] is None for i in range(len(sl), len(sl.array))))
+
+    @number("12.3")
+    def test_add_many(self):
+        sl = ArraySortedList(2)
+        for key in [5, 1, 9]:
+            sl.add(ListItem(f"old{key}", key))
+        sl.add_many([ListItem("new9", 9), ListItem("new0", 0), ListItem("new5", 5), ListItem("new7", 7)])
+        self.assertEqual(
+            [sl[i].value for i in range(len(sl))],
+            ["new0", "old1", "old5", "new5", "new7", "old9", "new9"],
+        )
+        sl.add_many([])
+        self.assertEqual(len(sl), 7)
+        sl.add(ListItem("new6", 6))
+        self.assertEqual(sl.index(ListItem("new6", 6)), 4)
@@ -0,0 +1,70 @@
+import json
+import os
+import tempfile
+import unittest
+from ed_utils.decorators import number
+
+from layers import black, rainbow, sparkle
+from layer_store import SequenceLayerStore
+from grid import Grid
+from renderer import GridRenderer
+from telemetry import FrameTelemetry
+
+class TestTelemetry(unittest.TestCase):
+
+    @number("8.1")
+    def test_counts(self):
+        grid = Grid(Grid.DRAW_STYLE_SET, 4, 4)
+        grid[0][0].add(black)
+        grid[1][0].add(black)
+        grid[2][0].add(rainbow)
+        telemetry = FrameTelemetry()
+        renderer = GridRenderer()
+        telemetry.enable()
+        try:
+            with telemetry.phase(FrameTelemetry.GRID_EVAL):
+                renderer.render(grid, (255, 255, 255), 0)
+                telemetry.count_get_color(grid.draw_style, renderer.evaluations)
+            telemetry.end_frame()
+        finally:
+            telemetry.disable()
+        # Black is shared, rainbow is evaluated once, and empty squares share one evaluation.
+        self.assertEqual(telemetry.last["apply"], {"black": 1, "rainbow": 1})
+        self.assertEqual(telemetry.last["get_color"], {Grid.DRAW_STYLE_SET: 3})
+        self.assertGreater(telemetry.last["phases_ms"][FrameTelemetry.GRID_EVAL], 0)
+        # Layers are restored once disabled.
+        self.assertEqual(black.apply.__name__, "black")
+        self.assertNotIn("counted", black.apply.__qualname__)
+
+    @number("8.2")
+    def test_export(self):
+        telemetry = FrameTelemetry()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "frames.jsonl")
+            telemetry.enable()
+            telemetry.start_export(path)
+            for _ in range(3):
+                with telemetry.phase(FrameTelemetry.PAINT):
+                    pass
+                telemetry.end_frame()
+            telemetry.disable()
+            with open(path) as f:
+                records = [json.loads(line) for line in f]
+        self.assertEqual([r["frame"] for r in records], [1, 2, 3])
+        self.assertEqual(set(records[0]["phases_ms"]), set(FrameTelemetry.PHASES))
+
+    @number("8.3")
+    def test_nested_layers(self):
+        store = SequenceLayerStore()
+        store.add(sparkle)
+        telemetry = FrameTelemetry()
+        telemetry.enable()
+        try:
+            # Sparkle applies lighten or darken itself: only sparkle is counted.
+            for t in range(20):
+                store.get_color((100, 100, 100), t / 10, t, 2 * t)
+            sparkle.apply_packed(0x646464, 0, 1, 1)
+            telemetry.end_frame()
+        finally:
+            telemetry.disable()
+        self.assertEqual(telemetry.last["apply"], {"sparkle": 21})
@@ -0,0 +1,52 @@
+import unittest
+from ed_utils.decorators import number
+
+from data_structures.typed_array import ArrayT
+from data_structures.stack_adt import ArrayStack
+from data_structures.queue_adt import CircularQueue
+from data_structures.array_sorted_list import ArraySortedList
+
+class TestTypedArray(unittest.TestCase):
+
+    @number("13.1")
+    def test_array(self):
+        a = ArrayT(5, 'B')
+        self.assertEqual(len(a), 5)
+        self.assertEqual(list(a[:]), [0] * 5)
+        a[1] = 200
+        a[2:4] = [7, 8]
+        self.assertEqual(list(a[:]), [0, 200, 7, 8, 0])
+        self.assertRaises(OverflowError, a.__setitem__, 0, 256)
+        self.assertRaises(ValueError, a.__setitem__, slice(0, 2), [1])
+        self.assertRaises(ValueError, ArrayT, 0)
+        # The contents are shared, not copied.
+        view = a.memoryview()
+        self.assertEqual(view.nbytes, 5)
+        view[0] = 9
+        self.assertEqual(a[0], 9)
+        self.assertEqual(bytes(a.array), bytes([9, 200, 7, 8, 0]))
+
+    @number("13.2")
+    def test_typed_containers(self):
+        stack = ArrayStack(3, 'i')
+        for i in [4, -5, 6]:
+            stack.push(i)
+        self.assertTrue(stack.is_full())
+        self.assertEqual([stack.pop(), stack.pop(), stack.pop()], [6, -5, 4])
+
+        queue = CircularQueue(2, 'H')
+        for i in range(10):
+            queue.append(i)
+            self.assertEqual(queue.serve(), i)
+
+        sl = ArraySortedList(1, 'h')
+        for i in [5, -3, 5, 9, 0]:
+            sl.add(i)
+        sl.add_many([4, -7])
+        self.assertEqual([sl[i] for i in range(len(sl))], [-7, -3, 0, 4, 5, 5, 9])
+        self.assertIn(9, sl)
+        self.assertNotIn(1, sl)
+        sl.remove(5)
+        sl.delete_at_index(0)
+        self.assertEqual([sl[i] for i in range(len(sl))], [-3, 0, 4, 5, 9])
+        self.assertEqual(sl.array.typecode, 'h')
@@ -65,6 +65,121 @@ class TestUndo(unittest.TestCase):
         action = undo.undo(grid)
         self.assertEqual(action, None)
 
+    @number("4.2")
+    def test_undo_redo_many(self):
+        import random
+        from layers import lighten, rainbow, invert
+        rng = random.Random(40)
+        layers = [green, red, blue, lighten, rainbow, invert]
+        for style in Grid.DRAW_STYLE_OPTIONS:
+            for trial in range(20):
+                grids = [Grid(style, 6, 6), Grid(style, 6, 6)]
+                trackers = [UndoTracker(), UndoTracker()]
+                for _ in range(rng.randrange(1, 40)):
+                    if rng.random() < 0.15:
+                        action = PaintAction([], True)
+                    else:
+                        action = PaintAction([
+                            PaintStep((rng.randrange(6), rng.randrange(6)), rng.choice(layers))
+                            for _ in range(rng.randrange(1, 6))
+                        ])
+                    for grid, tracker in zip(grids, trackers):
+                        action.redo_apply(grid)
+                        tracker.add_action(action)
+                n = rng.randrange(1, 45)
+                expected = [trackers[0].undo(grids[0]) for _ in range(n)]
+                undone = trackers[1].undo(grids[1], n)
+                self.assertEqual(undone, [action for action in expected if action is not None])
+                self.assertStoresEqual(grids[0], grids[1])
+                m = rng.randrange(1, n + 2)
+                for _ in range(m):
+                    trackers[0].redo(grids[0])
+                trackers[1].redo(grids[1], m)
+                self.assertStoresEqual(grids[0], grids[1])
+                self.assertEqual(len(trackers[0].stack), len(trackers[1].stack))
+        self.assertEqual(UndoTracker().undo(Grid(Grid.DRAW_STYLE_SET, 2, 2), 5), [])
+
+    @number("4.3")
+    def test_fill(self):
+        from controller import PaintController
+        from layers import lighten
+        for style in Grid.DRAW_STYLE_OPTIONS:
+            controller = PaintController(Grid(style, 80, 70))
+            control = PaintController(Grid(style, 80, 70))
+            for c in (controller, control):
+                c.grid.brush_size = 1
+                for y in range(0, 70, 3):
+                    c.on_paint(blue, 40, y)
+            controller.on_fill(lighten, 5, 5)
+            self.assertEqual(len(controller.undo_tracker.stack), 25)
+            # The same squares, painted one step at a time.
+            fill = controller.undo_tracker.stack.peek()
+            (x0, y0), region = fill.origin, fill.region
+            action = PaintAction([PaintStep((x0 + i, y0 + j), lighten) for j, i in region])
+            action.redo_apply(control.grid)
+            control.undo_tracker.add_action(action)
+            self.assertStoresEqual(controller.grid, control.grid)
+
+            # Replay paints the fill again.
+            replayed = Grid(style, 80, 70)
+            controller.on_replay_start()
+            while not controller.replay_tracker.play_next_action(replayed):
+                pass
+            self.assertStoresEqual(replayed, controller.grid)
+
+            controller.on_special()
+            control.on_special()
+            for c in (controller, control):
+                c.on_undo(2)
+            self.assertStoresEqual(controller.grid, control.grid)
+            for c in (controller, control):
+                c.on_redo()
+                c.on_undo(5)
+                c.on_redo(5)
+            self.assertStoresEqual(controller.grid, control.grid)
+
+    @number("4.4")
+    def test_regions(self):
+        from controller import PaintController
+        for style in Grid.DRAW_STYLE_OPTIONS:
+            controller = PaintController(Grid(style, 90, 90))
+            for x in range(0, 40, 5):
+                controller.on_paint(red, x, 2 * x % 40)
+            controller.on_copy(0, 0, 40, 40)
+            controller.on_paste(50, 50)
+            controller.on_paste(20, 20)
+            controller.on_clear_region(10, 10, 30, 30)
+            self.assertEqual(len(controller.undo_tracker.stack), 11)
+            self.assertIsNone(controller.grid.peek(15, 15))
+            self.assertEqual(controller.grid.peek(55, 60).signature(), controller.grid.peek(5, 10).signature())
+
+            # Replay rebuilds the same canvas.
+            replayed = Grid(style, 90, 90)
+            controller.on_replay_start()
+            while not controller.replay_tracker.play_next_action(replayed):
+                pass
+            self.assertStoresEqual(replayed, controller.grid)
+
+            # Undoing the three region actions, one by one or at once, leaves the painted squares.
+            painted = Grid(style, 90, 90)
+            for x in range(0, 40, 5):
+                painted.on_paint(red, x, 2 * x % 40)
+            controller.on_undo()
+            controller.on_undo(2)
+            self.assertStoresEqual(controller.grid, painted)
+            controller.on_redo(3)
+            self.assertStoresEqual(controller.grid, replayed)
+            controller.on_undo(3)
+            self.assertStoresEqual(controller.grid, painted)
+
+    def assertStoresEqual(self, grid1: Grid, grid2: Grid):
+        self.assertEqual(grid1.blank_store.signature(), grid2.blank_store.signature())
+        for x in range(grid1.x):
+            for y in range(grid1.y):
+                store1 = grid1.peek(x, y) or grid1.blank_store
+                store2 = grid2.peek(x, y) or grid2.blank_store
+                self.assertEqual(store1.signature(), store2.signature(), f"Square ({x}, {y}) differs")
+
     def assertGridEqual(self, grid1: Grid, grid2: Grid):
         for x in range(len(grid1.grid)):
             for y in range(len(grid1[x])):
@@ -0,0 +1,39 @@
+import unittest
+from ed_utils.decorators import number
+
+from viewport import Viewport
+
+class TestViewport(unittest.TestCase):
+
+    @number("9.1")
+    def test_fit(self):
+        v = Viewport(32, 32, 700, 700)
+        self.assertEqual(v.visible_region(), (0, 0, 32, 32))
+        for sx, sy in [(0, 0), (21.9, 43.8), (699, 350), (350.5, 699.9)]:
+            self.assertEqual(v.screen_to_cell(sx, sy), (int(sx // (700 / 32)), int(sy // (700 / 32))))
+        self.assertEqual(v.cell_rect(1, 2), (700 / 32, 2 * 700 / 32, 3 * 700 / 32, 2 * 700 / 32))
+
+    @number("9.2")
+    def test_large_canvas_culled(self):
+        v = Viewport(2048, 2048, 700, 700)
+        x0, y0, x1, y1 = v.visible_region()
+        self.assertEqual((x0, y0), (0, 0))
+        self.assertLessEqual((x1 - x0) * (y1 - y0), 176 * 176)
+        v.pan(-700 * 10, -700 * 10)
+        x0, y0, x1, y1 = v.visible_region()
+        self.assertEqual((x1 - x0, y1 - y0), (175, 175))
+        self.assertEqual(v.screen_to_cell(0, 0), (x0, y0))
+        # Panning stops at the edge of the canvas.
+        v.pan(-10 ** 6, -10 ** 6)
+        self.assertEqual(v.visible_region()[2:], (2048, 2048))
+
+    @number("9.3")
+    def test_zoom_at(self):
+        v = Viewport(256, 256, 700, 700)
+        before = v.screen_to_cell(300, 200)
+        v.zoom_at(2, 300, 200)
+        self.assertEqual(v.zoom, 8)
+        self.assertEqual(v.screen_to_cell(300, 200), before)
+        v.zoom_at(0.001, 300, 200)
+        self.assertEqual(v.zoom, v.fit_zoom)
+        self.assertEqual(v.visible_region(), (0, 0, 256, 256))
@@ -3,17 +3,7 @@ from ed_utils.decorators import number
 
 from layers import green, red, blue
 from grid import Grid
-from main import MyWindow
-
-class FakeWindow:
-    def __init__(self, grid: Grid):
-        self.grid = grid
-
-FakeWindow.on_init = MyWindow.on_init
-FakeWindow.on_reset = MyWindow.on_reset
-FakeWindow.on_paint = MyWindow.on_paint
-FakeWindow.on_increase_brush_size = MyWindow.on_increase_brush_size
-FakeWindow.on_decrease_brush_size = MyWindow.on_decrease_brush_size
+from controller import PaintController
 
 class TestGrid(unittest.TestCase):
 
@@ -22,8 +12,7 @@ class TestGrid(unittest.TestCase):
         grid = Grid(Grid.DRAW_STYLE_SET, 5, 5)
         control_grid = Grid(Grid.DRAW_STYLE_SET, 5, 5)
 
-        fw = FakeWindow(grid)
-        fw.on_init()
+        fw = PaintController(grid)
         fw.on_reset()
         # Check default brush size of 2
         fw.on_paint(red, 2, 2)
@@ -42,8 +31,7 @@ class TestGrid(unittest.TestCase):
         grid = Grid(Grid.DRAW_STYLE_SET, 5, 5)
         control_grid = Grid(Grid.DRAW_STYLE_SET, 5, 5)
 
-        fw = FakeWindow(grid)
-        fw.on_init()
+        fw = PaintController(grid)
         fw.on_reset()
 
         fw.on_decrease_brush_size()
@@ -83,6 +71,23 @@ class TestGrid(unittest.TestCase):
 
         self.assertGridEqual(grid, control_grid)
 
+    @number("6.3")
+    def test_paint_stroke(self):
+        grid = Grid(Grid.DRAW_STYLE_ADD, 10, 10)
+        control_grid = Grid(Grid.DRAW_STYLE_ADD, 10, 10)
+
+        fw = PaintController(grid)
+        fw.on_reset()
+        fw.on_decrease_brush_size()
+        # Overlapping brushes along the stroke paint each square once, as one action.
+        fw.on_paint_stroke(red, [(2, 2), (3, 2), (4, 2), (4, 3)])
+        for x, y in [(2, 2), (3, 2), (4, 2), (4, 3), (1, 2), (2, 1), (2, 3), (3, 1), (3, 3), (5, 2), (4, 1), (5, 3), (4, 4)]:
+            control_grid[x][y].add(red)
+        self.assertGridEqual(grid, control_grid)
+        self.assertEqual(len(fw.undo_tracker.stack), 1)
+        fw.undo_tracker.undo(grid)
+        self.assertGridEqual(grid, Grid(Grid.DRAW_STYLE_ADD, 10, 10))
+
     def assertGridEqual(self, grid1: Grid, grid2: Grid):
         for x in range(len(grid1.grid)):
             for y in range(len(grid1[x])):
@@ -1,5 +1,5 @@
 from __future__ import annotations
-from action import PaintAction
+from action import PaintAction, apply_net
 from grid import Grid
 from data_structures.stack_adt import ArrayStack
 
@@ -13,6 +13,9 @@ class UndoTracker:
         '''
         self.stack = ArrayStack(10000)
         self.undo_stack = ArrayStack(10000)
+        # Steps of the actions in each stack, kept up to date for memory accounting.
+        self.steps = 0
+        self.undone_steps = 0
 
     def add_action(self, action: PaintAction) -> None:
         """
@@ -27,41 +30,91 @@ class UndoTracker:
         """
         self.stack.push(action)
         self.undo_stack.clear()
+        self.steps += len(action.steps)
+        self.undone_steps = 0
 
-    def undo(self, grid: Grid) -> PaintAction|None:
+    def undo(self, grid: Grid, n: int = None) -> PaintAction|None|list[PaintAction]:
         """
         Undo an operation, and apply the relevant action to the grid.
         If there are no actions to undo, simply do nothing.
 
+        With n, undo up to n operations at once. Their net effect on each square is
+        applied in one pass, so squares are not taken through the intermediate states.
+
         :return: The action that was undone, or None.
+                 With n, the list of actions undone, most recent first.
 
-        Time Complexity: O(1) Constant Time Complexity
+        Time Complexity: O(1) Constant Time Complexity; with n, O(n + S) where S is the number of steps undone
         Best Case: O(1): When there is an action to undo
         Worst Case: O(1): Same as best case as when there are no actions to undo, the complexity is the same
         """
+        if n is not None:
+            actions = []
+            while len(actions) < n and not self.stack.is_empty():
+                action = self.stack.pop()
+                self.undo_stack.push(action)
+                self._moved(len(action.steps))
+                actions.append(action)
+            apply_net(grid, actions, undo=True)
+            return actions
+
         if self.stack.is_empty():
             return None
 
         action = self.stack.pop()
         self.undo_stack.push(action)
+        self._moved(len(action.steps))
         action.undo_apply(grid)
         return action
 
-    def redo(self, grid: Grid) -> PaintAction|None:
+    def redo(self, grid: Grid, n: int = None) -> PaintAction|None|list[PaintAction]:
         """
         Redo an operation that was previously undone.
         If there are no actions to redo, simply do nothing.
 
+        With n, redo up to n operations at once, applying their net effect in one pass.
+
         :return: The action that was redone, or None.
+                 With n, the list of actions redone, in the order they were redone.
 
-        Time Complexity: O(1) Constant Time Complexity
+        Time Complexity: O(1) Constant Time Complexity; with n, O(n + S) where S is the number of steps redone
         Best Case: O(1): When there is an action to redo
         Worst Case: O(1): Same as best case as when there are no actions to redo, the complexity is the same
         """
+        if n is not None:
+            actions = []
+            while len(actions) < n and not self.undo_stack.is_empty():
+                action = self.undo_stack.pop()
+                self.stack.push(action)
+                self._moved(-len(action.steps))
+                actions.append(action)
+            apply_net(grid, actions, undo=False)
+            return actions
+
         if self.undo_stack.is_empty():
             return None
 
         action = self.undo_stack.pop()
         self.stack.push(action)
-        action.redo_apply(grid)  
+        self._moved(-len(action.steps))
+        action.redo_apply(grid)
         return action
+
+    def _moved(self, steps: int) -> None:
+        """Account for an action of `steps` steps moving to the redo stack (or back, when negative)."""
+        self.steps -= steps
+        self.undone_steps += steps
+
+    def memory_counts(self) -> dict[str, int]:
+        """
+        The actions held for undo and redo, from counters kept up to date (see memory.MemoryMonitor).
+
+        Time Complexity: O(1) Constant Time Complexity
+        """
+        return {
+            "actions": len(self.stack),
+            "undone_actions": len(self.undo_stack),
+            "steps": self.steps,
+            "undone_steps": self.undone_steps,
+            "capacity": len(self.stack.array) + len(self.undo_stack.array),
+        }
@@ -0,0 +1,97 @@
+"""
+Viewport onto the canvas.
+
+Maps between screen pixels in the drawing panel and grid squares,
+and tracks the zoom and pan of the view.
+"""
+from __future__ import annotations
+import math
+
+
+class Viewport:
+    """
+    A view of a canvas_x by canvas_y grid shown in a panel_width by panel_height panel.
+
+    - zoom: size of a grid square in pixels.
+    - left, bottom: grid coordinates shown at the bottom left pixel of the panel.
+    """
+
+    MAX_ZOOM = 64
+    # When a canvas is too large to fit comfortably, start with squares at least this big.
+    START_ZOOM = 4
+
+    def __init__(self, canvas_x: int, canvas_y: int, panel_width: float, panel_height: float) -> None:
+        self.canvas_x = canvas_x
+        self.canvas_y = canvas_y
+        self.panel_width = panel_width
+        self.panel_height = panel_height
+        self.left = 0.0
+        self.bottom = 0.0
+        self.zoom = max(self.fit_zoom, min(self.START_ZOOM, self.MAX_ZOOM))
+
+    @property
+    def fit_zoom(self) -> float:
+        """The zoom at which the whole canvas fits in the panel."""
+        return min(self.panel_width / self.canvas_x, self.panel_height / self.canvas_y)
+
+    def fit(self) -> None:
+        """Show the whole canvas."""
+        self.zoom = self.fit_zoom
+        self.left = 0.0
+        self.bottom = 0.0
+
+    def screen_to_cell(self, sx: float, sy: float) -> tuple[int, int]:
+        """
+        The grid square under a panel pixel. May lie outside the canvas.
+
+        Time Complexity: O(1)
+        """
+        return (
+            math.floor(self.left + sx / self.zoom),
+            math.floor(self.bottom + sy / self.zoom),
+        )
+
+    def visible_region(self) -> tuple[int, int, int, int]:
+        """
+        The region (x0, y0, x1, y1) of grid squares that intersect the panel, clipped to the canvas.
+
+        Time Complexity: O(1)
+        """
+        x0 = max(0, math.floor(self.left))
+        y0 = max(0, math.floor(self.bottom))
+        x1 = min(self.canvas_x, math.ceil(self.left + self.panel_width / self.zoom))
+        y1 = min(self.canvas_y, math.ceil(self.bottom + self.panel_height / self.zoom))
+        return (x0, y0, max(x0, x1), max(y0, y1))
+
+    def cell_rect(self, x: int, y: int, size: int = 1) -> tuple[float, float, float, float]:
+        """
+        The screen rectangle (left, right, top, bottom) covered by a grid square,
+        or by the size x size block of squares from (x, y).
+
+        Time Complexity: O(1)
+        """
+        left = (x - self.left) * self.zoom
+        bottom = (y - self.bottom) * self.zoom
+        return (left, left + self.zoom * size, bottom + self.zoom * size, bottom)
+
+    def zoom_at(self, factor: float, sx: float, sy: float) -> None:
+        """Multiply the zoom by factor, keeping the grid position under pixel (sx, sy) in place."""
+        gx = self.left + sx / self.zoom
+        gy = self.bottom + sy / self.zoom
+        self.zoom = min(self.MAX_ZOOM, max(self.fit_zoom, self.zoom * factor))
+        self.left = gx - sx / self.zoom
+        self.bottom = gy - sy / self.zoom
+        self._clamp()
+
+    def pan(self, dx: float, dy: float) -> None:
+        """Move the canvas by (dx, dy) pixels."""
+        self.left -= dx / self.zoom
+        self.bottom -= dy / self.zoom
+        self._clamp()
+
+    def _clamp(self) -> None:
+        """Keep the canvas covering as much of the panel as it can."""
+        spare_x = self.canvas_x - self.panel_width / self.zoom
+        spare_y = self.canvas_y - self.panel_height / self.zoom
+        self.left = min(max(self.left, min(0, spare_x)), max(0, spare_x))
+        self.bottom = min(max(self.bottom, min(0, spare_y)), max(0, spare_y))